@@ -0,0 +1,157 @@
+# benchmarks/generator.py
+
+import random
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Iterator, List, Optional
+
+import yaml
+
+USERS = ["root", "admin", "ubuntu", "oracle", "postgres", "test", "deploy", "alice", "bob", "carol"]
+HOSTS = ["web01", "web02", "db01", "bastion"]
+PATHS = ["/", "/index.html", "/login", "/api/v1/items", "/static/app.js", "/static/site.css", "/favicon.ico"]
+ATTACK_PATHS = ["/wp-login.php", "/../../etc/passwd", "/admin.php?id=1%27%20OR%201=1", "/.env", "/cgi-bin/test.sh"]
+AGENTS = [
+    "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 Chrome/120.0 Safari/537.36",
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:121.0) Gecko/20100101 Firefox/121.0",
+    "curl/8.4.0",
+    "Nmap Scripting Engine; https://nmap.org/book/nse.html",
+]
+
+# Words for synthetic rules, picked so that most of them never match
+RULE_WORDS = [
+    "segfault", "kernel panic", "oom-killer", "authentication token", "pam_tally",
+    "reverse mapping", "POSSIBLE BREAK-IN", "Bad protocol", "Did not receive identification",
+    "Connection reset", "maximum authentication", "Invalid user", "sqlmap", "nikto",
+    "masscan", "zgrab", "/etc/shadow", "base64_decode", "cmd.exe", "union select",
+]
+
+START = datetime(2024, 1, 1, 0, 0, 0)
+
+
+def _ip(rng: random.Random, hot: List[str]) -> str:
+    # A few noisy sources produce most of the traffic, like in real logs
+    if rng.random() < 0.6:
+        return rng.choice(hot)
+    return f"{rng.randint(1, 223)}.{rng.randint(0, 255)}.{rng.randint(0, 255)}.{rng.randint(1, 254)}"
+
+
+def _hot_ips(rng: random.Random, n: int = 20) -> List[str]:
+    return [f"203.0.113.{rng.randint(1, 254)}" for _ in range(n)]
+
+
+def auth_lines(count: int, seed: int = 1, start: datetime = START) -> Iterator[str]:
+    """sshd / sudo auth.log lines, the same for the same seed."""
+    rng = random.Random(seed)
+    hot = _hot_ips(rng)
+    ts = start
+    for i in range(count):
+        ts += timedelta(seconds=rng.choice((0, 0, 0, 1)))
+        stamp = f"{ts:%b} {ts.day:2d} {ts:%H:%M:%S}"
+        host = rng.choice(HOSTS)
+        pid = rng.randint(1000, 65000)
+        ip = _ip(rng, hot)
+        user = rng.choice(USERS)
+        port = rng.randint(1024, 65535)
+
+        kind = rng.random()
+        if kind < 0.55:
+            invalid = "invalid user " if rng.random() < 0.4 else ""
+            msg = f"sshd[{pid}]: Failed password for {invalid}{user} from {ip} port {port} ssh2"
+        elif kind < 0.70:
+            msg = f"sshd[{pid}]: Accepted password for {user} from {ip} port {port} ssh2"
+        elif kind < 0.80:
+            msg = f"sshd[{pid}]: Accepted publickey for {user} from {ip} port {port} ssh2: RSA SHA256:{rng.getrandbits(128):032x}"
+        elif kind < 0.90:
+            msg = f"sshd[{pid}]: pam_unix(sshd:session): session opened for user {user} by (uid=0)"
+        elif kind < 0.95:
+            msg = f"sshd[{pid}]: Invalid user {user} from {ip} port {port}"
+        else:
+            msg = f"sudo: {user} : TTY=pts/{rng.randint(0, 9)} ; PWD=/home/{user} ; USER=root ; COMMAND=/usr/bin/systemctl restart nginx"
+        yield f"{stamp} {host} {msg}"
+
+
+def web_lines(count: int, seed: int = 2, start: datetime = START) -> Iterator[str]:
+    """Combined Log Format access log lines, the same for the same seed."""
+    rng = random.Random(seed)
+    hot = _hot_ips(rng)
+    ts = start
+    for i in range(count):
+        ts += timedelta(seconds=rng.choice((0, 0, 1)))
+        stamp = ts.strftime("%d/%b/%Y:%H:%M:%S +0000")
+        ip = _ip(rng, hot)
+
+        if rng.random() < 0.1:
+            path, status = rng.choice(ATTACK_PATHS), rng.choice((403, 404))
+        else:
+            path, status = rng.choice(PATHS), rng.choice((200, 200, 200, 304, 404))
+        method = "POST" if path == "/login" else "GET"
+        size = rng.randint(0, 50000)
+        agent = rng.choice(AGENTS)
+        yield f'{ip} - - [{stamp}] "{method} {path} HTTP/1.1" {status} {size} "-" "{agent}"'
+
+
+def write_logs(log_dir: Path, auth: int, web: int, seed: int = 1) -> List[Path]:
+    """Write auth.log and web.log into log_dir and return their paths."""
+    log_dir.mkdir(parents=True, exist_ok=True)
+    paths = []
+    for name, lines in (("auth.log", auth_lines(auth, seed)), ("web.log", web_lines(web, seed + 1))):
+        path = log_dir / name
+        with path.open("w", encoding="utf-8") as f:
+            for line in lines:
+                f.write(line + "\n")
+        paths.append(path)
+    return paths
+
+
+def make_rules(rule_dir: Path, count: int, seed: int = 1, base_dir: Optional[Path] = None) -> Path:
+    """
+    Fill rule_dir with the shipped rules from base_dir plus synthetic
+    rules up to count in total, so matching cost can be measured against
+    rule count. About one in five synthetic rules is a regex.
+    """
+    rng = random.Random(seed)
+    rule_dir.mkdir(parents=True, exist_ok=True)
+
+    total = 0
+    if base_dir is not None:
+        for path in sorted(base_dir.glob("*.yaml")):
+            (rule_dir / path.name).write_text(path.read_text(encoding="utf-8"), encoding="utf-8")
+            total += 1
+
+    for i in range(max(count - total, 0)):
+        word = rng.choice(RULE_WORDS)
+        log_type = rng.choice(("auth", "web"))
+        if rng.random() < 0.2:
+            match_type, pattern = "regex", rf"{word}\s+\S+ {i}"
+        else:
+            match_type, pattern = "contains", f"{word} {i}"
+        rule = {
+            "id": f"BENCH_{i:04d}",
+            "description": f"benchmark rule {i}",
+            "log_type": log_type,
+            "match_type": match_type,
+            "pattern": pattern,
+            "severity": rng.choice(("low", "medium", "high")),
+        }
+        (rule_dir / f"bench_{i:04d}.yaml").write_text(yaml.safe_dump(rule), encoding="utf-8")
+    return rule_dir
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Write synthetic auth.log / web.log traffic")
+    parser.add_argument("log_dir", type=Path)
+    parser.add_argument("--auth", type=int, default=100_000)
+    parser.add_argument("--web", type=int, default=100_000)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--rules", type=Path, default=None, help="also write synthetic rules here")
+    parser.add_argument("--rule-count", type=int, default=100)
+    args = parser.parse_args()
+
+    for path in write_logs(args.log_dir, args.auth, args.web, args.seed):
+        print(f"Wrote {path}")
+    if args.rules is not None:
+        make_rules(args.rules, args.rule_count, args.seed)
+        print(f"Wrote {args.rule_count} rules to {args.rules}")
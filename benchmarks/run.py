@@ -0,0 +1,280 @@
+# benchmarks/run.py
+
+import contextlib
+import io
+import json
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+from siem.log_ingestor import iter_log_lines
+from siem.parsers import event_dict, parse_event
+from siem.pipeline import Pipeline
+from siem.rule_engine import RuleEngine
+from siem.storage import SQLiteStorage
+
+from .generator import auth_lines, make_rules, web_lines, write_logs
+
+BASE_DIR = Path(__file__).resolve().parent
+BASELINE_PATH = BASE_DIR / "baseline.json"
+RESULTS_PATH = BASE_DIR / "results.json"
+RULE_DIR = BASE_DIR.parent / "rules"
+
+# A run fails when throughput drops more than this below the baseline ...
+DEFAULT_TOLERANCE = 0.20
+# ... or p99 latency grows more than this above it (latency is noisier)
+DEFAULT_P99_TOLERANCE = 1.0
+
+BENCHMARKS = ("read", "parse", "match", "storage_insert", "storage_query", "ingest")
+
+Result = Dict[str, Any]
+
+
+def p99(samples: List[float]) -> float:
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))]
+
+
+def measure(items: Iterable[Any], fn: Callable[[Any], Any], weight: Callable[[Any], int] = lambda _: 1) -> Result:
+    """
+    Call fn on every item, timing each call.
+    per_sec is total weight (lines, rows, queries) per second of wall time.
+    """
+    latencies: List[float] = []
+    total = 0
+    started = time.perf_counter()
+    for item in items:
+        t = time.perf_counter()
+        fn(item)
+        latencies.append(time.perf_counter() - t)
+        total += weight(item)
+    elapsed = time.perf_counter() - started
+    return {
+        "count": total,
+        "seconds": round(elapsed, 4),
+        "per_sec": round(total / elapsed, 1) if elapsed else 0.0,
+        "p99_ms": round(p99(latencies) * 1000, 4),
+    }
+
+
+def _quiet(fn: Callable[[], Any]) -> Any:
+    # RuleEngine reports every rule it loads, keep that out of the results
+    with contextlib.redirect_stdout(io.StringIO()):
+        return fn()
+
+
+class Bench:
+    """One benchmark run over generated traffic in a scratch directory."""
+
+    def __init__(self, work_dir: Path, lines: int, rules: int, seed: int) -> None:
+        self.work_dir = work_dir
+        self.lines = lines
+        self.seed = seed
+
+        half = lines // 2
+        self.raw = [("auth", line) for line in auth_lines(half, seed)]
+        self.raw += [("web", line) for line in web_lines(lines - half, seed + 1)]
+
+        rule_dir = make_rules(work_dir / "rules", rules, seed, base_dir=RULE_DIR)
+        self.engine = RuleEngine(rule_dir=rule_dir)
+        _quiet(self.engine.load_rules)
+
+    def read(self, repeat: int = 20) -> Result:
+        log_dir = self.work_dir / "logs"
+        half = self.lines // 2
+        write_logs(log_dir, half, self.lines - half, self.seed)
+        # Lines per second off the page cache, decoding and splitting only
+        result = measure(range(repeat), lambda _: sum(1 for _ in iter_log_lines(log_dir)), weight=lambda _: self.lines)
+        # and the most memory one read holds at a time, in a pass of its
+        # own as tracing slows every allocation down
+        tracemalloc.start()
+        try:
+            sum(1 for _ in iter_log_lines(log_dir))
+            result["peak_kib"] = round(tracemalloc.get_traced_memory()[1] / 1024, 1)
+        finally:
+            tracemalloc.stop()
+        return result
+
+    def parse(self) -> Result:
+        return measure(self.raw, lambda item: parse_event(*item))
+
+    def match(self) -> Result:
+        events = [event_dict(parse_event(source, raw)) for source, raw in self.raw]
+        return measure(events, self.engine.match_event)
+
+    def _rows(self) -> List[tuple]:
+        rows = []
+        for source, raw in self.raw:
+            ev = parse_event(source, raw)
+            rows.append((ev.timestamp, ev.source, ev.raw, ev.action, ev.user, ev.src_ip))
+        return rows
+
+    def storage_insert(self, batch_size: int = 500) -> Result:
+        storage = SQLiteStorage(db_path=str(self.work_dir / "insert.db"))
+        storage.connect()
+        storage.init_db()
+        rows = self._rows()
+        batches = [rows[i:i + batch_size] for i in range(0, len(rows), batch_size)]
+        try:
+            return measure(batches, storage.write_rows, weight=len)
+        finally:
+            storage.close()
+
+    def storage_query(self, repeat: int = 50) -> Result:
+        storage = SQLiteStorage(db_path=str(self.work_dir / "insert.db"))
+        storage.connect()
+        storage.init_db()
+        try:
+            last_page = storage.fetch_events(limit=200)
+            older = last_page[-1]["id"] if last_page else None
+            queries = [
+                lambda: storage.fetch_events(limit=200),
+                lambda: storage.fetch_events(limit=200, before_id=older),
+                lambda: storage.fetch_events(limit=200, src_ip="203.0.113.10"),
+                lambda: storage.search_events("Failed root", limit=100),
+                lambda: storage.fetch_alerts(severity="high", limit=200),
+            ]
+            return measure(queries * repeat, lambda query: query())
+        finally:
+            storage.close()
+
+    def ingest(self) -> Result:
+        log_dir = self.work_dir / "logs"
+        half = self.lines // 2
+        write_logs(log_dir, half, self.lines - half, self.seed)
+
+        pipeline = Pipeline(self.engine, db_path=str(self.work_dir / "ingest.db"), log_dir=log_dir)
+        started = time.perf_counter()
+        stats = pipeline.run()
+        elapsed = time.perf_counter() - started
+        return {
+            "count": stats["writer"]["items"],
+            "seconds": round(elapsed, 4),
+            "per_sec": round(stats["writer"]["items"] / elapsed, 1),
+            # per-batch commit latency is what an end-to-end run exposes
+            "p99_ms": None,
+        }
+
+
+def run(lines: int, rules: int, seed: int = 1, only: Optional[Iterable[str]] = None) -> Dict[str, Any]:
+    names = [name for name in BENCHMARKS if not only or name in only]
+    # storage_query reads the database storage_insert wrote
+    if "storage_query" in names and "storage_insert" not in names:
+        names.insert(names.index("storage_query"), "storage_insert")
+
+    results: Dict[str, Result] = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        bench = Bench(Path(tmp), lines, rules, seed)
+        for name in names:
+            results[name] = getattr(bench, name)()
+            line = f"{name:15} {results[name]['per_sec']:>12,.0f}/s  p99 {results[name]['p99_ms']} ms"
+            if "peak_kib" in results[name]:
+                line += f"  peak {results[name]['peak_kib']:,.0f} KiB"
+            print(line)
+
+    return {
+        "config": {"lines": lines, "rules": rules, "seed": seed},
+        "machine": {"python": platform.python_version(), "platform": platform.platform()},
+        "results": results,
+    }
+
+
+def compare(
+    report: Dict[str, Any],
+    baseline: Dict[str, Any],
+    tolerance: float = DEFAULT_TOLERANCE,
+    p99_tolerance: float = DEFAULT_P99_TOLERANCE,
+) -> List[str]:
+    """
+    Return a message for every benchmark that regressed against the
+    baseline, or has no baseline entry and so cannot be checked.
+    """
+    if report["config"] != baseline.get("config"):
+        return [f"config {report['config']} does not match baseline {baseline.get('config')}"]
+
+    failures = []
+    for name, result in report["results"].items():
+        base = baseline.get("results", {}).get(name)
+        if base is None:
+            failures.append(f"{name}: no baseline, record one with --update-baseline --only {name}")
+            continue
+        floor = base["per_sec"] * (1 - tolerance)
+        if result["per_sec"] < floor:
+            failures.append(
+                f"{name}: {result['per_sec']:,.0f}/s is below {floor:,.0f}/s "
+                f"(baseline {base['per_sec']:,.0f}/s - {tolerance:.0%})"
+            )
+        if result.get("peak_kib") is not None and base.get("peak_kib"):
+            ceiling = base["peak_kib"] * (1 + tolerance)
+            if result["peak_kib"] > ceiling:
+                failures.append(
+                    f"{name}: peak memory {result['peak_kib']:,.0f} KiB is above {ceiling:,.0f} KiB "
+                    f"(baseline {base['peak_kib']:,.0f} KiB + {tolerance:.0%})"
+                )
+        if result.get("p99_ms") is not None and base.get("p99_ms"):
+            ceiling = base["p99_ms"] * (1 + p99_tolerance)
+            if result["p99_ms"] > ceiling:
+                failures.append(
+                    f"{name}: p99 {result['p99_ms']} ms is above {ceiling:.4f} ms "
+                    f"(baseline {base['p99_ms']} ms + {p99_tolerance:.0%})"
+                )
+    return failures
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Watchtower performance benchmarks")
+    parser.add_argument("--lines", type=int, default=20_000)
+    parser.add_argument("--rules", type=int, default=100)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--only", default="", help=f"comma separated subset of {', '.join(BENCHMARKS)}")
+    parser.add_argument("--output", type=Path, default=RESULTS_PATH)
+    parser.add_argument("--baseline", type=Path, default=BASELINE_PATH)
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE)
+    parser.add_argument("--p99-tolerance", type=float, default=DEFAULT_P99_TOLERANCE)
+    parser.add_argument("--update-baseline", action="store_true")
+    args = parser.parse_args(argv)
+
+    only = [name for name in args.only.split(",") if name]
+    report = run(args.lines, args.rules, args.seed, only)
+
+    args.output.write_text(json.dumps(report, indent=2) + "\n", encoding="utf-8")
+    print(f"Results written to {args.output}")
+
+    if args.update_baseline:
+        baseline = report
+        if only and args.baseline.exists():
+            # Replace just the benchmarks that ran, keep the others
+            baseline = json.loads(args.baseline.read_text(encoding="utf-8"))
+            if baseline.get("config") != report["config"]:
+                print(f"Baseline {args.baseline} has another config, run without --only to replace it")
+                return 1
+            baseline["results"].update(report["results"])
+        args.baseline.write_text(json.dumps(baseline, indent=2) + "\n", encoding="utf-8")
+        print(f"Baseline updated: {args.baseline}")
+        return 0
+
+    if not args.baseline.exists():
+        print(f"No baseline at {args.baseline}, run with --update-baseline to create one")
+        return 0
+
+    failures = compare(
+        report,
+        json.loads(args.baseline.read_text(encoding="utf-8")),
+        args.tolerance,
+        args.p99_tolerance,
+    )
+    for failure in failures:
+        print(f"REGRESSION {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
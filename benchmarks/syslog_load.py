@@ -0,0 +1,149 @@
+# benchmarks/syslog_load.py
+
+import socket
+import threading
+import time
+from typing import Dict, List, Optional
+
+from siem.syslog_receiver import SyslogReceiver
+
+from .generator import auth_lines
+
+# authpriv.info, what sshd and sudo log at
+PRI = 86
+
+
+def messages(count: int, fmt: str = "3164", seed: int = 1) -> List[bytes]:
+    """Generated auth.log traffic as syslog messages, RFC 3164 or 5424."""
+    out: List[bytes] = []
+    for line in auth_lines(count, seed):
+        if fmt == "3164":
+            out.append(f"<{PRI}>{line}".encode())
+            continue
+        # "Jan  1 10:15:32 host sshd[123]: message"
+        host, tag, msg = line[16:].split(" ", 2)
+        program, _, pid = tag.rstrip(":").partition("[")
+        out.append(f"<{PRI}>1 2024-01-01T10:15:32Z {host} {program} {pid.rstrip(']') or '-'} - - {msg}".encode())
+    return out
+
+
+def frame(msgs: List[bytes], framing: str = "octet") -> bytes:
+    """One TCP stream carrying msgs, octet counted or newline terminated."""
+    if framing == "octet":
+        return b"".join(b"%d %s" % (len(m), m) for m in msgs)
+    return b"".join(m + b"\n" for m in msgs)
+
+
+def send(host: str, port: int, msgs: List[bytes], proto: str = "udp", framing: str = "octet", rate: Optional[float] = None) -> float:
+    """
+    Send msgs and return the seconds it took. rate caps messages per
+    second, sending in bursts of about a millisecond's worth.
+    """
+    burst = max(1, int(rate / 1000)) if rate else len(msgs)
+    started = time.perf_counter()
+    family = socket.getaddrinfo(host, port)[0][0]
+    if proto == "udp":
+        with socket.socket(family, socket.SOCK_DGRAM) as sock:
+            for i in range(0, len(msgs), burst):
+                for m in msgs[i:i + burst]:
+                    sock.sendto(m, (host, port))
+                if rate:
+                    _pace(started, i + burst, rate)
+    else:
+        with socket.create_connection((host, port)) as sock:
+            for i in range(0, len(msgs), burst):
+                sock.sendall(frame(msgs[i:i + burst], framing))
+                if rate:
+                    _pace(started, i + burst, rate)
+    return time.perf_counter() - started
+
+
+def _pace(started: float, sent: int, rate: float) -> None:
+    ahead = sent / rate - (time.perf_counter() - started)
+    if ahead > 0:
+        time.sleep(ahead)
+
+
+def run_local(
+    count: int,
+    proto: str = "udp",
+    fmt: str = "3164",
+    framing: str = "octet",
+    rate: Optional[float] = None,
+    timeout: float = 30.0,
+) -> Dict[str, float]:
+    """
+    Start a receiver on a free localhost port whose sink only counts,
+    send count messages to it and report what arrived. Measures the
+    receiver (framing, parsing, batching) without the pipeline behind it.
+    """
+    msgs = messages(count, fmt)
+    received: List[int] = [0]
+
+    def sink(batch) -> bool:
+        received[0] += len(batch)
+        return True
+
+    receiver = SyslogReceiver(sink, port=0, udp=proto == "udp", tcp=proto == "tcp", metrics=None)
+    stop = threading.Event()
+    thread = threading.Thread(target=receiver.run, args=(stop,), daemon=True)
+    thread.start()
+    receiver.ready.wait()
+
+    host, port = receiver.addresses[proto]
+    started = time.perf_counter()
+    sent_seconds = send(host, port, msgs, proto, framing, rate)
+    # Wait until everything sent was handed over, or stops arriving
+    deadline = time.perf_counter() + timeout
+    last, still = -1, 0
+    while received[0] + receiver.stats["dropped"] < count and time.perf_counter() < deadline:
+        time.sleep(0.05)
+        still = still + 1 if receiver.stats["received"] == last else 0
+        last = receiver.stats["received"]
+        if still >= 10:
+            break
+    elapsed = time.perf_counter() - started
+    stop.set()
+    thread.join()
+
+    return {
+        "sent": count,
+        "received": receiver.stats["received"],
+        "handed_over": received[0],
+        "dropped": receiver.stats["dropped"],
+        "lost": count - receiver.stats["received"] - receiver.stats["dropped"],
+        "send_per_sec": round(count / sent_seconds, 1) if sent_seconds else 0.0,
+        "per_sec": round(receiver.stats["received"] / elapsed, 1) if elapsed else 0.0,
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Syslog load generator")
+    parser.add_argument("--count", type=int, default=100_000)
+    parser.add_argument("--proto", choices=("udp", "tcp"), default="udp")
+    parser.add_argument("--format", dest="fmt", choices=("3164", "5424"), default="3164")
+    parser.add_argument("--framing", choices=("octet", "newline"), default="octet", help="TCP framing")
+    parser.add_argument("--rate", type=float, default=None, help="messages per second, default as fast as possible")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument(
+        "--port", type=int, default=None,
+        help="send to a running receiver; without it a local receiver is started and measured",
+    )
+    args = parser.parse_args(argv)
+
+    if args.port is None:
+        result = run_local(args.count, args.proto, args.fmt, args.framing, args.rate)
+        for name, value in result.items():
+            print(f"{name:12} {value:>12,}")
+        return 0
+
+    msgs = messages(args.count, args.fmt)
+    seconds = send(args.host, args.port, msgs, args.proto, args.framing, args.rate)
+    print(f"sent {args.count:,} messages in {seconds:.2f} s ({args.count / seconds:,.0f}/s)")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
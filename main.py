@@ -1 +1,5 @@
-# main entry point
+# main entry point, see siem.cli. Without a command it opens the GUI.
+from siem.cli import main
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -1 +1,185 @@
-# alerts
+# siem/alerts.py
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+from .models import Alert, Event
+from .thresholds import parse_time
+
+# Default seconds per aggregated alert group
+DEFAULT_WINDOW = 300
+
+# Cap on groups kept in memory between flushes
+DEFAULT_MAX_GROUPS = 50_000
+
+
+def build_alert_record(ev: Event, alert: Dict[str, Any]) -> Alert:
+    """Turn a RuleEngine alert dict for a parsed event into a storable Alert."""
+    return Alert(
+        timestamp=ev.timestamp,
+        rule_name=alert.get("rule_id") or "",
+        severity=alert.get("severity") or "",
+        src_ip=ev.src_ip or "",
+        user=ev.user or "",
+        message=ev.raw,
+    )
+
+
+class _Group:
+    __slots__ = ("record", "bucket", "window", "count", "first_seen", "last_seen")
+
+    def __init__(self, record: Alert, bucket: int, window: int) -> None:
+        self.record = record
+        self.bucket = bucket
+        self.window = window
+        self.count = 0
+        self.first_seen = ""
+        self.last_seen = ""
+
+
+class AlertAggregator:
+    """
+    Folds repeated hits into one alert row per (rule, src_ip, user, window).
+
+    Each group keeps first seen, last seen, a hit count and the first raw
+    line as a sample. drain() returns the groups that changed since the
+    last call as rows for SQLiteStorage.write_rows(group_rows=...), which
+    upserts them, so a scanner hitting one rule 50k times is one row with
+    count=50000 instead of 50k rows.
+
+    Per-rule behaviour is read from an optional aggregate block in the rule:
+
+        aggregate:
+          window: 300             # seconds per group (default DEFAULT_WINDOW)
+          rate_limit: 20          # new groups per minute, the rest fold into
+                                  # one overflow group with src_ip/user "*"
+          suppress: true          # or {src_ip: [...], user: [...]}, drop hits
+    """
+
+    def __init__(
+        self,
+        rule_engine=None,
+        window: int = DEFAULT_WINDOW,
+        max_groups: int = DEFAULT_MAX_GROUPS,
+    ) -> None:
+        self.rule_engine = rule_engine
+        self.window = window
+        self.max_groups = max_groups
+
+        self.groups: "OrderedDict[str, _Group]" = OrderedDict()
+        self.dirty: Dict[str, _Group] = {}
+        # rule id -> (minute, new groups opened in that minute)
+        self.opened: Dict[str, tuple] = {}
+
+        self.hits = 0
+        self.suppressed = 0
+        self.rate_limited = 0
+
+    def _settings(self, rule_id: str) -> Dict[str, Any]:
+        if self.rule_engine is None:
+            return {}
+        rule = self.rule_engine.by_id.get(rule_id) or {}
+        return rule.get("aggregate") or {}
+
+    def add(self, ev: Event, alert: Dict[str, Any]) -> bool:
+        """
+        Record one hit. Returns True when it opened a new group, which is
+        when the caller should surface it; later hits only bump the count.
+        """
+        rule_id = alert.get("rule_id") or ""
+        settings = self._settings(rule_id)
+
+        if self._is_suppressed(settings.get("suppress"), ev):
+            self.suppressed += 1
+            return False
+        self.hits += 1
+
+        window = int(settings.get("window") or self.window)
+        now = parse_time(ev.timestamp)
+        bucket = int(now // window) * window
+        src_ip, user = ev.src_ip or "", ev.user or ""
+
+        key = f"{rule_id}|{src_ip}|{user}|{bucket}"
+        group = self.groups.get(key)
+        is_new = group is None
+
+        if is_new and not self._allow_new(rule_id, settings.get("rate_limit"), now):
+            # Over the rule's rate limit, count it in the overflow group
+            self.rate_limited += 1
+            src_ip = user = "*"
+            key = f"{rule_id}|*|*|{bucket}"
+            group = self.groups.get(key)
+            is_new = group is None
+
+        if group is None:
+            record = build_alert_record(ev, alert)
+            record.src_ip, record.user = src_ip, user
+            group = _Group(record, bucket, window)
+            self.groups[key] = group
+        else:
+            self.groups.move_to_end(key)
+
+        group.count += 1
+        if not group.first_seen:
+            group.first_seen = ev.timestamp
+        group.last_seen = max(group.last_seen, ev.timestamp)
+        self.dirty[key] = group
+        return is_new
+
+    @staticmethod
+    def _is_suppressed(suppress: Any, ev: Event) -> bool:
+        if not suppress:
+            return False
+        if not isinstance(suppress, dict):
+            return True
+        for field, values in suppress.items():
+            if getattr(ev, field, None) in (values or ()):
+                return True
+        return False
+
+    def _allow_new(self, rule_id: str, rate_limit: Optional[int], now: float) -> bool:
+        if not rate_limit:
+            return True
+        minute = int(now // 60)
+        last_minute, opened = self.opened.get(rule_id, (minute, 0))
+        if last_minute != minute:
+            opened = 0
+        if opened >= int(rate_limit):
+            return False
+        self.opened[rule_id] = (minute, opened + 1)
+        return True
+
+    def pending(self) -> int:
+        return len(self.dirty)
+
+    def drain(self) -> List[tuple]:
+        """
+        Return changed groups as upsert rows and reset their pending counts:
+        (group_key, timestamp, rule_name, severity, src_ip, user, message,
+        count, first_seen, last_seen)
+        """
+        rows = []
+        newest = 0.0
+        for key, group in self.dirty.items():
+            r = group.record
+            rows.append(
+                (key, group.first_seen, r.rule_name, r.severity, r.src_ip, r.user,
+                 r.message, group.count, group.first_seen, group.last_seen)
+            )
+            group.count = 0
+            group.first_seen = ""
+            newest = max(newest, group.bucket + group.window)
+        self.dirty = {}
+
+        self._evict(newest)
+        return rows
+
+    def _evict(self, newest: float) -> None:
+        # Groups from closed windows can no longer change, and past
+        # max_groups the least recently hit ones go. Either way a later hit
+        # still lands on the same row, the upsert merges by group key.
+        while self.groups:
+            key, group = next(iter(self.groups.items()))
+            closed = group.bucket + group.window * 2 <= newest
+            if not closed and len(self.groups) <= self.max_groups:
+                break
+            del self.groups[key]
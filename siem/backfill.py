@@ -0,0 +1,331 @@
+# siem/backfill.py
+
+import mmap
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+from .alerts import AlertAggregator
+from .log_ingestor import (
+    ARCHIVE_ERRORS,
+    DECOMPRESSORS,
+    RULE_DIR,
+    Archive,
+    check_archive,
+    count_lines,
+    decode_lines,
+    is_live,
+    open_log,
+    order_log_files,
+    source_for_path,
+)
+from .models import Event
+from .parsers import event_dict, parse_event
+from .rule_engine import RuleEngine
+from .storage import SQLiteStorage
+
+# Bytes of log per worker task
+CHUNK_SIZE = 8 * 1024 * 1024
+
+# (path, source, start, end) byte range of whole lines
+Task = Tuple[str, str, int, int]
+
+# Worker output: event rows in storage column order, plus (index into
+# rows, rule id, Event.extra) for every rule whose pattern matched. extra
+# is not stored, but threshold rules can count its fields.
+ChunkResult = Tuple[List[tuple], List[Tuple[int, str, Dict[str, str]]]]
+
+
+def split_file(path: Path, chunk_size: int = CHUNK_SIZE) -> List[Tuple[int, int]]:
+    """Split a file into [start, end) byte ranges that begin and end on line boundaries."""
+    size = os.path.getsize(path)
+    ranges: List[Tuple[int, int]] = []
+
+    with open(path, "rb") as f:
+        start = 0
+        while start < size:
+            end = start + chunk_size
+            if end >= size:
+                end = size
+            else:
+                f.seek(end)
+                f.readline()
+                end = f.tell()
+            ranges.append((start, end))
+            start = end
+    return ranges
+
+
+def split_archive(path: Path, chunk_size: int = CHUNK_SIZE) -> Iterator[bytes]:
+    """
+    Stream a compressed archive as blocks of about chunk_size bytes of
+    decompressed, whole lines. Compressed data cannot be split by byte
+    offset, so the blocks come from one sequential read.
+    """
+    with open_log(path) as f:
+        partial = b""
+        while True:
+            data = f.read(chunk_size)
+            if not data:
+                break
+            data = partial + data
+            cut = data.rfind(b"\n") + 1
+            if cut == 0:
+                partial = data
+                continue
+            partial = data[cut:]
+            yield data[:cut]
+        if partial:
+            yield partial
+
+
+def make_tasks(paths: Iterable[Path], chunk_size: int = CHUNK_SIZE) -> List[Task]:
+    tasks: List[Task] = []
+    for path in paths:
+        source = source_for_path(path)
+        if source is None:
+            print(f"Skipping file with unknown source: {path}")
+            continue
+        for start, end in split_file(path, chunk_size):
+            tasks.append((str(path), source, start, end))
+    return tasks
+
+
+# Each worker process loads the rules once
+_engine: Optional[RuleEngine] = None
+
+
+def _init_worker(rule_dir: str) -> None:
+    global _engine
+    _engine = RuleEngine(rule_dir=rule_dir)
+    _engine.load_rules()
+
+
+def _process_chunk(task: Task) -> ChunkResult:
+    """Parse and pattern match one byte range. Runs inside a worker."""
+    assert _engine is not None
+    path, source, start, end = task
+
+    if end <= start:
+        return [], []
+    if is_live(Path(path)):
+        # A live log can be truncated by logrotate while we read it, and
+        # a mapped page past the new end raises SIGBUS, so read the range
+        with open(path, "rb") as f:
+            f.seek(start)
+            return _process_block(source, f.read(end - start))
+    # Decoded straight out of the page cache, the range is never copied
+    with open(path, "rb") as f:
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    try:
+        with memoryview(mm) as view, view[start:end] as data:
+            return _process_block(source, data)
+    finally:
+        mm.close()
+
+
+def _process_block(source: str, data) -> ChunkResult:
+    """Parse and pattern match a buffer of whole lines. Runs inside a worker."""
+    assert _engine is not None
+    rows: List[tuple] = []
+    matches: List[Tuple[int, str, Dict[str, str]]] = []
+
+    for _, raw in decode_lines(data, source):
+        ev = parse_event(source, raw)
+        if ev is None:
+            continue
+
+        for rule in _engine.match_rules(event_dict(ev)):
+            matches.append((len(rows), rule.get("id"), ev.extra))
+        rows.append((ev.timestamp, ev.source, ev.raw, ev.action, ev.user, ev.src_ip))
+
+    return rows, matches
+
+
+def _write_result(
+    result: ChunkResult,
+    engine: RuleEngine,
+    aggregator: AlertAggregator,
+    storage: SQLiteStorage,
+) -> int:
+    """
+    Apply threshold windows and alert aggregation in file order and
+    commit one chunk. Runs in the writer (parent) process only.
+    Returns the number of alerts (hits) in the chunk.
+    """
+    rows, matches = result
+    hits = 0
+
+    for pos, rule_id, extra in matches:
+        ev = Event(None, *rows[pos], extra)
+        for alert in engine.alerts_for([engine.by_id[rule_id]], event_dict(ev)):
+            aggregator.add(ev, alert)
+            hits += 1
+
+    storage.write_rows(rows, group_rows=aggregator.drain())
+    return hits
+
+
+# A function to run in a worker, its arguments, and the archive (with its
+# line count) that is fully ingested once the result is committed
+Job = Tuple[Callable[..., ChunkResult], tuple, Optional[Tuple[Archive, int]]]
+
+
+def _jobs(paths: Iterable[Path], storage: SQLiteStorage, chunk_size: int, stats: Dict[str, int]) -> Iterator[Job]:
+    """
+    Work for run_backfill in chronological order. Plain files are split
+    into byte ranges the workers read themselves. Compressed archives are
+    decompressed here and their blocks shipped to the workers, and
+    rotated copies whose content was ingested before are skipped.
+    Archives that cannot be read are reported, counted in stats["errors"]
+    and skipped.
+    """
+    # Archives are recorded only once committed, which is behind the
+    # jobs in flight, so copies of the same content are caught here
+    scheduled: Set[str] = set()
+    for path in order_log_files(paths):
+        source = source_for_path(path)
+        if source is None:
+            print(f"Skipping file with unknown source: {path}")
+            continue
+
+        archive = None
+        if not is_live(path):
+            try:
+                archive = check_archive(path, storage)
+            except ARCHIVE_ERRORS as e:
+                print(f"Skipping unreadable archive {path}: {e}")
+                stats["errors"] += 1
+                continue
+            if archive is None:
+                print(f"Skipping archive ingested before: {path}")
+                continue
+            if archive[0] in scheduled:
+                print(f"Skipping archive with the same content as another one: {path}")
+                continue
+            scheduled.add(archive[0])
+
+        if path.suffix in DECOMPRESSORS:
+            blocks = split_archive(path, chunk_size)
+            lines = 0
+            try:
+                block = next(blocks, None)
+                while block is not None:
+                    lines += block.count(b"\n") + (not block.endswith(b"\n"))
+                    following = next(blocks, None)
+                    done = (archive, lines) if following is None and archive is not None else None
+                    yield _process_block, (source, block), done
+                    block = following
+            except ARCHIVE_ERRORS as e:
+                # The blocks before the damage are ingested, the archive is
+                # not recorded
+                print(f"Stopped reading unreadable archive {path}: {e}")
+                stats["errors"] += 1
+                continue
+            if lines == 0 and archive is not None:
+                storage.record_archive(*archive, lines=0)
+            continue
+
+        ranges = split_file(path, chunk_size)
+        for i, (start, end) in enumerate(ranges):
+            done = None
+            if archive is not None and i == len(ranges) - 1:
+                done = (archive, count_lines(path))
+            yield _process_chunk, ((str(path), source, start, end),), done
+        if not ranges and archive is not None:
+            storage.record_archive(*archive, lines=0)
+
+
+def _run_job(func: Callable[..., ChunkResult], args: tuple) -> ChunkResult:
+    return func(*args)
+
+
+def run_backfill(
+    paths: Iterable[Path],
+    storage: SQLiteStorage,
+    rule_dir: Path = RULE_DIR,
+    workers: Optional[int] = None,
+    chunk_size: int = CHUNK_SIZE,
+) -> Dict[str, int]:
+    """
+    Replay archived log files into storage using a process pool.
+
+    Files are taken in chronological order, rotated copies oldest first,
+    and .gz, .bz2 and .xz archives are streamed without unpacking them.
+    Rotated copies are recorded by content hash once committed, and
+    skipped when they show up again, also under another name.
+
+    Workers parse and pattern match line-aligned chunks in parallel.
+    This process is the single writer: it takes results back in task
+    order, runs threshold rules and alert aggregation (which need the
+    events in order) and commits one transaction per chunk. At most
+    2 * workers chunks are in flight, so memory stays bounded on large
+    archives.
+
+    workers=0 runs everything in this process.
+    """
+    stats = {"chunks": 0, "events": 0, "alerts": 0, "errors": 0}
+    jobs = _jobs(paths, storage, chunk_size, stats)
+
+    engine = RuleEngine(rule_dir=rule_dir)
+    engine.load_rules()
+    aggregator = AlertAggregator(engine)
+
+    def consume(result: ChunkResult, done: Optional[Tuple[Archive, int]]) -> None:
+        stats["chunks"] += 1
+        stats["events"] += len(result[0])
+        stats["alerts"] += _write_result(result, engine, aggregator, storage)
+        if done is not None:
+            archive, lines = done
+            storage.record_archive(*archive, lines=lines)
+
+    if workers == 0:
+        _init_worker(str(rule_dir))
+        for func, args, done in jobs:
+            consume(func(*args), done)
+        return stats
+
+    workers = workers or os.cpu_count() or 1
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        initializer=_init_worker,
+        initargs=(str(rule_dir),),
+    ) as pool:
+        pending: deque = deque()
+        for func, args, done in jobs:
+            pending.append((pool.submit(_run_job, func, args), done))
+            if len(pending) >= workers * 2:
+                future, done = pending.popleft()
+                consume(future.result(), done)
+        while pending:
+            future, done = pending.popleft()
+            consume(future.result(), done)
+
+    return stats
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Replay archived logs into the SIEM database")
+    parser.add_argument("paths", nargs="+", type=Path)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--chunk-mb", type=int, default=CHUNK_SIZE // (1024 * 1024))
+    args = parser.parse_args()
+
+    storage = SQLiteStorage()
+    storage.connect()
+    storage.init_db()
+
+    result = run_backfill(
+        args.paths,
+        storage,
+        workers=args.workers,
+        chunk_size=args.chunk_mb * 1024 * 1024,
+    )
+    print(
+        f"Backfill done: {result['events']} events, {result['alerts']} alerts "
+        f"from {result['chunks']} chunks, {result['errors']} unreadable archive(s) skipped"
+    )
@@ -1 +1,226 @@
-# cli
+# siem/cli.py
+
+import argparse
+import json
+import os
+import sys
+from typing import Any, Dict, Iterable, List, Optional
+
+# Subsystems are imported inside the commands that use them. The query
+# commands only load siem.storage, so they start fast and never pull in
+# tkinter, yaml or the rule engine.
+
+
+def _open_storage(db: Optional[str]):
+    """Read only: a query never migrates or otherwise changes the database."""
+    from .storage import DB_PATH, MIGRATIONS, SQLiteStorage
+
+    path = db or DB_PATH
+    if not os.path.exists(path):
+        print(f"No database at {path}, run `watchtower ingest` first", file=sys.stderr)
+        raise SystemExit(1)
+    storage = SQLiteStorage(db_path=path)
+    storage.connect_readonly()
+    if storage.schema_version() < len(MIGRATIONS):
+        storage.close()
+        print(f"Database {path} has an older schema, run `watchtower ingest` first", file=sys.stderr)
+        raise SystemExit(1)
+    return storage
+
+
+def _print_rows(rows: Iterable[Dict[str, Any]], columns: List[str], as_json: bool) -> None:
+    """One JSON object per line with --json, otherwise tab separated columns."""
+    for row in rows:
+        if as_json:
+            print(json.dumps(row, default=str))
+        else:
+            print("\t".join("" if row.get(c) is None else str(row[c]) for c in columns))
+
+
+def cmd_ingest(args: argparse.Namespace) -> int:
+    from .pipeline import run_headless
+    from .storage import DB_PATH
+
+    receiver = None
+    if args.syslog is not None:
+        from .syslog_receiver import SyslogReceiver
+
+        receiver = SyslogReceiver(host=args.syslog_host, port=args.syslog)
+        print(f"Listening for syslog on {args.syslog_host}:{args.syslog}")
+
+    stats = run_headless(
+        follow=args.follow,
+        report_every=args.report_every,
+        archives=args.archives,
+        receiver=receiver,
+        db_path=args.db or DB_PATH,
+    )
+    print(f"Ingested {stats['writer']['items']} events")
+    return 0
+
+
+def cmd_backfill(args: argparse.Namespace) -> int:
+    from .backfill import run_backfill
+    from .storage import DB_PATH, SQLiteStorage
+
+    storage = SQLiteStorage(db_path=args.db or DB_PATH)
+    storage.connect()
+    storage.init_db()
+    try:
+        result = run_backfill(
+            args.paths,
+            storage,
+            workers=args.workers,
+            chunk_size=args.chunk_mb * 1024 * 1024,
+        )
+    finally:
+        storage.close()
+    print(
+        f"Backfill done: {result['events']} events, {result['alerts']} alerts "
+        f"from {result['chunks']} chunks, {result['errors']} unreadable archive(s) skipped"
+    )
+    return 0
+
+
+ALERT_COLUMNS = ["id", "last_seen", "severity", "rule_name", "src_ip", "user", "count", "message"]
+EVENT_COLUMNS = ["id", "timestamp", "source", "action", "user", "src_ip", "raw"]
+
+
+def cmd_alerts(args: argparse.Namespace) -> int:
+    storage = _open_storage(args.db)
+    try:
+        rows = storage.fetch_alerts(
+            severity=args.severity,
+            src_ip=args.src_ip,
+            rule_name=args.rule,
+            limit=args.limit,
+            before_id=args.before,
+        )
+    finally:
+        storage.close()
+    _print_rows(rows, ALERT_COLUMNS, args.json)
+    return 0
+
+
+def cmd_events(args: argparse.Namespace) -> int:
+    time_range = (args.since, args.until) if args.since or args.until else None
+    storage = _open_storage(args.db)
+    try:
+        if args.search:
+            rows = storage.search_events(args.search, time_range=time_range, limit=args.limit, before_id=args.before)
+        else:
+            rows = storage.fetch_events(
+                limit=args.limit, before_id=args.before, src_ip=args.src_ip, time_range=time_range
+            )
+    finally:
+        storage.close()
+    _print_rows(rows, EVENT_COLUMNS, args.json)
+    return 0
+
+
+def cmd_stats(args: argparse.Namespace) -> int:
+    from .metrics import METRICS_PATH, format_report
+
+    storage = _open_storage(args.db)
+    try:
+        data: Dict[str, Any] = {"database": storage.db_path, **storage.summary()}
+    finally:
+        storage.close()
+
+    # Numbers from a running ingest, if one dumped any
+    try:
+        with open(args.metrics or METRICS_PATH, encoding="utf-8") as f:
+            data["metrics"] = json.load(f)
+    except (OSError, ValueError):
+        data["metrics"] = None
+
+    if args.json:
+        print(json.dumps(data, indent=2))
+        return 0
+
+    for key, value in data.items():
+        if key == "metrics":
+            continue
+        if key == "alerts_by_severity":
+            value = ", ".join(f"{name}={n}" for name, n in value.items()) or "-"
+        print(f"{key:20} {value}")
+    if data["metrics"]:
+        print()
+        print("\n".join(format_report(data["metrics"])))
+    return 0
+
+
+def cmd_gui(args: argparse.Namespace) -> int:
+    from ui.app import WatchtowerApp
+
+    WatchtowerApp().mainloop()
+    return 0
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="watchtower", description="Watchtower SIEM")
+    parser.add_argument("--db", default=None, help="SQLite database, default data/siem.db")
+    commands = parser.add_subparsers(dest="command", metavar="command")
+
+    p = commands.add_parser("ingest", help="run the ingest pipeline without the GUI")
+    mode = p.add_mutually_exclusive_group()
+    mode.add_argument("--follow", action="store_true", help="keep tailing the log files until Ctrl+C")
+    mode.add_argument("--syslog", type=int, metavar="PORT", help="receive syslog on PORT instead of reading files")
+    p.add_argument("--syslog-host", default="0.0.0.0", help="address to receive syslog on")
+    p.add_argument("--archives", action="store_true", help="also read rotated and compressed logs, once each")
+    p.add_argument("--report-every", type=float, default=5.0, help="seconds between queue reports")
+    p.set_defaults(func=cmd_ingest)
+
+    p = commands.add_parser("backfill", help="replay archived log files with a process pool")
+    p.add_argument("paths", nargs="+", metavar="PATH")
+    p.add_argument("--workers", type=int, default=None)
+    p.add_argument("--chunk-mb", type=int, default=8)
+    p.set_defaults(func=cmd_backfill)
+
+    p = commands.add_parser("alerts", help="list alerts, newest first")
+    p.add_argument("--severity")
+    p.add_argument("--src-ip")
+    p.add_argument("--rule", help="rule name")
+    p.add_argument("--limit", type=int, default=50)
+    p.add_argument("--before", type=int, metavar="ID", help="page: alerts older than this id")
+    p.add_argument("--json", action="store_true", help="one JSON object per line")
+    p.set_defaults(func=cmd_alerts)
+
+    p = commands.add_parser("events", help="list or search events, newest first")
+    match = p.add_mutually_exclusive_group()
+    match.add_argument("--search", metavar="TEXT", help="full text search, every word must match")
+    match.add_argument("--src-ip")
+    p.add_argument("--since", metavar="ISO", help="events at or after this timestamp")
+    p.add_argument("--until", metavar="ISO", help="events before this timestamp")
+    p.add_argument("--limit", type=int, default=50)
+    p.add_argument("--before", type=int, metavar="ID", help="page: events older than this id")
+    p.add_argument("--json", action="store_true", help="one JSON object per line")
+    p.set_defaults(func=cmd_events)
+
+    p = commands.add_parser("stats", help="database counts and the metrics of a running ingest")
+    p.add_argument("--metrics", default=None, help="metrics dump, default data/metrics.json")
+    p.add_argument("--json", action="store_true")
+    p.set_defaults(func=cmd_stats)
+
+    p = commands.add_parser("gui", help="open the Tk interface")
+    p.set_defaults(func=cmd_gui)
+    return parser
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = build_parser().parse_args(argv)
+    if args.command is None:
+        # What `python main.py` has always done
+        args.func = cmd_gui
+    try:
+        return args.func(args)
+    except KeyboardInterrupt:
+        return 130
+    except BrokenPipeError:
+        # `watchtower events | head`, keep the exit at shutdown quiet too
+        os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+        return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
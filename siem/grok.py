@@ -0,0 +1,251 @@
+# siem/grok.py
+
+import re
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Pattern, Tuple
+
+import yaml
+
+from .models import Event
+
+# Building blocks for %{NAME} and %{NAME:field} in parser patterns
+GROK_PATTERNS: Dict[str, str] = {
+    "WORD": r"\w+",
+    "NOTSPACE": r"\S+",
+    "USER": r"\S+",
+    "INT": r"[+-]?\d+",
+    "NUMBER": r"[+-]?\d+(?:\.\d+)?",
+    "IPV4": r"\d{1,3}(?:\.\d{1,3}){3}",
+    "IPV6": r"[0-9A-Fa-f]*:[0-9A-Fa-f:.]+",
+    "IP": r"(?:\d{1,3}(?:\.\d{1,3}){3}|[0-9A-Fa-f]*:[0-9A-Fa-f:.]+)",
+    "HOSTNAME": r"[\w.-]+",
+    "PATH": r"/\S*",
+    "DATA": r".*?",
+    "GREEDYDATA": r".*",
+}
+
+# Event attributes a pattern field can set, anything else goes to Event.extra
+EVENT_FIELDS = ("action", "user", "src_ip")
+
+_MACRO_RE = re.compile(r"%\{(\w+)(?::(\w+))?\}")
+# Literal text a pattern starts with, up to its first regex syntax
+_LEAD_RE = re.compile(r"[^\\.^$*+?{}\[\]|()%]*")
+_GROUP_RE = re.compile(r"\(\?P([<=])(\w+)")
+
+# Compiled combined regexes by their text, kept across reloads
+_regex_cache: Dict[str, Pattern] = {}
+
+# Definition file -> ((mtime_ns, size), parser) from the last load
+_file_cache: Dict[str, Tuple[Tuple[int, int], "GrokParser"]] = {}
+
+
+def _has_top_level_alternation(pattern: str) -> bool:
+    depth, escaped, in_class = 0, False, False
+    for ch in pattern:
+        if escaped:
+            escaped = False
+        elif ch == "\\":
+            escaped = True
+        elif in_class:
+            in_class = ch != "]"
+        elif ch == "[":
+            in_class = True
+        elif ch == "(":
+            depth += 1
+        elif ch == ")":
+            depth -= 1
+        elif ch == "|" and depth == 0:
+            return True
+    return False
+
+
+def literal_prefix(pattern: str) -> str:
+    """The literal text every match of pattern starts with, maybe empty."""
+    if _has_top_level_alternation(pattern):
+        return ""
+    lead = _LEAD_RE.match(pattern).group(0)
+    # a quantifier binds to the last character, which is then optional
+    if len(lead) < len(pattern) and pattern[len(lead)] in "*?{":
+        lead = lead[:-1]
+    return lead
+
+
+def expand(pattern: str, prefix: str) -> Tuple[str, List[Tuple[str, str]]]:
+    """
+    Expand %{NAME:field} macros into named groups, prefixing every group
+    name so patterns can share one regex. Returns the regex and its
+    (group, field) pairs.
+    """
+    def macro(m: "re.Match") -> str:
+        name, field = m.group(1), m.group(2)
+        if name not in GROK_PATTERNS:
+            raise ValueError(f"unknown pattern %{{{name}}}")
+        body = GROK_PATTERNS[name]
+        return f"(?P<{field}>{body})" if field else f"(?:{body})"
+
+    regex = _MACRO_RE.sub(macro, pattern)
+    fields = [name for kind, name in _GROUP_RE.findall(regex) if kind == "<"]
+    regex = _GROUP_RE.sub(lambda m: f"(?P{m.group(1)}{prefix}{m.group(2)}", regex)
+    return regex, [(prefix + field, field) for field in fields]
+
+
+class GrokParser:
+    """
+    Parser for one log source, built from a YAML definition:
+
+        source: auth
+        files: [auth.log]          # globs of its live log files
+        timestamp: syslog          # how to read the line's time
+        patterns:
+          - action: login_failed
+            prefilter: Failed      # literal the line must contain
+            match: "Failed password for %{USER:user} from %{IP:src_ip}"
+
+    All patterns are joined into one alternation, tried in order, so a
+    line is searched once however many patterns there are. Each branch
+    ends in an empty marker group rather than being wrapped in one:
+    that tells which pattern matched (it closes last) while leaving the
+    literal text each branch starts with visible to re, which then only
+    tries the branches where one of those literals' first characters
+    occurs. A first character is a weak filter though ("s" of "sudo:"
+    is in nearly every sshd line), so when patterns give a prefilter
+    literal, lines containing none of the literals skip the regex. A
+    pattern without one counts with the literal it starts with, and
+    when a pattern has neither no line can be ruled out.
+    """
+
+    def __init__(
+        self,
+        source: str,
+        globs: List[str],
+        patterns: List[Dict[str, Any]],
+        timestamp: Callable[[str], str],
+    ) -> None:
+        self.source = source
+        self.globs = globs
+        self.timestamp = timestamp
+
+        parts: List[str] = []
+        # marker group name -> (action, user group, src_ip group, and
+        # (group, field) for the other fields). Groups are None when the
+        # pattern does not set that field.
+        self.specs: Dict[str, Tuple[str, Optional[str], Optional[str], Tuple[Tuple[str, str], ...]]] = {}
+        prefilters: List[str] = []
+        explicit = False
+        leading = True
+        for i, spec in enumerate(patterns):
+            if not isinstance(spec, dict) or not isinstance(spec.get("match"), str):
+                raise ValueError(f"pattern {i} needs a match string")
+            regex, fields = expand(spec["match"], f"_{i}_")
+            re.compile(regex)  # report a bad pattern by itself, not the whole alternation
+            parts.append(f"{regex}(?P<_{i}>)")
+            groups = {field: group for group, field in fields}
+            self.specs[f"_{i}"] = (
+                str(spec.get("action", "")),
+                groups.get("user"),
+                groups.get("src_ip"),
+                tuple((group, field) for group, field in fields if field not in ("user", "src_ip")),
+            )
+
+            lead = literal_prefix(spec["match"])
+            prefilters.append(str(spec.get("prefilter") or lead))
+            explicit = explicit or bool(spec.get("prefilter"))
+            leading = leading and bool(lead)
+
+        text = "|".join(parts)
+        regex = _regex_cache.get(text)
+        if regex is None:
+            regex = _regex_cache[text] = re.compile(text)
+        self.regex: Optional[Pattern] = regex if parts else None
+        # Used when asked for, or when re cannot scan for the literals
+        # itself, and only possible when every pattern has one
+        self.prefilter: Optional[Tuple[str, ...]] = None
+        if (explicit or not leading) and all(prefilters):
+            self.prefilter = tuple(dict.fromkeys(prefilters))
+
+    def __call__(self, raw: str) -> Optional[Event]:
+        raw = raw.strip()
+        if not raw or raw.startswith("#"):
+            return None
+
+        timestamp = self.timestamp(raw)
+        if self.regex is None:
+            return Event(None, timestamp, self.source, raw)
+
+        if self.prefilter is not None:
+            for literal in self.prefilter:
+                if literal in raw:
+                    break
+            else:
+                return Event(None, timestamp, self.source, raw)
+
+        m = self.regex.search(raw)
+        if m is None:
+            return Event(None, timestamp, self.source, raw)
+
+        # The marker group closes last, so lastgroup names the pattern.
+        # user and src_ip, which nearly every pattern sets, go straight
+        # into the Event, built positionally in its field order.
+        action, user, src_ip, other = self.specs[m.lastgroup]
+        ev = Event(
+            None, timestamp, self.source, raw, action,
+            m.group(user) or "" if user else "",
+            m.group(src_ip) or "" if src_ip else "",
+        )
+        for group, field in other:
+            value = m.group(group)
+            if value is None:
+                continue
+            if field in EVENT_FIELDS:
+                setattr(ev, field, value)
+            else:
+                ev.extra[field] = value
+        return ev
+
+
+def load_file(path: Path, timestamps: Dict[str, Callable[[str], str]]) -> GrokParser:
+    """Build the parser defined in one YAML file. Raises ValueError when it is invalid."""
+    with path.open("r", encoding="utf-8") as f:
+        data = yaml.safe_load(f)
+    if not isinstance(data, dict) or not data.get("source"):
+        raise ValueError("missing source")
+    kind = data.get("timestamp", "none")
+    if kind not in timestamps:
+        raise ValueError(f"unknown timestamp '{kind}', expected one of {', '.join(timestamps)}")
+    globs = data.get("files") or []
+    if isinstance(globs, str):
+        globs = [globs]
+    try:
+        return GrokParser(str(data["source"]), [str(g) for g in globs], data.get("patterns") or [], timestamps[kind])
+    except re.error as e:
+        raise ValueError(f"invalid pattern: {e}")
+
+
+def load_dir(def_dir: Path, timestamps: Dict[str, Callable[[str], str]]) -> List[GrokParser]:
+    """
+    Parsers for every *.yaml in def_dir. Files whose mtime and size did
+    not change since the last call return the same parser object, and
+    changed files reuse compiled regexes whose text did not change.
+    Invalid files are reported and skipped.
+    """
+    parsers: List[GrokParser] = []
+    if not def_dir.is_dir():
+        return parsers
+    for path in sorted(def_dir.glob("*.yaml")):
+        try:
+            st = path.stat()
+        except OSError:
+            continue
+        signature = (st.st_mtime_ns, st.st_size)
+        cached = _file_cache.get(str(path))
+        if cached is not None and cached[0] == signature:
+            parsers.append(cached[1])
+            continue
+        try:
+            parser = load_file(path, timestamps)
+        except (OSError, yaml.YAMLError, ValueError) as e:
+            print(f"Skipping parser definition {path}: {e}")
+            continue
+        _file_cache[str(path)] = (signature, parser)
+        parsers.append(parser)
+    return parsers
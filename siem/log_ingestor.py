@@ -1,8 +1,17 @@
 # siem/log_ingestor.py
+import bz2
+import gzip
+import hashlib
+import lzma
+import mmap
 import os
+import re
+import zlib
 from pathlib import Path
-from typing import Iterator, Tuple, List, Dict
+from typing import BinaryIO, Dict, Iterable, Iterator, Tuple, List, Optional, Generator
 
+from .metrics import REGISTRY
+from .parsers import event_dict, parse_event, source_for_filename
 from .rule_engine import RuleEngine
 
 # Folder where logs live: Watchtower/data/logs
@@ -12,47 +21,446 @@ LOG_DIR = Path(os.path.dirname(os.path.dirname(__file__))) / "data" / "logs"
 BASE_DIR = Path(os.path.dirname(os.path.dirname(__file__)))
 RULE_DIR = BASE_DIR / "rules"
 
-# Map filenames to a logical source key
-SUPPORTED_SOURCES: Dict[str, str] = {
-    "auth.log": "auth",
-    "web.log": "web",
+def source_for_path(path: Path) -> Optional[str]:
+    """
+    Return the source key for a log file, including rotated or archived
+    copies such as auth.log.1 or web.log-20240101. Sources and their file
+    names are registered in siem.parsers, see register_source.
+    """
+    return source_for_filename(Path(path).name)
+
+
+# How much to read per syscall in follow mode, and per read of an archive
+READ_CHUNK_SIZE = 1024 * 1024
+
+# How much of a live log to read and decode at once in one-shot mode.
+# Measured on the benchmark logs: 64 KiB chunks read 2.5M lines/s with a
+# 293 KiB peak, 1 MiB chunks 2.0M lines/s with a 4.6 MiB peak.
+LIVE_CHUNK_SIZE = 64 * 1024
+
+# Compressed archive suffix -> class that streams it decompressed
+DECOMPRESSORS = {
+    ".gz": gzip.GzipFile,
+    ".bz2": bz2.BZ2File,
+    ".xz": lzma.LZMAFile,
 }
 
+# name, then .N or -DATE from logrotate, then a compression suffix
+_ROTATED_RE = re.compile(r"^(.+?)(?:\.(\d+)|-(\d[\d-]*))?(\.gz|\.bz2|\.xz)?$")
 
-def get_log_files() -> List[Path]:
-    """Return a list of existing log files in LOG_DIR."""
-    LOG_DIR.mkdir(parents=True, exist_ok=True)
+# (sha256 of the decompressed content, path, size on disk, mtime_ns)
+Archive = Tuple[str, str, int, int]
+
+# What reading a corrupt or truncated archive raises. Callers skip that
+# archive and go on with the others.
+ARCHIVE_ERRORS = (OSError, EOFError, lzma.LZMAError, zlib.error)
+
+# Tail position of a followed file: (path, inode, byte offset, partial line)
+Checkpoint = Tuple[str, int, int, bytes]
+
+# Lines that were not valid UTF-8. They are kept, with U+FFFD in place
+# of each bad byte sequence, so the event still shows what was there.
+INVALID_UTF8 = REGISTRY.counter("ingest.invalid_utf8_lines")
+
+
+def decode_lines(data, source_key: str) -> Iterator[Tuple[str, str]]:
+    """
+    Yield (source, line) for the non blank lines in a buffer of whole
+    lines: bytes, or a memoryview straight into a mapped file.
+
+    The buffer is decoded in one call and the text split on newlines,
+    so each line costs one str and nothing else, the bytes are never
+    copied per line. Only a buffer holding invalid UTF-8 is split into
+    bytes lines and decoded one by one, to replace and count just the
+    bad lines.
+    """
+    try:
+        text = str(data, "utf-8")
+    except UnicodeDecodeError:
+        yield from _decode_each(bytes(data), source_key)
+        return
+    lines = text.split("\n")
+    if "\r" in text:
+        lines = [line[:-1] if line[-1:] == "\r" else line for line in lines]
+    for line in lines:
+        if line and not line.isspace():
+            yield source_key, line
+
+
+def _decode_each(data: bytes, source_key: str) -> Iterator[Tuple[str, str]]:
+    for raw in data.split(b"\n"):
+        try:
+            line = raw.decode("utf-8")
+        except UnicodeDecodeError:
+            INVALID_UTF8.inc()
+            line = raw.decode("utf-8", errors="replace")
+        if line[-1:] == "\r":
+            line = line[:-1]
+        if line and not line.isspace():
+            yield source_key, line
+
+
+def _read_chunks(f: BinaryIO, source_key: str, chunk_size: int) -> Iterator[Tuple[str, str]]:
+    partial = b""
+    while True:
+        chunk = f.read(chunk_size)
+        if not chunk:
+            break
+        data = partial + chunk
+        cut = data.rfind(b"\n") + 1
+        partial = data[cut:]
+        yield from decode_lines(memoryview(data)[:cut], source_key)
+    if partial:
+        yield from decode_lines(partial, source_key)
+
+
+def iter_read_lines(path: Path, source_key: str, chunk_size: int = LIVE_CHUNK_SIZE) -> Iterator[Tuple[str, str]]:
+    """
+    Yield (source, line) for a log file read chunk_size bytes at a time,
+    decompressing archives. This is the reader for live logs: when
+    logrotate truncates the file under us read() just returns less,
+    where touching a mapped page past the new end would kill the process
+    with SIGBUS.
+    """
+    if Path(path).suffix in DECOMPRESSORS:
+        f = open_log(path)
+    else:
+        # Unbuffered, each read is one syscall straight into the chunk
+        f = open(path, "rb", buffering=0)
+    with f:
+        yield from _read_chunks(f, source_key, chunk_size)
+
+
+def iter_mapped_lines(path: Path, source_key: str, chunk_size: int = READ_CHUNK_SIZE) -> Iterator[Tuple[str, str]]:
+    """
+    Yield (source, line) for a plain log file through mmap. Chunks of
+    whole lines are decoded straight out of the mapping, without reading
+    the file into a buffer first. Only for closed files such as rotated
+    copies, see iter_read_lines.
+    """
+    with open(path, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        if size == 0:
+            return
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    try:
+        view = memoryview(mm)
+        pos = 0
+        while pos < size:
+            end = min(pos + chunk_size, size)
+            if end < size:
+                cut = mm.rfind(b"\n", pos, end) + 1
+                if cut <= pos:
+                    # one line longer than a chunk, take all of it
+                    cut = mm.find(b"\n", end) + 1 or size
+                end = cut
+            chunk = view[pos:end]
+            try:
+                yield from decode_lines(chunk, source_key)
+            finally:
+                chunk.release()
+            pos = end
+        view.release()
+    finally:
+        try:
+            mm.close()
+        except BufferError:
+            # a view is still held by an unfinished generator, let gc unmap it
+            pass
+
+
+def get_log_files(log_dir: Optional[Path] = None) -> List[Path]:
+    """Return the live log files of every registered source in LOG_DIR."""
+    log_dir = Path(log_dir) if log_dir is not None else LOG_DIR
+    log_dir.mkdir(parents=True, exist_ok=True)
+
+    files: List[Path] = []
+    with os.scandir(log_dir) as entries:
+        for entry in entries:
+            if entry.is_file() and source_for_filename(entry.name, rotated=False) is not None:
+                files.append(Path(entry.path))
+    return sorted(files)
+
+
+def is_live(path: Path) -> bool:
+    """True for a live log file, False for rotated or archived copies."""
+    return source_for_filename(Path(path).name, rotated=False) is not None
+
+
+def rotation_key(path: Path) -> tuple:
+    """
+    Sort key putting the copies of one log oldest first: dated copies
+    (web.log-20240101) by date, then numbered ones from the highest
+    number down (auth.log.3.gz, auth.log.2.gz, auth.log.1), then the
+    live file itself.
+    """
+    path = Path(path)
+    m = _ROTATED_RE.match(path.name)
+    base, number, date = m.group(1), m.group(2), m.group(3)
+    if number is not None:
+        rank: tuple = (1, -int(number), "")
+    elif date is not None:
+        rank = (0, 0, date)
+    else:
+        rank = (2, 0, "")
+    return (str(path.parent), base, rank)
+
+
+def order_log_files(paths: Iterable[Path]) -> List[Path]:
+    """Paths sorted so every log's rotated copies come in chronological order."""
+    return sorted((Path(p) for p in paths), key=rotation_key)
+
+
+def get_archive_files(log_dir: Optional[Path] = None) -> List[Path]:
+    """Rotated and compressed copies of the registered logs in LOG_DIR, oldest first."""
+    log_dir = Path(log_dir) if log_dir is not None else LOG_DIR
+    if not log_dir.is_dir():
+        return []
 
     files: List[Path] = []
-    for name in SUPPORTED_SOURCES.keys():
-        path = LOG_DIR / name
-        if path.exists():
-            files.append(path)
-    return files
+    with os.scandir(log_dir) as entries:
+        for entry in entries:
+            if entry.is_file() and source_for_filename(entry.name) is not None and not is_live(Path(entry.name)):
+                files.append(Path(entry.path))
+    return order_log_files(files)
 
 
-def iter_log_lines() -> Iterator[Tuple[str, str]]:
+def open_log(path: Path) -> BinaryIO:
+    """
+    Open a log file for binary reading, decompressing .gz, .bz2 and .xz
+    archives on the fly. The file underneath is read READ_CHUNK_SIZE at
+    a time, so streaming an archive takes few syscalls and never holds
+    more than a chunk of it in memory.
+    """
+    path = Path(path)
+    decompressor = DECOMPRESSORS.get(path.suffix)
+    raw = open(path, "rb", buffering=READ_CHUNK_SIZE)
+    if decompressor is None:
+        return raw
+    try:
+        return decompressor(fileobj=raw)
+    except BaseException:
+        raw.close()
+        raise
+
+
+def iter_file_lines(path: Path, source_key: str) -> Iterator[Tuple[str, str]]:
+    """
+    Yield (source, raw_line) pairs for one log file or compressed archive.
+    Rotated plain copies are mapped, live files and archives are read.
+    """
+    if Path(path).suffix in DECOMPRESSORS:
+        yield from iter_read_lines(path, source_key, READ_CHUNK_SIZE)
+    elif is_live(path):
+        yield from iter_read_lines(path, source_key)
+    else:
+        yield from iter_mapped_lines(path, source_key)
+
+
+def archive_digest(path: Path) -> str:
+    """
+    sha256 of an archive's decompressed content. Hashing the content
+    rather than the file means auth.log.1 and the auth.log.2.gz it is
+    compressed into later are recognised as the same archive.
+    """
+    digest = hashlib.sha256()
+    with open_log(path) as f:
+        while True:
+            chunk = f.read(READ_CHUNK_SIZE)
+            if not chunk:
+                break
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def count_lines(path: Path) -> int:
+    """Lines in an uncompressed file, counting a last line without newline."""
+    lines, last = 0, b"\n"
+    with open(path, "rb") as f:
+        for data in iter(lambda: f.read(READ_CHUNK_SIZE), b""):
+            lines += data.count(b"\n")
+            last = data[-1:]
+    return lines + (last != b"\n")
+
+
+def check_archive(path: Path, storage) -> Optional[Archive]:
+    """
+    Return the identity of an archive that still has to be ingested, or
+    None if its content was ingested before, under this name or another.
+    A file whose path, size and mtime match the last one recorded is not
+    read at all, otherwise its content is hashed.
+    """
+    st = os.stat(path)
+    if storage.archive_by_file(str(path), st.st_size, st.st_mtime_ns) is not None:
+        return None
+    archive = (archive_digest(path), str(path), st.st_size, st.st_mtime_ns)
+    if storage.archive_ingested(archive[0]):
+        # Renamed or recompressed by rotation, remember where it is now
+        storage.record_archive(*archive, lines=0)
+        return None
+    return archive
+
+
+def iter_log_lines(log_dir: Optional[Path] = None) -> Iterator[Tuple[str, str]]:
     """
     Yield (source, raw_line) pairs for all supported log files.
 
     source is a short string like "auth" or "web".
     raw_line is the full text of the line.
     """
-    for path in get_log_files():
-        source_key = SUPPORTED_SOURCES[path.name]
-        with path.open("r", encoding="utf-8") as f:
-            for line in f:
-                line = line.rstrip("\n")
-                if not line.strip():
-                    continue
-                yield source_key, line
+    for path in get_log_files(log_dir):
+        yield from iter_read_lines(path, source_for_filename(path.name))
 
 
-def ingest_all_logs() -> Iterator[Tuple[str, str]]:
+class LogTailer:
+    """
+    Follow mode for the ingestor.
+
+    Keeps a checkpoint per file (inode, byte offset, partial trailing line)
+    in SQLite, so each poll only yields lines appended since the previous
+    poll, even across restarts.
+
+    Rotation handling:
+    - copytruncate: same inode but the file is now shorter than our offset,
+      so we start again from byte 0.
+    - rename: the path now points at a new inode. We look for the old inode
+      in the log directory (auth.log.1 and friends), finish reading it from
+      the saved offset, then switch to the new file.
+
+    A renamed file is recorded as an ingested archive once drained, so
+    reading the archives later does not ingest it again.
+
+    With defer_checkpoints the tailer does not save checkpoints or
+    archives itself. take_checkpoints() and take_archives() hand them
+    over instead, so the caller can save them once the lines read up to
+    them are committed.
     """
-    Main generator that other code will use.
 
-    Later, run_full_ingest in siem.cli will loop over this.
+    def __init__(self, storage, log_dir: Optional[Path] = None, defer_checkpoints: bool = False) -> None:
+        self.storage = storage
+        self.log_dir = Path(log_dir) if log_dir is not None else LOG_DIR
+        self.defer_checkpoints = defer_checkpoints
+        # Where each file was read up to, ahead of the database when deferred
+        self.positions: Dict[str, Dict] = {}
+        self.pending: List[Checkpoint] = []
+        self.archives: List[Tuple[Archive, int]] = []
+
+    def take_checkpoints(self) -> List[Checkpoint]:
+        """Checkpoints reached since the last call, oldest first."""
+        pending, self.pending = self.pending, []
+        return pending
+
+    def take_archives(self) -> List[Tuple[Archive, int]]:
+        """(archive, lines) of the rotated files drained since the last call."""
+        archives, self.archives = self.archives, []
+        return archives
+
+    def _checkpoint(self, key: str) -> Optional[Dict]:
+        cp = self.positions.get(key)
+        return cp if cp is not None else self.storage.get_checkpoint(key)
+
+    def _save(self, key: str, inode: int, offset: int, partial: bytes) -> None:
+        cp = {"inode": inode, "offset": offset, "partial": partial}
+        if cp == self.positions.get(key):
+            return
+        self.positions[key] = cp
+        if self.defer_checkpoints:
+            self.pending.append((key, inode, offset, partial))
+        else:
+            self.storage.save_checkpoint(key, inode, offset, partial)
+
+    def poll(self) -> Iterator[Tuple[str, str]]:
+        """Yield (source, raw_line) pairs for lines added since the last poll."""
+        for path in get_log_files(self.log_dir):
+            source_key = source_for_filename(path.name)
+            yield from self._follow(path, source_key)
+
+    def _follow(self, path: Path, source_key: str) -> Iterator[Tuple[str, str]]:
+        key = str(path)
+        try:
+            f = path.open("rb")
+        except FileNotFoundError:
+            return
+
+        with f:
+            st = os.fstat(f.fileno())
+            cp = self._checkpoint(key)
+            offset = 0
+            partial = b""
+
+            if cp is not None and cp["inode"] != st.st_ino:
+                # Rename style rotation, drain the old file first
+                rotated = self._find_by_inode(cp["inode"])
+                if rotated is not None:
+                    with rotated.open("rb") as old:
+                        yield from self._read_lines(
+                            old, source_key, cp["offset"], cp["partial"], final=True
+                        )
+                    self._record_rotated(rotated)
+                elif cp["partial"]:
+                    # Old file is gone, the best we can do is emit what we had
+                    yield from decode_lines(cp["partial"], source_key)
+            elif cp is not None and st.st_size < cp["offset"]:
+                # copytruncate, the tail we had buffered will never be completed
+                if cp["partial"]:
+                    yield from decode_lines(cp["partial"], source_key)
+            elif cp is not None:
+                offset = cp["offset"]
+                partial = cp["partial"]
+
+            offset, partial = yield from self._read_lines(
+                f, source_key, offset, partial, final=False
+            )
+            self._save(key, st.st_ino, offset, partial)
+
+    def _record_rotated(self, path: Path) -> None:
+        try:
+            st = os.stat(path)
+            archive = (archive_digest(path), str(path), st.st_size, st.st_mtime_ns)
+            lines = count_lines(path)
+        except OSError as e:
+            print(f"Could not record rotated log {path}: {e}")
+            return
+        if self.defer_checkpoints:
+            self.archives.append((archive, lines))
+        else:
+            self.storage.record_archive(*archive, lines=lines)
+
+    def _find_by_inode(self, inode: int) -> Optional[Path]:
+        with os.scandir(self.log_dir) as it:
+            for entry in it:
+                if entry.is_file() and entry.inode() == inode:
+                    return Path(entry.path)
+        return None
+
+    def _read_lines(
+        self, f, source_key: str, offset: int, partial: bytes, final: bool
+    ) -> Generator[Tuple[str, str], None, Tuple[int, bytes]]:
+        """
+        Read complete lines from offset to EOF.
+        Returns the new (offset, partial) pair through StopIteration.
+        """
+        f.seek(offset)
+        while True:
+            chunk = f.read(READ_CHUNK_SIZE)
+            if not chunk:
+                break
+            offset += len(chunk)
+            data = partial + chunk
+            cut = data.rfind(b"\n") + 1
+            partial = data[cut:]
+            yield from decode_lines(memoryview(data)[:cut], source_key)
+
+        if final and partial:
+            yield from decode_lines(partial, source_key)
+            partial = b""
+        return offset, partial
+
+
+def ingest_all_logs() -> Iterator[Tuple[str, str]]:
+    """
+    All lines of the live log files in LOG_DIR. The pipeline
+    (`python main.py ingest`) reads them through iter_log_lines.
     """
     yield from iter_log_lines()
 
@@ -78,11 +486,9 @@ if __name__ == "__main__":
 
         print(f"[{source}] {raw}")
 
-        # Minimal event dict for the rule engine
-        event = {
-            "log_type": source,
-            "raw": raw,
-        }
+        # Parsed fields too, so field rules can match
+        ev = parse_event(source, raw)
+        event = event_dict(ev) if ev is not None else {"log_type": source, "raw": raw}
 
         alerts = rule_engine.match_event(event)
         for alert in alerts:
@@ -0,0 +1,256 @@
+# siem/metrics.py
+
+import json
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+# Where running processes dump their metrics, read by `python -m siem.metrics`
+METRICS_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(__file__)),
+    "data",
+    "metrics.json"
+)
+
+# Time one in this many rule evaluations, the rest only count hits
+DEFAULT_SAMPLE_EVERY = 100
+
+# Histogram buckets are powers of two in microseconds, up to about 16 s
+_BUCKETS = 25
+
+
+class Counter:
+    __slots__ = ("value",)
+
+    def __init__(self) -> None:
+        self.value = 0
+
+    def inc(self, n: int = 1) -> None:
+        self.value += n
+
+
+class Histogram:
+    """
+    Latency histogram with power-of-two microsecond buckets.
+
+    observe() is a few integer operations and no allocation, so it is
+    cheap enough for hot paths. Percentiles are approximate: they report
+    the upper bound of the bucket the percentile falls in.
+    """
+
+    __slots__ = ("buckets", "count", "total", "max")
+
+    def __init__(self) -> None:
+        self.buckets = [0] * _BUCKETS
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds: float) -> None:
+        micros = int(seconds * 1_000_000)
+        self.buckets[min(micros.bit_length(), _BUCKETS - 1)] += 1
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def percentile(self, q: float) -> float:
+        """Approximate q-th percentile (0..1) in seconds."""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for i, n in enumerate(self.buckets):
+            seen += n
+            if seen >= rank:
+                return min((1 << i) / 1_000_000, self.max)
+        return self.max
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "count": self.count,
+            "mean_ms": round(self.total / self.count * 1000, 4) if self.count else 0.0,
+            "p50_ms": round(self.percentile(0.50) * 1000, 4),
+            "p99_ms": round(self.percentile(0.99) * 1000, 4),
+            "max_ms": round(self.max * 1000, 4),
+        }
+
+
+class MetricsRegistry:
+    """
+    Named counters and histograms plus collectors.
+
+    Hot code keeps its own Counter / Histogram objects (or plain ints)
+    and the registry only reads them when a snapshot is taken. Components
+    that already track their own numbers register a collector, a
+    function returning a dict, instead of copying them here.
+
+    Updates are not locked: a snapshot taken while another thread
+    records may be off by an observation, which is fine for monitoring.
+    """
+
+    def __init__(self) -> None:
+        self.counters: Dict[str, Counter] = {}
+        self.histograms: Dict[str, Histogram] = {}
+        self.collectors: Dict[str, Callable[[], Any]] = {}
+        self.started = time.time()
+
+    def counter(self, name: str) -> Counter:
+        counter = self.counters.get(name)
+        if counter is None:
+            counter = self.counters[name] = Counter()
+        return counter
+
+    def histogram(self, name: str) -> Histogram:
+        histogram = self.histograms.get(name)
+        if histogram is None:
+            histogram = self.histograms[name] = Histogram()
+        return histogram
+
+    def register(self, name: str, collector: Callable[[], Any]) -> None:
+        self.collectors[name] = collector
+
+    def unregister(self, name: str, collector: Optional[Callable[[], Any]] = None) -> None:
+        # Only drop it if it was not replaced by someone else in the meantime
+        if collector is None or self.collectors.get(name) == collector:
+            self.collectors.pop(name, None)
+
+    def snapshot(self) -> Dict[str, Any]:
+        data: Dict[str, Any] = {
+            "time": time.time(),
+            "uptime_seconds": round(time.time() - self.started, 1),
+            "counters": {name: c.value for name, c in self.counters.items()},
+            "histograms": {name: h.snapshot() for name, h in self.histograms.items()},
+        }
+        for name, collector in list(self.collectors.items()):
+            try:
+                data[name] = collector()
+            except Exception as e:
+                data[name] = {"error": str(e)}
+        return data
+
+    def dump(self, path: str = METRICS_PATH) -> None:
+        """Write a snapshot as JSON, atomically so readers never see half a file."""
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.snapshot(), f, indent=2)
+        os.replace(tmp, path)
+
+
+# Process wide registry used by RuleEngine and Pipeline unless given another
+REGISTRY = MetricsRegistry()
+
+
+class MetricsDumper:
+    """Background thread that dumps a registry to a JSON file every interval seconds."""
+
+    def __init__(self, registry: MetricsRegistry = REGISTRY, path: str = METRICS_PATH, interval: float = 5.0) -> None:
+        self.registry = registry
+        self.path = path
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self._run, name="metrics-dumper", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self._dump()
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            self._dump()
+
+    def _dump(self) -> None:
+        try:
+            self.registry.dump(self.path)
+        except OSError as e:
+            print(f"Could not write metrics to {self.path}: {e}")
+
+
+def format_report(data: Dict[str, Any]) -> List[str]:
+    """Human readable lines for a metrics snapshot."""
+    lines = [f"uptime {data.get('uptime_seconds', 0)} s"]
+
+    stages = stage_rows(data)
+    if stages:
+        lines.append("")
+        lines.append(f"{'stage':14} {'items':>10} {'busy s':>9} {'p50 ms':>9} {'p99 ms':>9} {'queue':>9}")
+        for name, items, busy, p50_ms, p99_ms, queue in stages:
+            lines.append(f"{name:14} {items:>10} {busy:>9} {p50_ms:>9} {p99_ms:>9} {queue:>9}")
+
+    rules = rule_rows(data)
+    if rules:
+        lines.append("")
+        lines.append(f"{'rule':30} {'hits':>10} {'sampled':>8} {'mean ms':>9} {'p99 ms':>9}")
+        for name, hits, sampled, mean_ms, p99_ms in rules:
+            lines.append(f"{name[:30]:30} {hits:>10} {sampled:>8} {mean_ms:>9} {p99_ms:>9}")
+    return lines
+
+
+def stage_rows(data: Dict[str, Any]) -> List[tuple]:
+    """
+    (stage, items, busy seconds, p50 ms, p99 ms per batch, queue) per
+    pipeline stage, with the writer's SQLite commit as its own row.
+    """
+    rows = []
+    for name, s in (data.get("pipeline") or {}).items():
+        latency = s.get("latency") or {}
+        queue = f"{s['queue_depth']}/{s['queue_size']}" if s.get("queue_size") else "-"
+        rows.append((name, s["items"], s["busy_seconds"], latency.get("p50_ms", 0), latency.get("p99_ms", 0), queue))
+        commit = s.get("commit")
+        if commit:
+            rows.append((f"{name} commit", "-", round(commit["mean_ms"] * commit["count"] / 1000, 3),
+                         commit["p50_ms"], commit["p99_ms"], "-"))
+    return rows
+
+
+def rule_rows(data: Dict[str, Any]) -> List[tuple]:
+    """
+    (name, hits, sampled evaluations, mean ms, p99 ms) per rule, plus the
+    shared literal lookups, most expensive first.
+    """
+    rules = data.get("rules") or {}
+    rows = [
+        (rule_id, r["hits"], r["eval"]["count"], r["eval"]["mean_ms"], r["eval"]["p99_ms"])
+        for rule_id, r in (rules.get("rules") or {}).items()
+    ]
+    rows += [
+        (name, "-", h["count"], h["mean_ms"], h["p99_ms"])
+        for name, h in (rules.get("shared") or {}).items()
+    ]
+    rows.sort(key=lambda row: row[3], reverse=True)
+    return rows
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Show metrics dumped by a running Watchtower process")
+    parser.add_argument("--path", default=METRICS_PATH)
+    parser.add_argument("--json", action="store_true", help="print the raw JSON dump")
+    parser.add_argument("--watch", type=float, default=0, help="refresh every N seconds")
+    args = parser.parse_args()
+
+    while True:
+        try:
+            with open(args.path, encoding="utf-8") as f:
+                snapshot = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"No metrics at {args.path}: {e}")
+            raise SystemExit(1)
+
+        if args.json:
+            print(json.dumps(snapshot, indent=2))
+        else:
+            print("\n".join(format_report(snapshot)))
+        if not args.watch:
+            break
+        time.sleep(args.watch)
+        print()
@@ -1,6 +1,6 @@
 # models
-from dataclasses import dataclass
-from typing import Optional
+from dataclasses import dataclass, field
+from typing import Dict, Optional
 
 
 @dataclass
@@ -12,6 +12,8 @@ class Event:
     action: str = ""         # example "login_failed"
     user: str = ""
     src_ip: str = ""
+    # source specific fields for rules, e.g. HTTP method and status. Not stored.
+    extra: Dict[str, str] = field(default_factory=dict)
 
 
 @dataclass
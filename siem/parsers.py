@@ -1,100 +1,347 @@
 # siem/parsers.py
+import os
 import re
-from datetime import datetime
-from typing import Optional
+from datetime import datetime, timedelta, timezone, tzinfo
+from fnmatch import fnmatchcase
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
 
+from . import grok
 from .models import Event
 
-# Regexes for auth.log lines
-AUTH_FAILED_RE = re.compile(
-    r"Failed password for (invalid user )?(?P<user>\S+) from (?P<src_ip>\d+\.\d+\.\d+\.\d+)"
-)
+MONTHS: Dict[str, int] = {
+    "Jan": 1, "Feb": 2, "Mar": 3, "Apr": 4, "May": 5, "Jun": 6,
+    "Jul": 7, "Aug": 8, "Sep": 9, "Oct": 10, "Nov": 11, "Dec": 12,
+}
 
-AUTH_ACCEPTED_RE = re.compile(
-    r"Accepted password for (?P<user>\S+) from (?P<src_ip>\d+\.\d+\.\d+\.\d+)"
-)
+# Timezone syslog timestamps are written in. None means the local zone.
+SYSLOG_TZ: Optional[tzinfo] = None
+
+# Conversions are memoized per distinct second, logs write many lines
+# per second so most lines are a dict lookup. Caches are cleared when full.
+TS_CACHE_SIZE = 4096
+_syslog_cache: Dict[str, str] = {}
+_clf_cache: Dict[str, str] = {}
+
+
+def now_timestamp() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+def syslog_timestamp(raw: str) -> Optional[str]:
+    """
+    Convert a leading syslog timestamp ("Jan  1 10:15:32") to UTC ISO format.
+
+    Syslog has no year, so we use the current one, or last year when
+    that would put the line more than a day in the future (a December
+    log read in January).
+    """
+    prefix = raw[:15]
+    cached = _syslog_cache.get(prefix)
+    if cached is not None:
+        return cached
+
+    month = MONTHS.get(prefix[:3])
+    if month is None or len(prefix) < 15 or prefix[9] != ":" or prefix[12] != ":":
+        return None
+    try:
+        day = int(prefix[4:6])
+        hour, minute, second = int(prefix[7:9]), int(prefix[10:12]), int(prefix[13:15])
+        now = datetime.now(SYSLOG_TZ or timezone.utc).astimezone(SYSLOG_TZ)
+        dt = datetime(now.year, month, day, hour, minute, second)
+        dt = dt.replace(tzinfo=SYSLOG_TZ) if SYSLOG_TZ else dt.astimezone()
+        if dt > now + timedelta(days=1):
+            dt = dt.replace(year=now.year - 1)
+    except ValueError:
+        return None
+
+    ts = dt.astimezone(timezone.utc).isoformat()
+    if len(_syslog_cache) >= TS_CACHE_SIZE:
+        _syslog_cache.clear()
+    _syslog_cache[prefix] = ts
+    return ts
+
+
+def clf_timestamp(raw: str) -> Optional[str]:
+    """
+    Convert a Common Log Format timestamp ("[10/Oct/2000:13:55:36 -0700]")
+    to UTC ISO format.
+    """
+    start = raw.find("[")
+    if start < 0:
+        return None
+    text = raw[start + 1:start + 27]
+
+    cached = _clf_cache.get(text)
+    if cached is not None:
+        return cached
+
+    month = MONTHS.get(text[3:6])
+    if month is None or len(text) < 26 or text[11] != ":" or text[20] != " ":
+        return None
+    try:
+        offset = timedelta(hours=int(text[22:24]), minutes=int(text[24:26]))
+        if text[21] == "-":
+            offset = -offset
+        dt = datetime(
+            int(text[7:11]), month, int(text[0:2]),
+            int(text[12:14]), int(text[15:17]), int(text[18:20]),
+            tzinfo=timezone(offset),
+        )
+    except ValueError:
+        return None
 
+    ts = dt.astimezone(timezone.utc).isoformat()
+    if len(_clf_cache) >= TS_CACHE_SIZE:
+        _clf_cache.clear()
+    _clf_cache[text] = ts
+    return ts
 
 def parse_auth_log(raw: str) -> Optional[Event]:
     """
-    Parse a single sshd auth.log line into an Event.
-    Focus: action = login_failed or login_success and src_ip.
+    Parse a single auth.log line into an Event, with the auth parser
+    registered: AUTH_PATTERNS, or patterns/auth.yaml when it loaded.
     """
     raw = raw.strip()
     if not raw or raw.startswith("#"):
         return None
+    return parse_event("auth", raw)
 
-    ts = datetime.now().isoformat()
 
-    m = AUTH_FAILED_RE.search(raw)
-    if m:
-        return Event(
-            timestamp=ts,
-            source="auth",
-            raw=raw,
-            action="login_failed",
-            user=m.group("user"),
-            src_ip=m.group("src_ip"),
-        )
+# Combined Log Format, used when the split fast path gives up (escaped
+# quotes inside the request or user agent, missing fields)
+CLF_RE = re.compile(
+    r'(?P<host>\S+) (?P<ident>\S+) (?P<user>\S+) \[[^\]]*\] '
+    r'"(?P<request>(?:[^"\\]|\\.)*)" (?P<status>\d{3}) (?P<bytes>\d+|-)'
+    r'(?: "(?P<referrer>(?:[^"\\]|\\.)*)" "(?P<user_agent>(?:[^"\\]|\\.)*)")?'
+)
 
-    m = AUTH_ACCEPTED_RE.search(raw)
-    if m:
-        return Event(
-            timestamp=ts,
-            source="auth",
-            raw=raw,
-            action="login_success",
-            user=m.group("user"),
-            src_ip=m.group("src_ip"),
-        )
+# Last resort for lines that are not CLF at all
+WEB_IP_RE = re.compile(r"(?P<src_ip>\d+\.\d+\.\d+\.\d+)")
 
-    # unknown auth line, still store it if we want
-    return Event(
-        timestamp=ts,
-        source="auth",
-        raw=raw,
-        action="",
-        user="",
-        src_ip="",
-    )
+# CLF writes "-" for a missing value
+_DASH = "-"
 
 
-# Very basic web log parser stub
-WEB_IP_RE = re.compile(r"(?P<src_ip>\d+\.\d+\.\d+\.\d+)")
+def _split_request(request: str) -> Tuple[str, str, str]:
+    """(method, path, protocol) of a request line, as much as it has."""
+    parts = request.split(" ")
+    if len(parts) == 3:
+        return parts[0], parts[1], parts[2]
+    if len(parts) > 3 and parts[-1].startswith("HTTP/"):
+        # unencoded spaces in the path
+        return parts[0], " ".join(parts[1:-1]), parts[-1]
+    if len(parts) == 2:
+        return parts[0], parts[1], ""
+    return "", request if request != _DASH else "", ""
+
+
+def _split_clf(raw: str) -> Optional[Tuple[str, ...]]:
+    """
+    Fast path: cut a Combined/Common Log Format line with str methods.
+    Returns (host, user, request, status, bytes, referrer, user_agent)
+    or None when the line needs the regex.
+    """
+    head, sep, rest = raw.partition(" [")
+    if not sep:
+        return None
+    head_parts = head.split(" ")
+    if len(head_parts) != 3:
+        return None
+    _, sep, rest = rest.partition('] "')
+    if not sep:
+        return None
+    request, sep, rest = rest.partition('" ')
+    if not sep or request.endswith("\\"):
+        return None
+
+    parts = rest.split(" ", 2)
+    if len(parts) < 2:
+        return None
+    status, size = parts[0], parts[1]
+    if len(status) != 3 or not status.isdigit() or not (size.isdigit() or size == _DASH):
+        return None
+
+    referrer = agent = ""
+    if len(parts) == 3:
+        tail = parts[2]
+        if len(tail) < 2 or tail[0] != '"' or tail[-1] != '"' or "\\" in tail:
+            return None
+        referrer, sep, agent = tail[1:-1].partition('" "')
+        if not sep or '"' in agent:
+            return None
+    return head_parts[0], head_parts[2], request, status, size, referrer, agent
 
 
 def parse_web_log(raw: str) -> Optional[Event]:
+    """
+    Parse an access log line in Combined or Common Log Format.
+
+    src_ip and user come from the host and authuser fields; method, path,
+    protocol, status, bytes, referrer and user_agent go to Event.extra
+    for field rules. Lines that are not CLF keep the first IPv4 address
+    and action web_event.
+    """
     raw = raw.strip()
     if not raw or raw.startswith("#"):
         return None
 
-    ts = datetime.now().isoformat()
+    ts = clf_timestamp(raw) or now_timestamp()
 
-    m = WEB_IP_RE.search(raw)
-    src_ip = m.group("src_ip") if m else ""
+    fields = _split_clf(raw)
+    if fields is None:
+        m = CLF_RE.match(raw)
+        if m is not None:
+            fields = m.group("host", "user", "request", "status", "bytes", "referrer", "user_agent")
 
-    # you can make this smarter later
+    if fields is None:
+        m = WEB_IP_RE.search(raw)
+        return Event(
+            timestamp=ts,
+            source="web",
+            raw=raw,
+            action="web_event",
+            user="",
+            src_ip=m.group("src_ip") if m else "",
+        )
+
+    host, user, request, status, size, referrer, agent = fields
+    method, path, protocol = _split_request(request)
+    # Positional, in Event field order: this runs for every access log
+    # line and keyword arguments cost a third of the Event
     return Event(
-        timestamp=ts,
-        source="web",
-        raw=raw,
-        action="web_event",
-        user="",
-        src_ip=src_ip,
+        None, ts, "web", raw, "web_request",
+        user if user != _DASH else "",
+        host,
+        {
+            "method": method,
+            "path": path,
+            "protocol": protocol,
+            "status": status,
+            "bytes": size if size != _DASH else "",
+            "referrer": referrer if referrer and referrer != _DASH else "",
+            "user_agent": agent if agent and agent != _DASH else "",
+        },
     )
 
 
+# Parser per source key and file globs per source, see register_source
+PARSERS: Dict[str, Callable[[str], Optional[Event]]] = {}
+SOURCE_GLOBS: Dict[str, str] = {}
+
+
+def register_source(source: str, globs: List[str], parser: Callable[[str], Optional[Event]]) -> None:
+    """
+    Add a log source: parser turns one of its lines into an Event, globs
+    are the names of its live log files. Rotated copies (auth.log.1,
+    web.log-20240101) are recognised from the same globs.
+    """
+    PARSERS[source] = parser
+    for pattern in globs:
+        SOURCE_GLOBS[pattern] = source
+
+
+def source_for_filename(name: str, rotated: bool = True) -> Optional[str]:
+    """Source key for a log file name, the first registered glob wins."""
+    for pattern, source in SOURCE_GLOBS.items():
+        if fnmatchcase(name, pattern):
+            return source
+        if rotated and (fnmatchcase(name, pattern + ".*") or fnmatchcase(name, pattern + "-*")):
+            return source
+    return None
+
+
+def _syslog_or_now(raw: str) -> str:
+    return syslog_timestamp(raw) or now_timestamp()
+
+
+def _clf_or_now(raw: str) -> str:
+    return clf_timestamp(raw) or now_timestamp()
+
+
+def _now(raw: str) -> str:
+    return now_timestamp()
+
+
+# Timestamp readers YAML parser definitions can name
+TIMESTAMPS: Dict[str, Callable[[str], str]] = {
+    "syslog": _syslog_or_now,
+    "clf": _clf_or_now,
+    "none": _now,
+}
+
+# YAML parser definitions, one file per source
+PATTERN_DIR = Path(os.path.dirname(os.path.dirname(__file__))) / "patterns"
+
+
+def load_parser_defs(def_dir: Path = PATTERN_DIR) -> List[str]:
+    """
+    Register the sources defined in def_dir, replacing earlier versions.
+    Unchanged files keep their compiled parser, so calling this again
+    is one stat per file. Returns the source keys registered.
+    """
+    sources = []
+    for parser in grok.load_dir(Path(def_dir), TIMESTAMPS):
+        register_source(parser.source, parser.globs, parser)
+        sources.append(parser.source)
+    return sources
+
+
+# Built in auth.log parser, the same patterns as patterns/auth.yaml. That
+# file replaces it when it loads, without it auth.log is still parsed.
+AUTH_PATTERNS: List[Dict[str, str]] = [
+    {
+        "action": "login_failed",
+        "prefilter": "Failed ",
+        "match": "Failed (?:password|publickey) for (?:invalid user )?%{USER:user} from %{IP:src_ip}",
+    },
+    {
+        "action": "login_success",
+        "prefilter": "Accepted ",
+        "match": "Accepted (?:password|publickey) for %{USER:user} from %{IP:src_ip}",
+    },
+    {
+        "action": "invalid_user",
+        "prefilter": "Invalid user ",
+        "match": "Invalid user %{USER:user} from %{IP:src_ip}",
+    },
+    {
+        "action": "sudo",
+        "prefilter": "sudo:",
+        "match": "sudo: +%{USER:user} : .*?COMMAND=%{GREEDYDATA:command}",
+    },
+]
+
+register_source("auth", ["auth.log"], grok.GrokParser("auth", ["auth.log"], AUTH_PATTERNS, _syslog_or_now))
+register_source("web", ["web.log", "access.log"], parse_web_log)
+load_parser_defs()
+
+
+def event_dict(ev: Event) -> Dict[str, str]:
+    """Build the event dict that RuleEngine expects from a parsed Event."""
+    event = {
+        "log_type": ev.source,
+        "raw": ev.raw,
+        "user": ev.user,
+        "src_ip": ev.src_ip,
+        "action": ev.action,
+        "timestamp": ev.timestamp,
+    }
+    if ev.extra:
+        event = {**ev.extra, **event}
+    return event
+
+
 def parse_event(source: str, raw: str) -> Optional[Event]:
     """
     Main entry point: choose the right parser based on source key.
     """
-    if source == "auth":
-        return parse_auth_log(raw)
-    if source == "web":
-        return parse_web_log(raw)
+    parser = PARSERS.get(source)
+    if parser is not None:
+        return parser(raw)
 
-    # unknown source for now
-    ts = datetime.now().isoformat()
+    # unknown source, keep the line with just a timestamp
+    ts = syslog_timestamp(raw) or now_timestamp()
     return Event(timestamp=ts, source=source, raw=raw)
 
 
@@ -0,0 +1,130 @@
+# siem/partitions.py
+
+import sqlite3
+from datetime import date, datetime, timezone
+from typing import List, Optional
+
+# Events live in one table per UTC day: events_p20240101, events_p20240102, ...
+PARTITION_PREFIX = "events_p"
+PARTITION_GLOB = PARTITION_PREFIX + "[0-9]" * 8
+
+# Event ids are globally unique and ordered by day: a day's ids start at
+# its ordinal shifted left by 32 bits, leaving room for 4 billion rows a day
+ID_SHIFT = 32
+
+
+def partition_day(timestamp: Optional[str]) -> str:
+    """Return the YYYYMMDD partition for an ISO timestamp, today for bad input."""
+    if timestamp and len(timestamp) >= 10 and timestamp[4] == "-" and timestamp[7] == "-":
+        day = timestamp[0:4] + timestamp[5:7] + timestamp[8:10]
+        if day.isdigit():
+            return day
+    return datetime.now(timezone.utc).strftime("%Y%m%d")
+
+
+def partition_table(day: str) -> str:
+    return PARTITION_PREFIX + day
+
+
+def base_id(day: str) -> int:
+    d = date(int(day[0:4]), int(day[4:6]), int(day[6:8]))
+    return d.toordinal() << ID_SHIFT
+
+
+def day_of_id(event_id: int) -> str:
+    return date.fromordinal(event_id >> ID_SHIFT).strftime("%Y%m%d")
+
+
+def create_partition(conn: sqlite3.Connection, day: str) -> None:
+    """Create a day's table, indexes and FTS index. Call inside a write transaction."""
+    table = partition_table(day)
+    conn.execute(
+        f"""
+        CREATE TABLE IF NOT EXISTS {table} (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            timestamp TEXT,
+            source TEXT,
+            raw TEXT,
+            action TEXT,
+            user TEXT,
+            src_ip TEXT,
+            template_id INTEGER,
+            params TEXT
+        )
+        """
+    )
+    conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{table}_src_ip ON {table} (src_ip)")
+    conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{table}_timestamp ON {table} (timestamp)")
+    conn.execute(
+        f"""
+        CREATE VIRTUAL TABLE IF NOT EXISTS {table}_fts
+        USING fts5(raw, action, user, src_ip, content='')
+        """
+    )
+
+    # Start the AUTOINCREMENT sequence at the day's id range
+    seeded = conn.execute("SELECT 1 FROM sqlite_sequence WHERE name = ?", (table,)).fetchone()
+    if seeded is None:
+        conn.execute(
+            "INSERT INTO sqlite_sequence (name, seq) VALUES (?, ?)",
+            (table, base_id(day)),
+        )
+
+
+def list_partitions(conn: sqlite3.Connection) -> List[str]:
+    """Return the days that have an events partition, oldest first."""
+    rows = conn.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'table' AND name GLOB ?",
+        (PARTITION_GLOB,),
+    ).fetchall()
+    return sorted(row[0][len(PARTITION_PREFIX):] for row in rows)
+
+
+def drop_partition(conn: sqlite3.Connection, day: str) -> None:
+    table = partition_table(day)
+    conn.execute(f"DROP TABLE IF EXISTS {table}_fts")
+    conn.execute(f"DROP TABLE IF EXISTS {table}")
+    conn.execute("DELETE FROM sqlite_sequence WHERE name = ?", (table,))
+
+
+def days_in_range(days: List[str], start: Optional[str], end: Optional[str]) -> List[str]:
+    """Keep the partition days that can hold timestamps in [start, end)."""
+    if start:
+        first = partition_day(start)
+        days = [d for d in days if d >= first]
+    if end:
+        last = partition_day(end)
+        days = [d for d in days if d <= last]
+    return days
+
+
+def migrate_legacy_events(conn: sqlite3.Connection) -> None:
+    """Move rows from the old single events table into day partitions."""
+    prefixes = [row[0] for row in conn.execute("SELECT DISTINCT substr(timestamp, 1, 10) FROM events")]
+    days = set()
+    for prefix in prefixes:
+        day = partition_day(prefix)
+        table = partition_table(day)
+        create_partition(conn, day)
+        days.add(day)
+        conn.execute(
+            f"""
+            INSERT INTO {table} (timestamp, source, raw, action, user, src_ip)
+            SELECT timestamp, source, raw, action, user, src_ip FROM events
+            WHERE substr(timestamp, 1, 10) IS ?
+            ORDER BY id
+            """,
+            (prefix,),
+        )
+
+    for day in sorted(days):
+        table = partition_table(day)
+        conn.execute(
+            f"""
+            INSERT INTO {table}_fts (rowid, raw, action, user, src_ip)
+            SELECT id, raw, action, user, src_ip FROM {table}
+            """
+        )
+
+    conn.execute("DROP TABLE IF EXISTS events_fts")
+    conn.execute("DROP TABLE events")
@@ -0,0 +1,513 @@
+# siem/pipeline.py
+
+import queue
+import threading
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+from .alerts import AlertAggregator
+from .log_ingestor import ARCHIVE_ERRORS, Archive, Checkpoint, LogTailer, check_archive, get_archive_files, iter_file_lines, iter_log_lines, source_for_path
+from .metrics import REGISTRY, Histogram, MetricsDumper, MetricsRegistry
+from .models import Event
+from .parsers import event_dict, load_parser_defs, parse_event
+from .rule_engine import RuleEngine
+from .storage import DB_PATH, SQLiteStorage
+from .syslog_receiver import SyslogReceiver
+
+# Marks the end of the stream, passed down from stage to stage
+_STOP = object()
+
+# How long an idle writer waits for lines before checking whether a new
+# UTC day started and retention is due
+RETENTION_CHECK_SECONDS = 60.0
+
+
+def _utc_day() -> str:
+    return time.strftime("%Y%m%d", time.gmtime())
+
+
+# (event, alert dict) pairs handed to on_alerts after they are committed
+AlertBatch = List[Tuple[Event, Dict[str, Any]]]
+
+
+class _Marker:
+    """Passed down the stages untouched, behind the lines it is about. The
+    writer acts on it once those lines are committed."""
+
+    __slots__ = ()
+
+
+class _ArchiveDone(_Marker):
+    """Follows the last lines of an archive, which the writer then records
+    as ingested."""
+
+    __slots__ = ("archive", "lines")
+
+    def __init__(self, archive: Archive, lines: int) -> None:
+        self.archive = archive
+        self.lines = lines
+
+
+class _Checkpoints(_Marker):
+    """Follows a poll of the tailer. The writer saves its checkpoints in the
+    transaction that commits the lines read up to them."""
+
+    __slots__ = ("checkpoints",)
+
+    def __init__(self, checkpoints: List[Checkpoint]) -> None:
+        self.checkpoints = checkpoints
+
+
+class StageStats:
+    def __init__(self, name: str, inbox: Optional[queue.Queue]) -> None:
+        self.name = name
+        self.inbox = inbox
+        self.batches = 0
+        self.items = 0
+        # Inputs given up on, such as unreadable archives
+        self.errors = 0
+        self.busy_seconds = 0.0
+        # Time spent per batch, and for the writer the SQLite commit alone
+        self.latency = Histogram()
+        self.commit: Optional[Histogram] = None
+
+    def record(self, seconds: float) -> None:
+        self.busy_seconds += seconds
+        self.latency.observe(seconds)
+
+    def snapshot(self) -> Dict[str, Any]:
+        data = {
+            "queue_depth": self.inbox.qsize() if self.inbox is not None else 0,
+            "queue_size": self.inbox.maxsize if self.inbox is not None else 0,
+            "batches": self.batches,
+            "items": self.items,
+            "errors": self.errors,
+            "busy_seconds": round(self.busy_seconds, 3),
+            "latency": self.latency.snapshot(),
+        }
+        if self.commit is not None:
+            data["commit"] = self.commit.snapshot()
+        return data
+
+
+class Pipeline:
+    """
+    Ingest pipeline split into threaded stages:
+
+        reader -> parser -> matcher -> writer
+
+    Stages hand each other lists of items (batches) through bounded
+    queues. When a downstream stage falls behind its inbox fills up and
+    put() blocks, which slows the stages above it instead of growing
+    memory. stats() reports each stage's inbox depth, so the stage with
+    a full inbox in front of it is the bottleneck.
+
+    The writer opens its own SQLite connection and commits everything it
+    finds waiting in its inbox as one transaction. Alerts are folded into
+    groups by an AlertAggregator; on_alerts, if given, is called from the
+    writer thread with the alerts that opened a new group in each commit.
+    With retention_days set, the writer also drops expired event
+    partitions once per UTC day, also while no lines arrive. With archives set, one-shot mode first
+    reads the rotated and compressed copies of each log, oldest first,
+    skipping those ingested by an earlier run. Given a SyslogReceiver,
+    the reader serves it instead of reading files, until stop(). With
+    rule_reload_interval set, a
+    separate thread checks the rule and parser definition files that
+    often and swaps changed ones in without pausing the other stages.
+    """
+
+    def __init__(
+        self,
+        rule_engine: RuleEngine,
+        db_path: str = DB_PATH,
+        log_dir: Optional[Path] = None,
+        follow: bool = False,
+        poll_interval: float = 1.0,
+        batch_size: int = 500,
+        queue_size: int = 8,
+        on_alerts: Optional[Callable[[AlertBatch], None]] = None,
+        retention_days: Optional[int] = None,
+        metrics: Optional[MetricsRegistry] = REGISTRY,
+        rule_reload_interval: float = 0,
+        archives: bool = False,
+        receiver: Optional[SyslogReceiver] = None,
+    ) -> None:
+        self.rule_engine = rule_engine
+        self.db_path = db_path
+        self.log_dir = log_dir
+        self.follow = follow
+        self.poll_interval = poll_interval
+        self.batch_size = batch_size
+        self.on_alerts = on_alerts
+        self.retention_days = retention_days
+        self.rule_reload_interval = rule_reload_interval
+        self.archives = archives
+        self.receiver = receiver
+
+        self.lines: queue.Queue = queue.Queue(maxsize=queue_size)
+        self.events: queue.Queue = queue.Queue(maxsize=queue_size)
+        self.matched: queue.Queue = queue.Queue(maxsize=queue_size)
+
+        self.stages = {
+            "reader": StageStats("reader", None),
+            "parser": StageStats("parser", self.lines),
+            "matcher": StageStats("matcher", self.events),
+            "writer": StageStats("writer", self.matched),
+        }
+        self.stages["writer"].commit = Histogram()
+        if metrics is not None:
+            metrics.register("pipeline", self.stats)
+
+        self._stop = threading.Event()
+        self._threads: List[threading.Thread] = []
+        self.error: Optional[BaseException] = None
+
+    # -------------- control --------------
+
+    def start(self) -> None:
+        targets = [
+            ("reader", self._read),
+            ("parser", self._parse),
+            ("matcher", self._match),
+            ("writer", self._write),
+        ]
+        for name, target in targets:
+            t = threading.Thread(target=self._guard, args=(name, target), name=f"pipeline-{name}", daemon=True)
+            t.start()
+            self._threads.append(t)
+
+        if self.rule_reload_interval > 0:
+            threading.Thread(target=self._watch_rules, name="pipeline-rules", daemon=True).start()
+
+    def stop(self) -> None:
+        """Ask the reader to finish, the other stages drain and exit after it."""
+        self._stop.set()
+
+    def join(self, timeout: Optional[float] = None) -> None:
+        for t in self._threads:
+            t.join(timeout)
+
+    def running(self) -> bool:
+        return any(t.is_alive() for t in self._threads)
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        return {name: stage.snapshot() for name, stage in self.stages.items()}
+
+    def run(self) -> Dict[str, Dict[str, Any]]:
+        """Start the stages and wait for them to finish (one-shot mode)."""
+        self.start()
+        self.join()
+        if self.error is not None:
+            raise self.error
+        return self.stats()
+
+    # -------------- stages --------------
+
+    def _watch_rules(self) -> None:
+        # Runs until the stages are done. Both loaders only stat their files
+        # unless one changed, and swap the new version in atomically.
+        while self.running() and not self._stop.wait(self.rule_reload_interval):
+            try:
+                self.rule_engine.load_rules()
+                load_parser_defs()
+            except Exception as e:
+                print(f"Rule reload failed, keeping the current rules: {e}")
+
+    def _guard(self, name: str, target: Callable[[], None]) -> None:
+        try:
+            target()
+        except BaseException as e:
+            print(f"Pipeline stage {name} failed: {e}")
+            self.error = e
+            self._stop.set()
+            # Unblock every stage so the pipeline can exit. Queued items
+            # are dropped to make room where needed: a full queue would keep
+            # the stop from the stage behind it, blocked in get() for good.
+            # Nothing dropped was committed, so no checkpoint covers it.
+            for q in (self.lines, self.events, self.matched):
+                while True:
+                    try:
+                        q.put_nowait(_STOP)
+                        break
+                    except queue.Full:
+                        pass
+                    try:
+                        q.get_nowait()
+                    except queue.Empty:
+                        pass
+
+    def _put(self, q: queue.Queue, item: Any) -> None:
+        """Blocking put that still notices a failed stage."""
+        while self.error is None:
+            try:
+                q.put(item, timeout=0.5)
+                return
+            except queue.Full:
+                pass
+
+    def _read(self) -> None:
+        stats = self.stages["reader"]
+
+        if self.receiver is not None:
+            self.receiver.sink = self._offer_lines
+            self.receiver.run(self._stop)
+        elif not self.follow:
+            if self.archives:
+                self._read_archives(stats)
+            self._send_lines(iter_log_lines(self.log_dir), stats)
+        else:
+            # The tailer reads its checkpoints with a connection of its own.
+            # It hands them on behind the lines instead of saving them, so
+            # a crash never skips lines that were read but not committed.
+            storage = SQLiteStorage(db_path=self.db_path)
+            storage.connect()
+            storage.init_db()
+            tailer = LogTailer(storage, log_dir=self.log_dir, defer_checkpoints=True)
+            try:
+                while not self._stop.is_set():
+                    sent = self._send_lines(tailer.poll(), stats)
+                    for archive, lines in tailer.take_archives():
+                        self._put(self.lines, _ArchiveDone(archive, lines))
+                    checkpoints = tailer.take_checkpoints()
+                    if checkpoints:
+                        self._put(self.lines, _Checkpoints(checkpoints))
+                    if not sent:
+                        self._stop.wait(self.poll_interval)
+            finally:
+                storage.close()
+
+        self._put(self.lines, _STOP)
+
+    def _read_archives(self, stats: StageStats) -> None:
+        # Checking for archives seen before reads the database, so this
+        # also needs a connection of its own. The writer records them.
+        storage = SQLiteStorage(db_path=self.db_path)
+        storage.connect()
+        storage.init_db()
+        # Recorded by the writer after commit, so catch copies of the
+        # same content still on their way down the stages
+        scheduled: Set[str] = set()
+        try:
+            for path in get_archive_files(self.log_dir):
+                if self._stop.is_set():
+                    return
+                try:
+                    archive = check_archive(path, storage)
+                    if archive is None or archive[0] in scheduled:
+                        continue
+                    scheduled.add(archive[0])
+                    sent = self._send_lines(iter_file_lines(path, source_for_path(path)), stats)
+                except ARCHIVE_ERRORS as e:
+                    # Not recorded, so the next run tries it again
+                    print(f"Skipping unreadable archive {path}: {e}")
+                    stats.errors += 1
+                    continue
+                self._put(self.lines, _ArchiveDone(archive, sent))
+        finally:
+            storage.close()
+
+    def _offer_lines(self, batch: List[Tuple[str, str]]) -> bool:
+        """Non blocking hand over for the syslog receiver, False when the parser is behind."""
+        if self.error is not None:
+            return False
+        try:
+            self.lines.put_nowait(batch)
+        except queue.Full:
+            return False
+        stats = self.stages["reader"]
+        stats.batches += 1
+        stats.items += len(batch)
+        return True
+
+    def _send_lines(self, lines, stats: StageStats) -> int:
+        sent = 0
+        batch: List[Tuple[str, str]] = []
+        started = time.perf_counter()
+        for item in lines:
+            if self.error is not None:
+                break
+            batch.append(item)
+            if len(batch) >= self.batch_size:
+                stats.record(time.perf_counter() - started)
+                self._put(self.lines, batch)
+                started = time.perf_counter()
+                stats.batches += 1
+                stats.items += len(batch)
+                sent += len(batch)
+                batch = []
+        if batch:
+            stats.record(time.perf_counter() - started)
+            self._put(self.lines, batch)
+            stats.batches += 1
+            stats.items += len(batch)
+            sent += len(batch)
+        return sent
+
+    def _run_stage(self, name: str, inbox: queue.Queue, outbox: queue.Queue, work) -> None:
+        stats = self.stages[name]
+        while True:
+            batch = inbox.get()
+            if batch is _STOP:
+                self._put(outbox, _STOP)
+                return
+            if isinstance(batch, _Marker):
+                self._put(outbox, batch)
+                continue
+            started = time.perf_counter()
+            result = work(batch)
+            stats.record(time.perf_counter() - started)
+            stats.batches += 1
+            stats.items += len(batch)
+            if result:
+                self._put(outbox, result)
+
+    def _parse(self) -> None:
+        def work(batch: List[Tuple[str, str]]) -> List[Event]:
+            events = []
+            for source, raw in batch:
+                ev = parse_event(source, raw)
+                if ev is not None:
+                    events.append(ev)
+            return events
+
+        self._run_stage("parser", self.lines, self.events, work)
+
+    def _match(self) -> None:
+        def work(batch: List[Event]):
+            alerts: AlertBatch = []
+            for ev in batch:
+                for alert in self.rule_engine.match_event(event_dict(ev)):
+                    alerts.append((ev, alert))
+            return batch, alerts
+
+        self._run_stage("matcher", self.events, self.matched, work)
+
+    def _write(self) -> None:
+        stats = self.stages["writer"]
+        storage = SQLiteStorage(db_path=self.db_path)
+        storage.connect()
+        storage.init_db()
+        aggregator = AlertAggregator(self.rule_engine)
+        retained_day = None
+
+        try:
+            done = False
+            while not done:
+                if self.retention_days:
+                    today = _utc_day()
+                    if today != retained_day:
+                        storage.apply_retention(self.retention_days)
+                        retained_day = today
+
+                try:
+                    item = self.matched.get(timeout=RETENTION_CHECK_SECONDS if self.retention_days else None)
+                except queue.Empty:
+                    continue
+                if item is _STOP:
+                    break
+
+                # Coalesce whatever else is already waiting into this commit
+                items = [item]
+                while True:
+                    try:
+                        extra = self.matched.get_nowait()
+                    except queue.Empty:
+                        break
+                    if extra is _STOP:
+                        done = True
+                        break
+                    items.append(extra)
+
+                started = time.perf_counter()
+                events: List[Event] = []
+                alerts: AlertBatch = []
+                archives: List[_ArchiveDone] = []
+                checkpoints: List[Checkpoint] = []
+                for item in items:
+                    if isinstance(item, _ArchiveDone):
+                        archives.append(item)
+                        continue
+                    if isinstance(item, _Checkpoints):
+                        checkpoints.extend(item.checkpoints)
+                        continue
+                    batch_events, batch_alerts = item
+                    events.extend(batch_events)
+                    alerts.extend(batch_alerts)
+                new_alerts = [(ev, a) for ev, a in alerts if aggregator.add(ev, a)]
+                committing = time.perf_counter()
+                storage.write_batch(events, group_rows=aggregator.drain(), checkpoints=checkpoints)
+                stats.commit.observe(time.perf_counter() - committing)
+                stats.record(time.perf_counter() - started)
+                stats.batches += 1
+                stats.items += len(events)
+                for mark in archives:
+                    storage.record_archive(*mark.archive, lines=mark.lines)
+
+                if new_alerts and self.on_alerts is not None:
+                    self.on_alerts(new_alerts)
+        finally:
+            storage.close()
+
+
+def run_headless(
+    follow: bool = True,
+    report_every: float = 5.0,
+    archives: bool = False,
+    receiver: Optional[SyslogReceiver] = None,
+    db_path: str = DB_PATH,
+) -> Dict[str, Dict[str, Any]]:
+    """
+    Run the pipeline without the GUI and print stage stats until it is
+    done or Ctrl+C. Returns the final stage stats, raises what failed a stage.
+    """
+    from .log_ingestor import RULE_DIR
+
+    engine = RuleEngine(rule_dir=RULE_DIR)
+    engine.load_rules()
+
+    def print_alerts(alerts: AlertBatch) -> None:
+        for ev, alert in alerts:
+            print(f"ALERT {alert.get('severity')} {alert.get('rule_id')}: {ev.raw}")
+
+    pipeline = Pipeline(
+        engine,
+        db_path=db_path,
+        follow=follow,
+        on_alerts=print_alerts,
+        archives=archives,
+        receiver=receiver,
+    )
+    # Read it with `python -m siem.metrics`
+    dumper = MetricsDumper(interval=report_every)
+    dumper.start()
+    pipeline.start()
+    next_report = time.monotonic() + report_every
+    try:
+        while pipeline.running():
+            time.sleep(0.1)
+            if time.monotonic() < next_report:
+                continue
+            next_report += report_every
+            depths = ", ".join(
+                f"{name}={s['queue_depth']}/{s['queue_size']}"
+                for name, s in pipeline.stats().items()
+                if name != "reader"
+            )
+            print(f"queue depth: {depths}")
+            if receiver is not None:
+                print(", ".join(f"{name}={value}" for name, value in receiver.snapshot().items()))
+    except KeyboardInterrupt:
+        pipeline.stop()
+        pipeline.join()
+    finally:
+        dumper.stop()
+    if pipeline.error is not None:
+        raise pipeline.error
+    return pipeline.stats()
+
+
+if __name__ == "__main__":
+    import sys
+
+    run_headless(follow="--once" not in sys.argv, archives="--archives" in sys.argv)
@@ -0,0 +1,230 @@
+# siem/predicates.py
+
+from typing import Any, Dict, FrozenSet, List, Tuple
+
+# Comparison operators accepted in a field condition
+NUMERIC_OPS = ("gt", "ge", "lt", "le")
+FIELD_OPS = ("eq", "in", "prefix") + NUMERIC_OPS
+
+# A field and the values one of which every matching event has there
+IndexKey = Tuple[str, FrozenSet[str]]
+
+
+def _text(value: Any) -> str:
+    return value if type(value) is str else str(value)
+
+
+class Predicate:
+    """
+    One compiled condition on an event dict.
+
+    cost is a rough relative price of test() and selectivity the
+    estimated share of events it lets through. all/any use them to run
+    the cheapest, most decisive children first.
+    """
+
+    __slots__ = ("cost", "selectivity")
+
+    def test(self, event: Dict[str, Any]) -> bool:
+        raise NotImplementedError
+
+    def index_keys(self) -> List[IndexKey]:
+        """(field, values) pairs every matching event satisfies, for hash lookups."""
+        return []
+
+
+class Equals(Predicate):
+    __slots__ = ("field", "value")
+
+    def __init__(self, field: str, value: Any) -> None:
+        self.field = field
+        self.value = _text(value)
+        self.cost, self.selectivity = 1.0, 0.1
+
+    def test(self, event: Dict[str, Any]) -> bool:
+        value = event.get(self.field)
+        return value is not None and _text(value) == self.value
+
+    def index_keys(self) -> List[IndexKey]:
+        return [(self.field, frozenset((self.value,)))]
+
+
+class OneOf(Predicate):
+    __slots__ = ("field", "values")
+
+    def __init__(self, field: str, values: List[Any]) -> None:
+        self.field = field
+        self.values = frozenset(_text(v) for v in values)
+        self.cost, self.selectivity = 1.0, min(0.9, 0.1 * len(self.values))
+
+    def test(self, event: Dict[str, Any]) -> bool:
+        value = event.get(self.field)
+        return value is not None and _text(value) in self.values
+
+    def index_keys(self) -> List[IndexKey]:
+        return [(self.field, self.values)]
+
+
+class Prefix(Predicate):
+    __slots__ = ("field", "prefixes")
+
+    def __init__(self, field: str, prefixes: List[Any]) -> None:
+        self.field = field
+        self.prefixes = tuple(_text(p) for p in prefixes)
+        self.cost, self.selectivity = 2.0, min(0.9, 0.2 * len(self.prefixes))
+
+    def test(self, event: Dict[str, Any]) -> bool:
+        value = event.get(self.field)
+        return value is not None and _text(value).startswith(self.prefixes)
+
+
+class Compare(Predicate):
+    __slots__ = ("field", "op", "number")
+
+    def __init__(self, field: str, op: str, number: Any) -> None:
+        self.field = field
+        self.op = op
+        self.number = float(number)
+        self.cost, self.selectivity = 3.0, 0.5
+
+    def test(self, event: Dict[str, Any]) -> bool:
+        value = event.get(self.field)
+        if value is None or value == "":
+            return False
+        try:
+            value = float(value)
+        except (TypeError, ValueError):
+            return False
+        if self.op == "gt":
+            return value > self.number
+        if self.op == "ge":
+            return value >= self.number
+        if self.op == "lt":
+            return value < self.number
+        return value <= self.number
+
+
+class All(Predicate):
+    __slots__ = ("children",)
+
+    def __init__(self, children: List[Predicate]) -> None:
+        # Cheap children that reject most events go first
+        self.children = tuple(sorted(children, key=lambda p: p.cost / max(1.0 - p.selectivity, 0.01)))
+        self.cost, self.selectivity, passed = 0.0, 1.0, 1.0
+        for child in self.children:
+            self.cost += passed * child.cost
+            passed *= child.selectivity
+        self.selectivity = passed
+
+    def test(self, event: Dict[str, Any]) -> bool:
+        for child in self.children:
+            if not child.test(event):
+                return False
+        return True
+
+    def index_keys(self) -> List[IndexKey]:
+        return [key for child in self.children for key in child.index_keys()]
+
+
+class AnyOf(Predicate):
+    __slots__ = ("children",)
+
+    def __init__(self, children: List[Predicate]) -> None:
+        # Cheap children that accept most events go first
+        self.children = tuple(sorted(children, key=lambda p: p.cost / max(p.selectivity, 0.01)))
+        self.cost, missed = 0.0, 1.0
+        for child in self.children:
+            self.cost += missed * child.cost
+            missed *= 1.0 - child.selectivity
+        self.selectivity = 1.0 - missed
+
+    def test(self, event: Dict[str, Any]) -> bool:
+        for child in self.children:
+            if child.test(event):
+                return True
+        return False
+
+    def index_keys(self) -> List[IndexKey]:
+        # Only when every branch can be looked up on the same field
+        fields: Dict[str, List[FrozenSet[str]]] = {}
+        for child in self.children:
+            for field, values in child.index_keys():
+                fields.setdefault(field, []).append(values)
+        return [
+            (field, frozenset().union(*found))
+            for field, found in fields.items()
+            if len(found) == len(self.children)
+        ]
+
+
+class Not(Predicate):
+    __slots__ = ("child",)
+
+    def __init__(self, child: Predicate) -> None:
+        self.child = child
+        self.cost, self.selectivity = child.cost, 1.0 - child.selectivity
+
+    def test(self, event: Dict[str, Any]) -> bool:
+        return not self.child.test(event)
+
+
+def _field_condition(field: str, spec: Any) -> Predicate:
+    if isinstance(spec, list):
+        return OneOf(field, spec)
+    if not isinstance(spec, dict):
+        return Equals(field, spec)
+
+    if not spec:
+        raise ValueError(f"empty condition for field {field}")
+    parts: List[Predicate] = []
+    for op, value in spec.items():
+        if op == "eq":
+            parts.append(Equals(field, value))
+        elif op == "in":
+            if not isinstance(value, list):
+                raise ValueError(f"'in' needs a list for field {field}")
+            parts.append(OneOf(field, value))
+        elif op == "prefix":
+            parts.append(Prefix(field, value if isinstance(value, list) else [value]))
+        elif op in NUMERIC_OPS:
+            try:
+                parts.append(Compare(field, op, value))
+            except (TypeError, ValueError):
+                raise ValueError(f"'{op}' needs a number for field {field}, got {value!r}")
+        else:
+            raise ValueError(f"unknown operator '{op}' for field {field}, expected one of {', '.join(FIELD_OPS)}")
+    return parts[0] if len(parts) == 1 else All(parts)
+
+
+def compile_fields(spec: Any) -> Predicate:
+    """
+    Compile the fields block of a rule into a Predicate.
+
+        fields:
+          action: login_failed              # equality
+          user: [root, admin]               # set membership, same as {in: [...]}
+          src_ip: {prefix: ["10.", "192.168."]}
+          status: {ge: 500, lt: 600}        # numeric, several ops all apply
+          not: {user: backup}
+          any:
+            - {user: root}
+            - {src_ip: {prefix: "203.0.113."}}
+
+    Keys of one mapping must all hold, all: and any: take a list of
+    such mappings and not: a single one. Raises ValueError on a bad spec.
+    """
+    if not isinstance(spec, dict) or not spec:
+        raise ValueError("fields must be a non empty mapping")
+
+    parts: List[Predicate] = []
+    for key, value in spec.items():
+        if key in ("all", "any"):
+            if not isinstance(value, list) or not value:
+                raise ValueError(f"'{key}' needs a non empty list")
+            children = [compile_fields(child) for child in value]
+            parts.append(All(children) if key == "all" else AnyOf(children))
+        elif key == "not":
+            parts.append(Not(compile_fields(value)))
+        else:
+            parts.append(_field_condition(str(key), value))
+    return parts[0] if len(parts) == 1 else All(parts)
@@ -1,97 +1,655 @@
 # siem/rule_engine.py
 
+import json
 import os
+import threading
+import time
 import yaml
 import re
+from collections import Counter
 from pathlib import Path
-from typing import List, Dict, Any
+from typing import Callable, List, Dict, Any, Optional, Pattern, Set, Tuple
+
+from .metrics import DEFAULT_SAMPLE_EVERY, REGISTRY, Histogram, MetricsRegistry
+from .predicates import Predicate, compile_fields
+from .thresholds import ThresholdTracker
+from .watchlist import FEED_SUFFIX, Watchlist
+
+
+def _trie_regex(patterns: List[str]) -> str:
+    """
+    Build a regex from a set of literals, factored on common prefixes.
+
+    At any position the regex matches the longest literal that starts
+    there, and each step only has to look at one trie level, so the cost
+    stays close to flat as literals are added.
+    """
+    trie: Dict[str, Any] = {}
+    for p in patterns:
+        node = trie
+        for ch in p:
+            node = node.setdefault(ch, {})
+        node[""] = True
+
+    def emit(node: Dict[str, Any]) -> str:
+        terminal = "" in node
+        branches = [re.escape(ch) + emit(child) for ch, child in sorted(node.items()) if ch]
+        if not branches:
+            return ""
+        body = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+        if terminal:
+            # greedy optional, so the longer literal wins
+            return "(?:" + body + ")?"
+        return body
+
+    return emit(trie)
+
+
+class SourceIndex:
+    """
+    Compiled matchers for every rule of one log_type.
+
+    Values are positions into RuleEngine.rules so alerts come out in the
+    same order the rules were loaded. Field rules are found by a hash
+    lookup on one of their equality or membership tests, the one fewest
+    other rules share; only rules without such a test are tried on
+    every event.
+    """
+
+    def __init__(self) -> None:
+        self.contains: Dict[str, List[int]] = {}
+        self.equals: Dict[str, List[int]] = {}
+        self.regexes: List[tuple] = []
+        # field -> value -> (predicate, position), and the unindexed rest
+        self.field_index: Dict[str, Dict[str, List[Tuple[Predicate, int]]]] = {}
+        self.field_rules: List[Tuple[Predicate, int]] = []
+        # (event field, watchlist, position)
+        self.watchlists: List[Tuple[str, Watchlist, int]] = []
+
+        self.contains_re: Optional[Pattern] = None
+        # literal -> every literal that is a substring of it (itself included)
+        self.contains_closure: Dict[str, List[str]] = {}
+
+    def add_fields(self, predicate: Predicate, pos: int) -> None:
+        # Indexed by compile(), once every rule of the bucket is known
+        self.field_rules.append((predicate, pos))
+
+    def _index_fields(self) -> None:
+        shared: Counter = Counter()
+        for predicate, _ in self.field_rules:
+            for field, values in predicate.index_keys():
+                shared.update((field, value) for value in values)
+
+        unindexed = []
+        for predicate, pos in self.field_rules:
+            keys = predicate.index_keys()
+            if not keys:
+                unindexed.append((predicate, pos))
+                continue
+            field, values = min(keys, key=lambda k: sum(shared[(k[0], v)] for v in k[1]))
+            by_value = self.field_index.setdefault(field, {})
+            for value in values:
+                by_value.setdefault(value, []).append((predicate, pos))
+        self.field_rules = unindexed
+
+    def _field_candidates(self, event: Dict[str, Any]) -> List[Tuple[Predicate, int]]:
+        candidates = list(self.field_rules)
+        for field, by_value in self.field_index.items():
+            value = event.get(field)
+            if value is not None:
+                candidates.extend(by_value.get(value if type(value) is str else str(value), ()))
+        return candidates
+
+    def compile(self, previous: Optional["SourceIndex"] = None) -> None:
+        if self.field_rules:
+            self._index_fields()
+
+        literals = list(self.contains)
+        if not literals:
+            return
+
+        # Same literals as before a reload, reuse the compiled trie
+        if previous is not None and previous.contains_re is not None and previous.contains.keys() == self.contains.keys():
+            self.contains_re = previous.contains_re
+            self.contains_closure = previous.contains_closure
+            return
+
+        # Lookahead so finditer reports a match at every start position
+        self.contains_re = re.compile("(?=(" + _trie_regex(literals) + "))")
+        for lit in literals:
+            self.contains_closure[lit] = [other for other in literals if other in lit]
+
+    def match(
+        self,
+        message: str,
+        event: Optional[Dict[str, Any]] = None,
+        record: Optional[Callable[[Any, float], None]] = None,
+    ) -> List[int]:
+        """
+        Positions of the rules matching message, and event for field and
+        watchlist rules. With record, also reports how long each part
+        took: record("literals", seconds) for the shared contains/equals
+        lookup, which costs the same whichever literal rule matches, and
+        record(pos, seconds) per regex, field or watchlist rule evaluated.
+        """
+        clock = time.perf_counter
+        timed = record is not None
+        started = clock() if timed else 0.0
+        hits: Set[int] = set()
+
+        if self.contains_re is not None:
+            found: Set[str] = set()
+            for m in self.contains_re.finditer(message):
+                lit = m.group(1)
+                if lit not in found:
+                    found.update(self.contains_closure[lit])
+            for lit in found:
+                hits.update(self.contains[lit])
+
+        if self.equals:
+            hits.update(self.equals.get(message.strip(), ()))
+
+        if timed and (self.contains_re is not None or self.equals):
+            record("literals", clock() - started)
+
+        if event is not None and (self.field_index or self.field_rules):
+            for predicate, pos in self._field_candidates(event):
+                if timed:
+                    started = clock()
+                if predicate.test(event):
+                    hits.add(pos)
+                if timed:
+                    record(pos, clock() - started)
+
+        if event is not None:
+            for field, watchlist, pos in self.watchlists:
+                if timed:
+                    started = clock()
+                value = event.get(field)
+                if value and watchlist.contains(value):
+                    hits.add(pos)
+                if timed:
+                    record(pos, clock() - started)
+
+        for regex, pos in self.regexes:
+            if timed:
+                started = clock()
+            if regex.search(message):
+                hits.add(pos)
+            if timed:
+                record(pos, clock() - started)
+
+        return sorted(hits)
+
+
+# Saved parsed rules, see RuleEngine.load_rules. JSON, so reading a
+# tampered pack can never run code; the index is compiled again on load.
+RULE_PACK_NAME = ".rulepack"
+RULE_PACK_VERSION = 4
+
+# file name -> (mtime_ns, size) of every rule file
+Signatures = Dict[str, Tuple[int, int]]
+
+
+class RuleSet:
+    """
+    Everything matching needs, built in full before it is used.
+
+    RuleEngine swaps in a new RuleSet with one assignment, so a thread
+    matching while rules are reloaded sees either the old set or the new
+    one, never a half-built mix.
+    """
+
+    __slots__ = ("rules", "by_id", "index", "trackers", "hit_counts")
+
+    def __init__(
+        self,
+        rules: List[Dict[str, Any]],
+        index: Dict[str, SourceIndex],
+        trackers: Dict[str, ThresholdTracker],
+    ) -> None:
+        self.rules = rules
+        self.by_id = {rule.get("id"): rule for rule in rules}
+        self.index = index
+        self.trackers = trackers
+        # hits per position in rules, folded into RuleEngine.rule_hits on reload
+        self.hit_counts = [0] * len(rules)
 
 
 class RuleEngine:
-    def __init__(self, rule_dir):
+    def __init__(
+        self,
+        rule_dir,
+        metrics: Optional[MetricsRegistry] = REGISTRY,
+        sample_every: int = DEFAULT_SAMPLE_EVERY,
+        pack_path: Optional[Path] = None,
+        watchlist_dir: Optional[Path] = None,
+    ):
         self.rule_dir = Path(rule_dir)
-        self.rules: List[Dict[str, Any]] = []
+        # Feeds for watchlist rules, next to the rules directory by default
+        self.watchlist_dir = Path(watchlist_dir) if watchlist_dir else self.rule_dir.parent / "watchlists"
+        self.ruleset = RuleSet([], {}, {})
 
-    def load_rules(self):
-        """Load all YAML rules from the rules directory."""
-        self.rules.clear()
+        # Parsed rule (or None when invalid) and signature per rule file,
+        # so a reload only parses files whose mtime or size changed
+        self.pack_path = Path(pack_path) if pack_path else self.rule_dir / RULE_PACK_NAME
+        self.signatures: Signatures = {}
+        self.parsed: Dict[str, Optional[Dict[str, Any]]] = {}
+        self._load_lock = threading.Lock()
 
-        if not self.rule_dir.exists():
-            print(f"Rule directory does not exist: {self.rule_dir}")
-            return
+        # Instrumentation: hits are counted on every match, evaluation time
+        # only on one call in sample_every (0 turns timing off)
+        self.sample_every = sample_every
+        # counts down to the next timed call, never reaches 0 when disabled
+        self._countdown = sample_every if sample_every > 0 else -1
+        self.rule_hits: Counter = Counter()
+        self.rule_eval: Dict[str, Histogram] = {}
+        if metrics is not None:
+            metrics.register("rules", self.metrics_snapshot)
 
-        for file in os.listdir(self.rule_dir):
-            if not file.endswith(".yaml"):
-                continue
+    # The current rule set, read through these so callers keep working
+    @property
+    def rules(self) -> List[Dict[str, Any]]:
+        return self.ruleset.rules
 
-            path = self.rule_dir / file
-            try:
-                with path.open("r", encoding="utf-8") as f:
-                    data = yaml.safe_load(f)
+    @property
+    def by_id(self) -> Dict[str, Dict[str, Any]]:
+        return self.ruleset.by_id
 
-                # Skip empty or invalid YAML
-                if not data:
-                    print(f"Skipping empty rule file: {file}")
-                    continue
-                if not isinstance(data, dict):
-                    print(f"Skipping non dict rule file: {file}")
-                    continue
+    @property
+    def index(self) -> Dict[str, SourceIndex]:
+        return self.ruleset.index
 
-                # Optional: basic validation
-                if "id" not in data or "log_type" not in data or "match_type" not in data:
-                    print(
-                        f"Skipping rule file missing required fields: {file}")
-                    continue
+    @property
+    def trackers(self) -> Dict[str, ThresholdTracker]:
+        return self.ruleset.trackers
 
-                self.rules.append(data)
-                print(f"Loaded rule from {file}: {data.get('id')}")
+    def load_rules(self) -> bool:
+        """
+        Load the YAML rules from the rules directory, or pick up changes.
 
-            except Exception as e:
-                print(f"Error loading rule file {file}: {e}")
+        Only files whose mtime or size changed since the last load are
+        parsed again; when nothing changed this is one directory scan.
+        On a cold start the rule pack saved by the previous load supplies
+        every file that has not changed since, and if none have, no YAML
+        is parsed at all, only the index compiled. The new rules are swapped in
+        atomically, so this is safe to call while other threads match.
 
-    def match_event(self, event: Dict[str, Any]):
-        """Return a list of alerts for a given event dict."""
-        alerts = []
-        event_log_type = event.get("log_type")
-        message = event.get("raw", "")
+        Returns True when the rule set changed.
+        """
+        with self._load_lock:
+            if not self.rule_dir.exists():
+                print(f"Rule directory does not exist: {self.rule_dir}")
+                self._swap(RuleSet([], {}, {}))
+                self.signatures, self.parsed = {}, {}
+                return True
 
-        for rule in self.rules:
-            # Extra guard in case something weird slipped in
-            if not isinstance(rule, dict):
-                continue
+            signatures = self._scan()
+            if self.signatures and signatures == self.signatures:
+                self._refresh_watchlists(self.index)
+                return False
+
+            pack = self._read_pack() if not self.signatures else None
+            if pack is not None and pack["signatures"] == signatures:
+                self.signatures, self.parsed = signatures, pack["parsed"]
+                rules = [rule for rule in self.parsed.values() if rule is not None]
+                index = self.compile_rules(rules, self.index, self._watchlists_for(rules))
+                self._refresh_watchlists(index)
+                self._swap(RuleSet(rules, index, self._build_trackers(rules)))
+                print(f"Loaded {len(rules)} rules from rule pack")
+                return True
+
+            known = pack or {"signatures": self.signatures, "parsed": self.parsed}
+            parsed: Dict[str, Optional[Dict[str, Any]]] = {}
+            changed = 0
+            for name in sorted(signatures):
+                if known["signatures"].get(name) == signatures[name] and name in known["parsed"]:
+                    parsed[name] = known["parsed"][name]
+                else:
+                    parsed[name] = self._parse_file(name)
+                    changed += 1
+
+            rules = [rule for rule in parsed.values() if rule is not None]
+            index = self.compile_rules(rules, self.index, self._watchlists_for(rules))
+            self._refresh_watchlists(index)
+            self.signatures, self.parsed = signatures, parsed
+            self._swap(RuleSet(rules, index, self._build_trackers(rules)))
+            self._write_pack()
+            print(f"Loaded {len(rules)} rules ({changed} file(s) parsed)")
+            return True
 
-            log_type = rule.get("log_type")
-            if event_log_type != log_type:
+    def _swap(self, ruleset: RuleSet) -> None:
+        old = self.ruleset
+        self.ruleset = ruleset
+        # Positions change on reload, keep the totals by rule id. A match
+        # still running on the old set may add a hit after this, which
+        # is lost; fine for monitoring numbers.
+        for rule, n in zip(old.rules, old.hit_counts):
+            if n:
+                self.rule_hits[rule.get("id")] += n
+
+    def _watchlists_for(self, rules: List[Dict[str, Any]]) -> Dict[str, Watchlist]:
+        """Watchlists the rules reference by name, reusing the ones already loaded."""
+        loaded = {
+            watchlist.name: watchlist
+            for bucket in self.index.values()
+            for _, watchlist, _ in bucket.watchlists
+        }
+        watchlists: Dict[str, Watchlist] = {}
+        for rule in rules:
+            if rule.get("match_type") == "watchlist":
+                name = str(rule.get("watchlist"))
+                watchlists[name] = loaded.get(name) or Watchlist(self.watchlist_dir / f"{name}{FEED_SUFFIX}")
+        return watchlists
+
+    @staticmethod
+    def _refresh_watchlists(index: Dict[str, SourceIndex]) -> None:
+        """Load watchlists whose feed changed, before any event needs them."""
+        seen: Set[int] = set()
+        for bucket in index.values():
+            for _, watchlist, _ in bucket.watchlists:
+                if id(watchlist) not in seen:
+                    seen.add(id(watchlist))
+                    if watchlist.refresh():
+                        print(f"Loaded watchlist {watchlist.name}: {len(watchlist)} ranges")
+
+    def _scan(self) -> Signatures:
+        signatures: Signatures = {}
+        with os.scandir(self.rule_dir) as entries:
+            for entry in entries:
+                if entry.name.endswith(".yaml") and entry.is_file():
+                    st = entry.stat()
+                    signatures[entry.name] = (st.st_mtime_ns, st.st_size)
+        return signatures
+
+    def _parse_file(self, file: str) -> Optional[Dict[str, Any]]:
+        """Parse and validate one rule file, None when it is not a usable rule."""
+        path = self.rule_dir / file
+        try:
+            with path.open("r", encoding="utf-8") as f:
+                data = yaml.safe_load(f)
+
+            # Skip empty or invalid YAML
+            if not data:
+                print(f"Skipping empty rule file: {file}")
+                return None
+            if not isinstance(data, dict):
+                print(f"Skipping non dict rule file: {file}")
+                return None
+
+            # Optional: basic validation
+            if "id" not in data or "log_type" not in data or "match_type" not in data:
+                print(
+                    f"Skipping rule file missing required fields: {file}")
+                return None
+
+            if data.get("match_type") == "watchlist" and not isinstance(data.get("watchlist"), str):
+                print(f"Skipping watchlist rule without a watchlist name: {file}")
+                return None
+
+            if data.get("match_type") == "fields" and not self._check_fields(data):
+                print(f"Skipping rule file with invalid fields: {file}")
+                return None
+
+            if data.get("threshold") is not None and not self._check_threshold(data):
+                print(f"Skipping rule file with invalid threshold: {file}")
+                return None
+
+            return data
+
+        except Exception as e:
+            print(f"Error loading rule file {file}: {e}")
+            return None
+
+    def _read_pack(self) -> Optional[Dict[str, Any]]:
+        """The saved rule pack, or None if missing, stale or unreadable."""
+        try:
+            with self.pack_path.open("r", encoding="utf-8") as f:
+                pack = json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            print(f"Ignoring unreadable rule pack {self.pack_path}: {e}")
+            return None
+        if not isinstance(pack, dict) or pack.get("version") != RULE_PACK_VERSION:
+            return None
+        signatures, parsed = pack.get("signatures"), pack.get("parsed")
+        if not isinstance(signatures, dict) or not isinstance(parsed, dict):
+            return None
+        try:
+            signatures = {name: (int(sig[0]), int(sig[1])) for name, sig in signatures.items()}
+        except (TypeError, ValueError, IndexError):
+            return None
+        if any(rule is not None and not isinstance(rule, dict) for rule in parsed.values()):
+            return None
+        return {"signatures": signatures, "parsed": parsed}
+
+    def _write_pack(self) -> None:
+        pack = {
+            "version": RULE_PACK_VERSION,
+            "signatures": self.signatures,
+            "parsed": self.parsed,
+        }
+        try:
+            text = json.dumps(pack)
+        except (TypeError, ValueError) as e:
+            print(f"Not writing rule pack, a rule does not fit in JSON: {e}")
+            return
+        # JSON turns tuples into lists and keys into strings. Signatures are
+        # converted back on read, a rule that would change is not packed.
+        if json.loads(text)["parsed"] != self.parsed:
+            print("Not writing rule pack, a rule does not round trip through JSON")
+            return
+        tmp = self.pack_path.with_name(f"{self.pack_path.name}.{os.getpid()}.tmp")
+        try:
+            with tmp.open("w", encoding="utf-8") as f:
+                f.write(text)
+            os.replace(tmp, self.pack_path)
+        except OSError as e:
+            print(f"Could not write rule pack {self.pack_path}: {e}")
+
+    @staticmethod
+    def _check_fields(rule: Dict[str, Any]) -> bool:
+        try:
+            compile_fields(rule.get("fields"))
+        except ValueError as e:
+            print(f"Invalid fields in rule {rule.get('id')}: {e}")
+            return False
+        return True
+
+    @staticmethod
+    def _check_threshold(rule: Dict[str, Any]) -> bool:
+        try:
+            ThresholdTracker(rule["threshold"])
+        except (KeyError, TypeError, ValueError) as e:
+            print(f"Invalid threshold in rule {rule.get('id')}: {e}")
+            return False
+        return True
+
+    def _build_trackers(self, rules: List[Dict[str, Any]]) -> Dict[str, ThresholdTracker]:
+        """
+        One tracker per threshold rule. Trackers whose config did not change
+        are carried over, so a reload does not forget open windows.
+        """
+        trackers: Dict[str, ThresholdTracker] = {}
+        for rule in rules:
+            config = rule.get("threshold")
+            if not config:
                 continue
+            rule_id = rule.get("id")
+            old = self.trackers.get(rule_id)
+            if old is not None and old.config == config:
+                trackers[rule_id] = old
+            else:
+                trackers[rule_id] = ThresholdTracker(config)
+        return trackers
+
+    @staticmethod
+    def compile_rules(
+        rules: List[Dict[str, Any]],
+        previous: Optional[Dict[str, SourceIndex]] = None,
+        watchlists: Optional[Dict[str, Watchlist]] = None,
+    ) -> Dict[str, SourceIndex]:
+        """
+        Bucket rules by log_type and precompile their matchers. With the
+        previous index, compiled regexes and unchanged literal tries are
+        reused, so a reload only compiles what changed. watchlists maps
+        the names watchlist rules use to their Watchlist.
+        """
+        index: Dict[str, SourceIndex] = {}
+        previous = previous or {}
+        compiled: Dict[str, Pattern] = {
+            regex.pattern: regex
+            for bucket in previous.values()
+            for regex, _ in bucket.regexes
+        }
 
+        for pos, rule in enumerate(rules):
             match_type = rule.get("match_type")
             pattern = rule.get("pattern")
 
+            if match_type == "fields":
+                try:
+                    predicate = compile_fields(rule.get("fields"))
+                except ValueError as e:
+                    print(f"Invalid fields in rule {rule.get('id')}: {e}")
+                    continue
+                index.setdefault(rule.get("log_type"), SourceIndex()).add_fields(predicate, pos)
+                continue
+
+            if match_type == "watchlist":
+                watchlist = (watchlists or {}).get(str(rule.get("watchlist")))
+                if watchlist is None:
+                    print(f"Unknown watchlist in rule {rule.get('id')}: {rule.get('watchlist')}")
+                    continue
+                bucket = index.setdefault(rule.get("log_type"), SourceIndex())
+                bucket.watchlists.append((str(rule.get("field", "src_ip")), watchlist, pos))
+                continue
+
             if not pattern or not match_type:
                 continue
 
+            bucket = index.setdefault(rule.get("log_type"), SourceIndex())
+
             if match_type == "contains":
-                if pattern in message:
-                    alerts.append(self._build_alert(rule, event))
+                bucket.contains.setdefault(str(pattern), []).append(pos)
 
             elif match_type == "equals":
-                if message.strip() == str(pattern).strip():
-                    alerts.append(self._build_alert(rule, event))
+                bucket.equals.setdefault(str(pattern).strip(), []).append(pos)
 
             elif match_type == "regex":
                 try:
-                    if re.search(pattern, message):
-                        alerts.append(self._build_alert(rule, event))
+                    regex = compiled.get(pattern) or re.compile(pattern)
+                    bucket.regexes.append((regex, pos))
                 except re.error as e:
                     print(f"Invalid regex in rule {rule.get('id')}: {e}")
-                    continue
 
-        return alerts
+        for log_type, bucket in index.items():
+            bucket.compile(previous.get(log_type))
+        return index
+
+    def match_event(self, event: Dict[str, Any]):
+        """Return a list of alerts for a given event dict."""
+        return self.alerts_for(self.match_rules(event), event)
+
+    def match_rules(self, event: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """
+        Return the rules whose pattern or fields match the event.
+        Stateless, threshold windows are only updated by alerts_for.
+        """
+        # One read of the rule set, a reload may swap it at any time
+        ruleset = self.ruleset
+        bucket = ruleset.index.get(event.get("log_type"))
+        if bucket is None:
+            return []
+
+        message = event.get("raw", "")
+        self._countdown -= 1
+        if self._countdown == 0:
+            self._countdown = self.sample_every
+            positions = self._match_sampled(ruleset, event, bucket, message)
+        else:
+            positions = bucket.match(message, event)
 
-    def _build_alert(self, rule: Dict[str, Any], event: Dict[str, Any]):
+        counts = ruleset.hit_counts
+        for pos in positions:
+            counts[pos] += 1
+        rules = ruleset.rules
+        return [rules[pos] for pos in positions]
+
+    def _match_sampled(
+        self,
+        ruleset: RuleSet,
+        event: Dict[str, Any],
+        bucket: SourceIndex,
+        message: str,
+    ) -> List[int]:
+        log_type = event.get("log_type")
+
+        def record(part: Any, seconds: float) -> None:
+            name = f"[{log_type} literals]" if part == "literals" else ruleset.rules[part].get("id")
+            histogram = self.rule_eval.get(name)
+            if histogram is None:
+                histogram = self.rule_eval[name] = Histogram()
+            histogram.observe(seconds)
+
+        return bucket.match(message, event, record)
+
+    def metrics_snapshot(self) -> Dict[str, Any]:
+        """
+        Per-rule hit counts and sampled evaluation times. Contains and
+        equals rules share one lookup per log type, its time is reported
+        under "[<log_type> literals]" rather than split across them.
+        """
+        empty = Histogram().snapshot()
+        ruleset = self.ruleset
+        rules = {}
+        for rule, n in zip(ruleset.rules, ruleset.hit_counts):
+            rule_id = rule.get("id")
+            histogram = self.rule_eval.get(rule_id)
+            rules[rule_id] = {
+                "hits": self.rule_hits.get(rule_id, 0) + n,
+                "eval": histogram.snapshot() if histogram is not None else empty,
+            }
+        shared = {
+            name: h.snapshot() for name, h in self.rule_eval.items() if name.startswith("[")
+        }
         return {
+            "sample_every": self.sample_every,
+            "rules": rules,
+            "shared": shared,
+        }
+
+    def alerts_for(self, rules: List[Dict[str, Any]], event: Dict[str, Any]):
+        """
+        Turn rules whose pattern matched an event into alerts.
+        Threshold rules only produce an alert when their window fills up.
+        """
+        alerts = []
+        trackers = self.trackers
+        for rule in rules:
+            tracker = trackers.get(rule.get("id"))
+            if tracker is None:
+                alerts.append(self._build_alert(rule, event))
+                continue
+
+            fired = tracker.observe(event)
+            if fired is not None:
+                alerts.append(self._build_alert(rule, event, fired))
+        return alerts
+
+    def _build_alert(
+        self,
+        rule: Dict[str, Any],
+        event: Dict[str, Any],
+        threshold: Optional[Dict[str, Any]] = None,
+    ):
+        alert = {
             "rule_id": rule.get("id"),
             "description": rule.get("description"),
             "severity": rule.get("severity"),
             "event": event,
         }
+        if threshold is not None:
+            alert["threshold"] = threshold
+        return alert
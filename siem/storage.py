@@ -2,9 +2,24 @@
 
 import os
 import sqlite3
-from typing import Optional, List, Dict
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Callable, Optional, List, Dict, Iterable, Union
 
 from .models import Event, Alert
+from .partitions import (
+    create_partition,
+    day_of_id,
+    days_in_range,
+    drop_partition,
+    list_partitions,
+    migrate_legacy_events,
+    partition_day,
+    partition_table,
+)
+from .templates import PARAM_SEP, TemplateMiner, render
 
 # place DB inside Watchtower/data
 DB_PATH = os.path.join(
@@ -14,20 +29,289 @@ DB_PATH = os.path.join(
 )
 
 
+ALERT_INSERT_SQL = """
+    INSERT INTO alerts (timestamp, rule_name, severity, src_ip, user, message,
+                        severity_norm, first_seen, last_seen)
+    VALUES (?1, ?2, ?3, ?4, ?5, ?6, LOWER(TRIM(?3)), ?1, ?1)
+"""
+
+# Aggregated alert groups from siem.alerts.AlertAggregator.drain()
+ALERT_GROUP_UPSERT_SQL = """
+    INSERT INTO alerts (group_key, timestamp, rule_name, severity, src_ip, user, message,
+                        count, first_seen, last_seen, severity_norm)
+    VALUES (?1, ?2, ?3, ?4, ?5, ?6, ?7, ?8, ?9, ?10, LOWER(TRIM(?4)))
+    ON CONFLICT(group_key) DO UPDATE SET
+        count = count + excluded.count,
+        first_seen = MIN(first_seen, excluded.first_seen),
+        last_seen = MAX(last_seen, excluded.last_seen)
+"""
+
+CHECKPOINT_UPSERT_SQL = """
+    INSERT INTO ingest_checkpoints (path, inode, offset, partial)
+    VALUES (?, ?, ?, ?)
+    ON CONFLICT(path) DO UPDATE SET
+        inode = excluded.inode,
+        offset = excluded.offset,
+        partial = excluded.partial
+"""
+
+# Alerts deleted per statement when applying retention
+RETENTION_BATCH = 10_000
+
+ALERT_COLUMNS = (
+    "id, timestamp, rule_name, severity, src_ip, user, message, count, first_seen, last_seen"
+)
+EVENT_COLUMNS = "id, timestamp, source, raw, action, user, src_ip, template_id, params"
+
+# Rebuilt templates kept per connection, cleared when full
+TEMPLATE_CACHE_SIZE = 4096
+
+
+def _partition_events(conn: sqlite3.Connection) -> None:
+    migrate_legacy_events(conn)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_alerts_last_seen ON alerts (last_seen)")
+
+
+def _add_templates(conn: sqlite3.Connection) -> None:
+    # cluster_id groups the versions of one template, see siem.templates
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS templates (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            cluster_id INTEGER,
+            template TEXT NOT NULL
+        )
+        """
+    )
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_templates_cluster ON templates (cluster_id)")
+    for day in list_partitions(conn):
+        table = partition_table(day)
+        columns = [row[1] for row in conn.execute(f"PRAGMA table_info({table})")]
+        if "template_id" not in columns:
+            conn.execute(f"ALTER TABLE {table} ADD COLUMN template_id INTEGER")
+            conn.execute(f"ALTER TABLE {table} ADD COLUMN params TEXT")
+
+
+# Schema changes applied on top of the base tables, in order.
+# PRAGMA user_version records how many have been applied to a database.
+# A step is a list of SQL statements or a function taking the connection.
+MIGRATIONS: List[Union[List[str], Callable[[sqlite3.Connection], None]]] = [
+    # 1: normalized severity plus indexes for the filtered, paged queries
+    [
+        "ALTER TABLE alerts ADD COLUMN severity_norm TEXT",
+        "UPDATE alerts SET severity_norm = LOWER(TRIM(severity))",
+        "CREATE INDEX IF NOT EXISTS idx_alerts_severity_id ON alerts (severity_norm, id)",
+        "CREATE INDEX IF NOT EXISTS idx_alerts_src_ip ON alerts (src_ip)",
+        "CREATE INDEX IF NOT EXISTS idx_alerts_rule_name ON alerts (rule_name)",
+        "CREATE INDEX IF NOT EXISTS idx_alerts_timestamp ON alerts (timestamp)",
+        "CREATE INDEX IF NOT EXISTS idx_events_src_ip ON events (src_ip)",
+        "CREATE INDEX IF NOT EXISTS idx_events_timestamp ON events (timestamp)",
+    ],
+    # 2: aggregated alerts, one row per (rule, src_ip, user, window)
+    [
+        "ALTER TABLE alerts ADD COLUMN count INTEGER NOT NULL DEFAULT 1",
+        "ALTER TABLE alerts ADD COLUMN first_seen TEXT",
+        "ALTER TABLE alerts ADD COLUMN last_seen TEXT",
+        "ALTER TABLE alerts ADD COLUMN group_key TEXT",
+        "UPDATE alerts SET first_seen = timestamp, last_seen = timestamp",
+        "CREATE UNIQUE INDEX IF NOT EXISTS idx_alerts_group_key ON alerts (group_key)",
+    ],
+    # 3: FTS5 index over event text and parsed fields
+    [
+        """
+        CREATE VIRTUAL TABLE IF NOT EXISTS events_fts
+        USING fts5(raw, action, user, src_ip, content='')
+        """,
+        """
+        INSERT INTO events_fts (rowid, raw, action, user, src_ip)
+        SELECT id, raw, action, user, src_ip FROM events
+        """,
+    ],
+    # 4: events move to one table per UTC day (see siem.partitions), and
+    # alerts get a last_seen index for retention
+    _partition_events,
+    # 5: mined log templates, events store (template_id, params) instead of raw
+    _add_templates,
+    # 6: rotated log archives already ingested, by sha256 of their content
+    [
+        """
+        CREATE TABLE IF NOT EXISTS ingested_archives (
+            sha256 TEXT PRIMARY KEY,
+            path TEXT NOT NULL,
+            size INTEGER NOT NULL,
+            mtime_ns INTEGER NOT NULL,
+            lines INTEGER NOT NULL,
+            ingested_at TEXT NOT NULL
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_ingested_archives_path ON ingested_archives (path)",
+    ],
+]
+
+
+def fts_query(text: str) -> str:
+    """
+    Turn free text into an FTS5 query: every word must appear, and each
+    word is quoted so IPs, paths and such are matched as phrases instead
+    of being read as FTS syntax.
+    """
+    words = text.split()
+    return " ".join('"' + word.replace('"', '""') + '"' for word in words)
+
+
+def _keyset_query(
+    table: str,
+    columns: str,
+    filters: List[tuple],
+    limit: int,
+    before_id: Optional[int],
+    after_id: Optional[int],
+    conditions: Iterable[tuple] = (),
+) -> tuple:
+    """
+    Build a keyset paged SELECT, newest first.
+
+    before_id gives the page after (older than) a row we already have,
+    after_id the page before (newer than) it. Either way SQLite seeks
+    straight to the id in an index instead of skipping OFFSET rows.
+    filters are (column, value) equality tests, conditions are
+    (sql, value) pairs such as ("timestamp >= ?", start).
+    """
+    where = [f"{column} = ?" for column, _ in filters]
+    params = [value for _, value in filters]
+    for sql, value in conditions:
+        where.append(sql)
+        params.append(value)
+
+    order = "DESC"
+    if before_id is not None:
+        where.append("id < ?")
+        params.append(before_id)
+    elif after_id is not None:
+        where.append("id > ?")
+        params.append(after_id)
+        order = "ASC"
+
+    sql = f"SELECT {columns} FROM {table}"
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+    sql += f" ORDER BY id {order} LIMIT ?"
+    params.append(limit)
+    return sql, params, order == "ASC"
+
+
+def _time_conditions(time_range: Optional[tuple], column: str = "timestamp") -> List[tuple]:
+    conditions: List[tuple] = []
+    if time_range is not None:
+        start, end = time_range
+        if start:
+            conditions.append((f"{column} >= ?", start))
+        if end:
+            conditions.append((f"{column} < ?", end))
+    return conditions
+
+
+def _event_row(event: Event) -> tuple:
+    return (
+        event.timestamp,
+        event.source,
+        event.raw,
+        event.action,
+        event.user,
+        event.src_ip,
+    )
+
+
+def _alert_row(alert: Alert) -> tuple:
+    return (
+        alert.timestamp,
+        alert.rule_name,
+        alert.severity,
+        alert.src_ip,
+        alert.user,
+        alert.message,
+    )
+
+
 class SQLiteStorage:
-    def __init__(self, db_path: str = DB_PATH) -> None:
+    def __init__(
+        self,
+        db_path: str = DB_PATH,
+        journal_mode: str = "WAL",
+        synchronous: str = "NORMAL",
+        cache_size_kb: int = 64 * 1024,
+        mine_templates: bool = True,
+    ) -> None:
         self.db_path = db_path
         self.conn: Optional[sqlite3.Connection] = None
 
+        # Tunable pragmas, applied on connect
+        self.journal_mode = journal_mode
+        self.synchronous = synchronous
+        self.cache_size_kb = cache_size_kb
+
+        # With mine_templates, event lines are stored as template + params
+        self.mine_templates = mine_templates
+        self.miner = TemplateMiner()
+        self._templates: Dict[int, str] = {}
+
     def connect(self) -> None:
         os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
         self.conn = sqlite3.connect(self.db_path, check_same_thread=False)
         self.conn.row_factory = sqlite3.Row
 
+        # WAL lets readers keep going while a batch is being written, and
+        # with synchronous=NORMAL we only fsync at checkpoints, not per commit
+        self.conn.execute(f"PRAGMA journal_mode = {self.journal_mode}")
+        self.conn.execute(f"PRAGMA synchronous = {self.synchronous}")
+        # negative cache_size means KiB instead of pages
+        self.conn.execute(f"PRAGMA cache_size = {-int(self.cache_size_kb)}")
+        self.conn.execute("PRAGMA temp_store = MEMORY")
+
+    def connect_readonly(self) -> None:
+        """
+        Open an existing database for queries only. Nothing is written:
+        no journal mode change, no init_db or migrations, so check
+        schema_version() against MIGRATIONS before querying.
+        """
+        uri = Path(os.path.abspath(self.db_path)).as_uri() + "?mode=ro"
+        self.conn = sqlite3.connect(uri, uri=True, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute(f"PRAGMA cache_size = {-int(self.cache_size_kb)}")
+        self.conn.execute("PRAGMA temp_store = MEMORY")
+
+    def close(self) -> None:
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+
     def init_db(self) -> None:
         assert self.conn is not None
         cur = self.conn.cursor()
 
+        if self.schema_version() == 0:
+            self._create_base_tables(cur)
+
+        # Follow mode checkpoints, one row per tailed log file
+        cur.execute(
+            """
+            CREATE TABLE IF NOT EXISTS ingest_checkpoints (
+                path TEXT PRIMARY KEY,
+                inode INTEGER,
+                offset INTEGER,
+                partial BLOB
+            )
+            """
+        )
+
+        self.conn.commit()
+        self._migrate()
+        self._load_templates()
+
+    @staticmethod
+    def _create_base_tables(cur: sqlite3.Cursor) -> None:
+        # The schema MIGRATIONS start from. The events table here only
+        # lives until migration 4 moves it into day partitions.
         cur.execute(
             """
             CREATE TABLE IF NOT EXISTS events (
@@ -56,129 +340,618 @@ class SQLiteStorage:
             """
         )
 
+    def schema_version(self) -> int:
+        assert self.conn is not None
+        return self.conn.execute("PRAGMA user_version").fetchone()[0]
+
+    def _migrate(self) -> None:
+        """
+        Apply any MIGRATIONS this database has not seen yet.
+
+        Each step runs in its own write transaction and re-reads the version
+        after taking the lock, so two connections opening the same database
+        at once do not apply a step twice.
+        """
+        assert self.conn is not None
+
+        while self.schema_version() < len(MIGRATIONS):
+            with self._transaction():
+                version = self.schema_version()
+                if version < len(MIGRATIONS):
+                    step = MIGRATIONS[version]
+                    if callable(step):
+                        step(self.conn)
+                    else:
+                        for sql in step:
+                            self.conn.execute(sql)
+                    self.conn.execute(f"PRAGMA user_version = {version + 1}")
+
+    @contextmanager
+    def _transaction(self):
+        """Explicit write transaction: DDL inside it commits or rolls back with the rest."""
+        assert self.conn is not None
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield self.conn
+        except BaseException:
+            self.conn.rollback()
+            # Templates saved in this transaction are gone, and their ids
+            # will be handed out again: forget them in the miner and the
+            # template cache, or later rows would render with them
+            self.miner.clear()
+            self._templates.clear()
+            raise
         self.conn.commit()
 
-    def insert_event(self, event: Event) -> int:
+    def get_checkpoint(self, path: str) -> Optional[Dict]:
+        """
+        Return the saved tail position for a log file, or None if the
+        file has never been followed.
+        """
         assert self.conn is not None
         cur = self.conn.cursor()
         cur.execute(
+            "SELECT inode, offset, partial FROM ingest_checkpoints WHERE path = ?",
+            (path,),
+        )
+        row = cur.fetchone()
+        if row is None:
+            return None
+        return {
+            "inode": row["inode"],
+            "offset": row["offset"],
+            "partial": bytes(row["partial"] or b""),
+        }
+
+    def save_checkpoint(self, path: str, inode: int, offset: int, partial: bytes) -> None:
+        assert self.conn is not None
+        self.conn.execute(CHECKPOINT_UPSERT_SQL, (path, inode, offset, partial))
+        self.conn.commit()
+
+    def archive_ingested(self, sha256: str) -> bool:
+        """True if an archive with this content was ingested before."""
+        assert self.conn is not None
+        row = self.conn.execute(
+            "SELECT 1 FROM ingested_archives WHERE sha256 = ?", (sha256,)
+        ).fetchone()
+        return row is not None
+
+    def archive_by_file(self, path: str, size: int, mtime_ns: int) -> Optional[str]:
+        """sha256 of the ingested archive last seen at path with this size and mtime, if any."""
+        assert self.conn is not None
+        row = self.conn.execute(
+            "SELECT sha256 FROM ingested_archives WHERE path = ? AND size = ? AND mtime_ns = ?",
+            (path, size, mtime_ns),
+        ).fetchone()
+        return row["sha256"] if row is not None else None
+
+    def record_archive(self, sha256: str, path: str, size: int, mtime_ns: int, lines: int) -> None:
+        """
+        Record a fully ingested archive. For content recorded before only
+        the file it is now in is updated.
+        """
+        assert self.conn is not None
+        self.conn.execute(
             """
-            INSERT INTO events (timestamp, source, raw, action, user, src_ip)
+            INSERT INTO ingested_archives (sha256, path, size, mtime_ns, lines, ingested_at)
             VALUES (?, ?, ?, ?, ?, ?)
+            ON CONFLICT(sha256) DO UPDATE SET
+                path = excluded.path,
+                size = excluded.size,
+                mtime_ns = excluded.mtime_ns
             """,
-            (
-                event.timestamp,
-                event.source,
-                event.raw,
-                event.action,
-                event.user,
-                event.src_ip,
-            ),
+            (sha256, path, size, mtime_ns, lines, datetime.now(timezone.utc).isoformat()),
         )
         self.conn.commit()
-        return cur.lastrowid
+
+    def insert_event(self, event: Event) -> int:
+        assert self.conn is not None
+        with self._transaction():
+            return self._insert_events(partition_day(event.timestamp), [_event_row(event)])
 
     def insert_alert(self, alert: Alert) -> int:
         assert self.conn is not None
         cur = self.conn.cursor()
-        cur.execute(
-            """
-            INSERT INTO alerts (timestamp, rule_name, severity, src_ip, user, message)
-            VALUES (?, ?, ?, ?, ?, ?)
-            """,
-            (
-                alert.timestamp,
-                alert.rule_name,
-                alert.severity,
-                alert.src_ip,
-                alert.user,
-                alert.message,
-            ),
-        )
+        cur.execute(ALERT_INSERT_SQL, _alert_row(alert))
         self.conn.commit()
         return cur.lastrowid
 
+    def write_batch(
+        self,
+        events: Iterable[Event] = (),
+        alerts: Iterable[Alert] = (),
+        group_rows: Iterable[tuple] = (),
+        checkpoints: Iterable[tuple] = (),
+    ) -> None:
+        """
+        Insert many events and alerts in a single transaction.
+        One commit (and at most one fsync) for the whole batch.
+        """
+        self.write_rows(map(_event_row, events), map(_alert_row, alerts), group_rows, checkpoints)
+
+    def write_rows(
+        self,
+        event_rows: Iterable[tuple] = (),
+        alert_rows: Iterable[tuple] = (),
+        group_rows: Iterable[tuple] = (),
+        checkpoints: Iterable[tuple] = (),
+    ) -> None:
+        """
+        Same as write_batch but takes rows already in column order:
+        (timestamp, source, raw, action, user, src_ip) for events and
+        (timestamp, rule_name, severity, src_ip, user, message) for alerts.
+        group_rows come from AlertAggregator.drain() and are upserted.
+        checkpoints are (path, inode, offset, partial) tail positions,
+        saved in the same transaction as the lines read up to them.
+        """
+        assert self.conn is not None
+
+        # Each event goes to the partition for its own day
+        by_day: Dict[str, List[tuple]] = {}
+        for row in event_rows:
+            by_day.setdefault(partition_day(row[0]), []).append(row)
+
+        with self._transaction():
+            for day in sorted(by_day):
+                self._insert_events(day, by_day[day])
+            self.conn.executemany(ALERT_INSERT_SQL, alert_rows)
+            self.conn.executemany(ALERT_GROUP_UPSERT_SQL, group_rows)
+            self.conn.executemany(CHECKPOINT_UPSERT_SQL, checkpoints)
+
+    def _insert_events(self, day: str, rows: List[tuple]) -> int:
+        """Insert rows into one day's partition and index them. Returns the last id."""
+        assert self.conn is not None
+        create_partition(self.conn, day)
+        table = partition_table(day)
+
+        if self.mine_templates:
+            stored = [self._encode_row(tuple(row)) for row in rows]
+        else:
+            stored = [tuple(row) + (None, None) for row in rows]
+        self.conn.executemany(
+            f"""
+            INSERT INTO {table} (timestamp, source, raw, action, user, src_ip, template_id, params)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            """,
+            stored,
+        )
+        last_id = self.conn.execute("SELECT last_insert_rowid()").fetchone()[0]
+
+        # Full-text index for the new rows, in the same transaction. One
+        # writer holds the lock, so the batch got consecutive ids. The
+        # index is contentless and raw may not be stored, so the text
+        # comes from the rows we were given.
+        first_id = last_id - len(rows) + 1
+        self.conn.executemany(
+            f"INSERT INTO {table}_fts (rowid, raw, action, user, src_ip) VALUES (?, ?, ?, ?, ?)",
+            [(first_id + i, row[2], row[3], row[4], row[5]) for i, row in enumerate(rows)],
+        )
+        return last_id
+
+    def _encode_row(self, row: tuple) -> tuple:
+        """Swap raw for (template_id, params) when the line can be rebuilt exactly."""
+        raw = row[2]
+        if not raw or PARAM_SEP in raw:
+            return row + (None, None)
+
+        cluster, params = self.miner.add(raw)
+        if cluster.template_id is None:
+            self._save_template(cluster)
+        return row[:2] + (None,) + row[3:] + (cluster.template_id, params)
+
+    def _save_template(self, cluster) -> None:
+        assert self.conn is not None
+        cur = self.conn.execute(
+            "INSERT INTO templates (cluster_id, template) VALUES (?, ?)",
+            (cluster.cluster_id, cluster.template),
+        )
+        cluster.template_id = cur.lastrowid
+        if cluster.cluster_id is None:
+            cluster.cluster_id = cur.lastrowid
+            self.conn.execute(
+                "UPDATE templates SET cluster_id = id WHERE id = ?", (cur.lastrowid,)
+            )
+        self._templates[cluster.template_id] = cluster.template
+
+    def _load_templates(self) -> None:
+        """Warm the miner with the newest version of the most recent templates."""
+        assert self.conn is not None
+        self.miner.clear()
+        rows = self.conn.execute(
+            """
+            SELECT id, cluster_id, template FROM templates
+            WHERE id IN (SELECT MAX(id) FROM templates GROUP BY cluster_id)
+            ORDER BY id DESC LIMIT ?
+            """,
+            (self.miner.max_clusters,),
+        ).fetchall()
+        for row in reversed(rows):
+            self.miner.load(row["id"], row["cluster_id"], row["template"])
+
+    def _template(self, template_id: int) -> str:
+        template = self._templates.get(template_id)
+        if template is None:
+            assert self.conn is not None
+            row = self.conn.execute(
+                "SELECT template FROM templates WHERE id = ?", (template_id,)
+            ).fetchone()
+            template = row[0] if row is not None else ""
+            if len(self._templates) >= TEMPLATE_CACHE_SIZE:
+                self._templates.clear()
+            self._templates[template_id] = template
+        return template
+
+    def _event_dict(self, row: sqlite3.Row) -> Dict:
+        event = dict(row)
+        params = event.pop("params", None)
+        if event["raw"] is None and event.get("template_id") is not None:
+            event["raw"] = render(self._template(event["template_id"]), params)
+        return event
+
+    def insert_events(self, events: Iterable[Event]) -> None:
+        self.write_batch(events=events)
+
+    def insert_alerts(self, alerts: Iterable[Alert]) -> None:
+        self.write_batch(alerts=alerts)
+
     def fetch_alerts(
         self,
         severity: Optional[str] = None,
         limit: int = 500,
+        before_id: Optional[int] = None,
+        after_id: Optional[int] = None,
+        src_ip: Optional[str] = None,
+        rule_name: Optional[str] = None,
     ) -> List[Dict]:
         """
-        Return alerts as a list of dictionaries, optional severity filter.
+        Return alerts as a list of dictionaries, newest first, with optional
+        severity, src_ip and rule_name filters.
+
+        Pass the smallest id of a page as before_id to get the next (older)
+        page, or the largest id as after_id to get the previous one.
         """
         assert self.conn is not None
-        cur = self.conn.cursor()
 
+        filters = []
         if severity:
-            cur.execute(
-                """
-                SELECT timestamp, rule_name, severity, src_ip, user, message
-                FROM alerts
-                WHERE LOWER(severity) = LOWER(?)
-                ORDER BY id DESC
-                LIMIT ?
-                """,
-                (severity, limit),
-            )
-        else:
-            cur.execute(
-                """
-                SELECT timestamp, rule_name, severity, src_ip, user, message
-                FROM alerts
-                ORDER BY id DESC
-                LIMIT ?
-                """,
-                (limit,),
-            )
+            filters.append(("severity_norm", severity.strip().lower()))
+        if src_ip:
+            filters.append(("src_ip", src_ip))
+        if rule_name:
+            filters.append(("rule_name", rule_name))
+
+        sql, params, reverse = _keyset_query(
+            "alerts", ALERT_COLUMNS, filters, limit, before_id, after_id
+        )
+        rows = self.conn.execute(sql, params).fetchall()
+        if reverse:
+            rows.reverse()
 
-        rows = cur.fetchall()
         results: List[Dict] = []
         for row in rows:
             results.append(
                 {
+                    "id": row["id"],
                     "timestamp": row["timestamp"],
                     "rule_name": row["rule_name"],
                     "severity": row["severity"],
                     "src_ip": row["src_ip"],
                     "user": row["user"],
                     "message": row["message"],
+                    "count": row["count"],
+                    "first_seen": row["first_seen"],
+                    "last_seen": row["last_seen"],
                 }
             )
         return results
 
-    def fetch_events(self, limit: int = 500) -> List[Dict]:
+    def fetch_events(
+        self,
+        limit: int = 500,
+        before_id: Optional[int] = None,
+        after_id: Optional[int] = None,
+        src_ip: Optional[str] = None,
+        time_range: Optional[tuple] = None,
+    ) -> List[Dict]:
         """
         Return recent events for the Events tab.
-        Matches fields from the Event model.
+        Matches fields from the Event model. Paged like fetch_alerts,
+        time_range works like in search_events.
         """
         assert self.conn is not None
-        cur = self.conn.cursor()
 
-        cur.execute(
-            """
-            SELECT timestamp, source, raw, action, user, src_ip
-            FROM events
-            ORDER BY id DESC
-            LIMIT ?
-            """,
-            (limit,),
+        filters = [("src_ip", src_ip)] if src_ip else []
+        conditions = _time_conditions(time_range)
+
+        def query(table: str, need: int) -> List[sqlite3.Row]:
+            sql, params, _ = _keyset_query(
+                table, EVENT_COLUMNS, filters, need, before_id, after_id, conditions
+            )
+            return self.conn.execute(sql, params).fetchall()
+
+        return self._scan_partitions(query, limit, before_id, after_id, time_range)
+
+    def search_events(
+        self,
+        query: str,
+        time_range: Optional[tuple] = None,
+        limit: int = 100,
+        before_id: Optional[int] = None,
+        after_id: Optional[int] = None,
+    ) -> List[Dict]:
+        """
+        Full-text search over event lines and parsed fields, newest first.
+
+        query is free text, every word has to match (see fts_query).
+        time_range is an optional (start, end) pair of ISO timestamps,
+        either side may be None. Paged like fetch_events.
+        """
+        assert self.conn is not None
+        match = fts_query(query)
+        if not match:
+            return []
+
+        conditions = _time_conditions(time_range, "e.timestamp")
+        order = "DESC"
+        if before_id is not None:
+            conditions.append(("f.rowid < ?", before_id))
+        elif after_id is not None:
+            conditions.append(("f.rowid > ?", after_id))
+            order = "ASC"
+
+        def search(table: str, need: int) -> List[sqlite3.Row]:
+            where = [f"{table}_fts MATCH ?"] + [sql for sql, _ in conditions]
+            params = [match] + [value for _, value in conditions] + [need]
+            return self.conn.execute(
+                f"""
+                SELECT e.id, e.timestamp, e.source, e.raw, e.action, e.user, e.src_ip,
+                       e.template_id, e.params
+                FROM {table}_fts f
+                JOIN {table} e ON e.id = f.rowid
+                WHERE {" AND ".join(where)}
+                ORDER BY f.rowid {order}
+                LIMIT ?
+                """,
+                params,
+            ).fetchall()
+
+        return self._scan_partitions(search, limit, before_id, after_id, time_range)
+
+    def _scan_partitions(
+        self,
+        query: Callable[[str, int], List[sqlite3.Row]],
+        limit: int,
+        before_id: Optional[int],
+        after_id: Optional[int],
+        time_range: Optional[tuple],
+    ) -> List[Dict]:
+        """
+        Run query(table, rows_still_needed) over the event partitions in
+        id order and stop as soon as limit rows are found. Partitions
+        outside time_range, or on the wrong side of the paging id, are
+        never opened, so queries on recent data only read recent days.
+        """
+        assert self.conn is not None
+
+        days = list_partitions(self.conn)
+        if time_range is not None:
+            days = days_in_range(days, *time_range)
+
+        ascending = before_id is None and after_id is not None
+        if before_id is not None:
+            days = [d for d in days if d <= day_of_id(before_id)]
+        elif after_id is not None:
+            days = [d for d in days if d >= day_of_id(after_id)]
+        if not ascending:
+            days.reverse()
+
+        rows: List[sqlite3.Row] = []
+        for day in days:
+            rows.extend(query(partition_table(day), limit - len(rows)))
+            if len(rows) >= limit:
+                break
+
+        # after_id pages are scanned oldest first, return them newest first
+        if ascending:
+            rows.reverse()
+        return [self._event_dict(row) for row in rows]
+
+    def count_events(self) -> int:
+        assert self.conn is not None
+        return sum(
+            self.conn.execute(f"SELECT COUNT(*) FROM {partition_table(day)}").fetchone()[0]
+            for day in list_partitions(self.conn)
         )
 
-        rows = cur.fetchall()
-        results: List[Dict] = []
-        for row in rows:
-            results.append(
-                {
-                    "timestamp": row["timestamp"],
-                    "source": row["source"],
-                    "raw": row["raw"],
-                    "action": row["action"],
-                    "user": row["user"],
-                    "src_ip": row["src_ip"],
-                }
+    def summary(self) -> Dict:
+        """Row counts for a status report: events, alerts by severity, partitions, archives."""
+        assert self.conn is not None
+        days = list_partitions(self.conn)
+        severities = {
+            (severity or "none"): n
+            for severity, n in self.conn.execute(
+                "SELECT severity_norm, COUNT(*) FROM alerts GROUP BY severity_norm ORDER BY 2 DESC"
             )
+        }
+        return {
+            "schema_version": self.schema_version(),
+            "events": self.count_events(),
+            "alerts": sum(severities.values()),
+            "alerts_by_severity": severities,
+            "partitions": len(days),
+            "first_day": days[0] if days else None,
+            "last_day": days[-1] if days else None,
+            "archives": self.conn.execute("SELECT COUNT(*) FROM ingested_archives").fetchone()[0],
+        }
+
+    def template_counts(self, time_range: Optional[tuple] = None, limit: int = 50) -> List[Dict]:
+        """
+        Event counts per mined template, most common first:
+        [{"cluster_id", "template", "count"}]. All versions of a template
+        count together and the newest version's text is shown.
+        """
+        assert self.conn is not None
+        conditions = _time_conditions(time_range, "e.timestamp")
+        where = " AND ".join(["e.template_id IS NOT NULL"] + [sql for sql, _ in conditions])
+        params = [value for _, value in conditions]
+
+        counts: Dict[int, int] = {}
+        for day in days_in_range(list_partitions(self.conn), *(time_range or (None, None))):
+            for cluster_id, n in self.conn.execute(
+                f"""
+                SELECT t.cluster_id, COUNT(*) FROM {partition_table(day)} e
+                JOIN templates t ON t.id = e.template_id
+                WHERE {where}
+                GROUP BY t.cluster_id
+                """,
+                params,
+            ):
+                counts[cluster_id] = counts.get(cluster_id, 0) + n
+
+        top = sorted(counts.items(), key=lambda item: item[1], reverse=True)[:limit]
+        results: List[Dict] = []
+        for cluster_id, n in top:
+            row = self.conn.execute(
+                "SELECT template FROM templates WHERE cluster_id = ? ORDER BY id DESC LIMIT 1",
+                (cluster_id,),
+            ).fetchone()
+            results.append({"cluster_id": cluster_id, "template": row[0], "count": n})
         return results
 
+    def list_partitions(self) -> List[str]:
+        """Days (YYYYMMDD) that have stored events, oldest first."""
+        assert self.conn is not None
+        return list_partitions(self.conn)
+
+    def drop_partitions_before(self, day: str) -> List[str]:
+        """Drop every event partition older than day. Returns the dropped days."""
+        assert self.conn is not None
+        dropped = [d for d in list_partitions(self.conn) if d < day]
+        if dropped:
+            with self._transaction():
+                for d in dropped:
+                    drop_partition(self.conn, d)
+        return dropped
+
+    def apply_retention(self, keep_days: int, now: Optional[datetime] = None) -> Dict[str, int]:
+        """
+        Keep the last keep_days UTC days (today included) and delete the rest.
+
+        Events are removed by dropping whole partitions, which costs the
+        same however many rows they hold and needs no VACUUM: the freed
+        pages go on the free list and are reused by new partitions.
+        Alerts are already aggregated into few rows, so they stay in one
+        table and old groups are deleted through the last_seen index in
+        small batches, keeping each write lock short.
+        """
+        assert self.conn is not None
+        now = now or datetime.now(timezone.utc)
+        cutoff = (now - timedelta(days=max(keep_days, 1) - 1)).date()
+
+        dropped = self.drop_partitions_before(cutoff.strftime("%Y%m%d"))
+
+        deleted = 0
+        while True:
+            with self._transaction():
+                cur = self.conn.execute(
+                    """
+                    DELETE FROM alerts WHERE id IN (
+                        SELECT id FROM alerts WHERE last_seen < ? LIMIT ?
+                    )
+                    """,
+                    (cutoff.isoformat(), RETENTION_BATCH),
+                )
+            deleted += cur.rowcount
+            if cur.rowcount < RETENTION_BATCH:
+                break
+
+        return {"partitions": len(dropped), "alerts": deleted}
+
+
+class BatchWriter:
+    """
+    Buffers events and alerts and writes them with SQLiteStorage.write_batch.
+
+    A batch is flushed when it reaches max_rows, or when the oldest pending
+    row has waited longer than max_delay seconds. Call flush() or close()
+    at the end of a run so nothing is left behind.
+
+    With an AlertAggregator, add_hit() folds alerts into groups and each
+    flush upserts the groups that changed.
+    """
+
+    def __init__(
+        self,
+        storage: SQLiteStorage,
+        max_rows: int = 1000,
+        max_delay: float = 1.0,
+        aggregator=None,
+    ) -> None:
+        self.storage = storage
+        self.max_rows = max_rows
+        self.max_delay = max_delay
+        self.aggregator = aggregator
+
+        self.events: List[Event] = []
+        self.alerts: List[Alert] = []
+        # Group rows drained from the aggregator but not committed yet.
+        # The aggregator has already reset its counts, so a failed write
+        # keeps them here for the next flush.
+        self.groups: List[tuple] = []
+        self._first_pending: Optional[float] = None
+
+    def add_event(self, event: Event) -> None:
+        self.events.append(event)
+        self._after_add()
+
+    def add_alert(self, alert: Alert) -> None:
+        self.alerts.append(alert)
+        self._after_add()
+
+    def add_hit(self, event: Event, alert: Dict) -> bool:
+        """Aggregate one rule hit. True when it opened a new alert group."""
+        assert self.aggregator is not None
+        is_new = self.aggregator.add(event, alert)
+        self._after_add()
+        return is_new
+
+    def pending(self) -> int:
+        groups = self.aggregator.pending() if self.aggregator is not None else 0
+        return len(self.events) + len(self.alerts) + len(self.groups) + groups
+
+    def _after_add(self) -> None:
+        now = time.monotonic()
+        if self._first_pending is None:
+            self._first_pending = now
+
+        if (
+            self.pending() >= self.max_rows
+            or now - self._first_pending >= self.max_delay
+        ):
+            self.flush()
+
+    def flush(self) -> None:
+        if not self.pending():
+            return
+        if self.aggregator is not None:
+            # Upserts add counts, so rows of one group from a failed flush
+            # and this one both apply
+            self.groups.extend(self.aggregator.drain())
+        self.storage.write_batch(self.events, self.alerts, self.groups)
+        self.events = []
+        self.alerts = []
+        self.groups = []
+        self._first_pending = None
+
+    def close(self) -> None:
+        self.flush()
+
+    def __enter__(self) -> "BatchWriter":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.close()
+
 
 # TEST BLOCK
 if __name__ == "__main__":
@@ -200,8 +973,4 @@ if __name__ == "__main__":
     event_id = storage.insert_event(ev)
     print(f"Inserted event with id {event_id}")
 
-    assert storage.conn is not None
-    cur = storage.conn.cursor()
-    cur.execute("SELECT COUNT(*) AS c FROM events")
-    row = cur.fetchone()
-    print(f"Total events in DB: {row['c']}")
+    print(f"Total events in DB: {storage.count_events()}")
@@ -0,0 +1,431 @@
+# siem/syslog_receiver.py
+
+import asyncio
+import re
+import socket
+import threading
+from collections import deque
+from datetime import datetime, timezone
+from typing import Callable, Deque, Dict, List, Optional, Set, Tuple
+
+from . import parsers
+from .metrics import REGISTRY, MetricsRegistry
+
+# Unprivileged default, 514 needs root
+DEFAULT_PORT = 5514
+
+# Longest message kept. Longer newline framed ones are cut, a longer
+# octet count closes the connection as the stream cannot be trusted.
+MAX_MESSAGE_SIZE = 64 * 1024
+
+# Kernel receive buffer asked for on the UDP socket, so bursts queue up
+# there rather than being dropped before we see them
+UDP_RCVBUF = 4 * 1024 * 1024
+
+# Program (RFC 3164 tag or RFC 5424 APP-NAME) -> source key in siem.parsers
+PROGRAM_SOURCES: Dict[str, str] = {
+    "sshd": "auth",
+    "sudo": "auth",
+    "su": "auth",
+    "login": "auth",
+    "nginx": "web",
+    "apache2": "web",
+    "httpd": "web",
+}
+
+# auth and authpriv, for programs not listed above
+AUTH_FACILITIES = (4, 10)
+
+# Everything else. Not a registered source, so parse_event keeps the line
+# with its timestamp.
+DEFAULT_SOURCE = "syslog"
+
+# Sources whose parser reads the message alone rather than a syslog line
+MESSAGE_ONLY_SOURCES = ("web",)
+
+_MONTH_NAMES = {number: name for name, number in parsers.MONTHS.items()}
+
+_PRI_RE = re.compile(r"<(\d{1,3})>")
+_RFC3164_RE = re.compile(
+    r"(?P<ts>[A-Z][a-z]{2} [ \d]\d \d\d:\d\d:\d\d) "
+    r"(?:(?P<host>[^\s\[]*[^\s\[:]) )?(?P<tag>[^\s:\[]+)(?:\[[^\]]*\])?: ?(?P<msg>.*)",
+    re.S,
+)
+
+# (source, raw line) as the ingest pipeline takes them
+Line = Tuple[str, str]
+
+
+def _traditional_time(dt: datetime) -> str:
+    """dt as a syslog file timestamp ("Jan  1 10:15:32") in SYSLOG_TZ."""
+    dt = dt.astimezone(parsers.SYSLOG_TZ)
+    return f"{_MONTH_NAMES[dt.month]} {dt.day:2d} {dt:%H:%M:%S}"
+
+
+def _source_for(program: str, facility: int) -> str:
+    source = PROGRAM_SOURCES.get(program)
+    if source is not None:
+        return source
+    return "auth" if facility in AUTH_FACILITIES else DEFAULT_SOURCE
+
+
+def _split_structured_data(rest: str) -> str:
+    """Skip the STRUCTURED-DATA field of an RFC 5424 message, return what follows."""
+    if rest.startswith("-"):
+        return rest[2:]
+    pos = 0
+    while pos < len(rest) and rest[pos] == "[":
+        # an element ends at the first "]" not escaped with a backslash
+        pos += 1
+        while pos < len(rest) and rest[pos] != "]":
+            pos += 2 if rest[pos] == "\\" else 1
+        pos += 1
+    return rest[pos + 1:]
+
+
+def parse_syslog(text: str, peer: str = "-") -> Optional[Line]:
+    """
+    Turn one syslog message (RFC 3164 or RFC 5424) into a (source, raw)
+    pair for parse_event, or None if it is empty.
+
+    raw is the line rsyslog would have written to the log file for it:
+    "Jan  1 10:15:32 host sshd[123]: message", with 5424 timestamps
+    converted to SYSLOG_TZ. So the auth parsers apply unchanged, and
+    events look the same whether they came from a file or the network.
+    Sources in MESSAGE_ONLY_SOURCES get the message alone, web servers
+    log their own access line format.
+
+    Messages without a priority or a timestamp are taken as they are,
+    stamped with the time received and the sender's address as host.
+    """
+    text = text.rstrip("\r\n\x00")
+    if not text.strip():
+        return None
+
+    facility = 1  # user, what RFC 3164 assumes without a priority
+    m = _PRI_RE.match(text)
+    if m is not None:
+        facility = int(m.group(1)) >> 3
+        text = text[m.end():]
+        if not text.strip():
+            return None
+
+    if text.startswith("1 "):
+        parts = text.split(" ", 6)
+        if len(parts) == 7:
+            _, stamp, host, program, procid, _, rest = parts
+            msg = _split_structured_data(rest).lstrip("\ufeff")
+            when = datetime.now(timezone.utc)
+            if stamp != "-":
+                try:
+                    when = datetime.fromisoformat(stamp)
+                except ValueError:
+                    pass
+            source = _source_for(program, facility)
+            if source in MESSAGE_ONLY_SOURCES:
+                return source, msg
+            tag = program if procid == "-" else f"{program}[{procid}]"
+            host = peer if host == "-" else host
+            return source, f"{_traditional_time(when)} {host} {tag}: {msg}"
+
+    m = _RFC3164_RE.match(text)
+    if m is None:
+        return DEFAULT_SOURCE, f"{_traditional_time(datetime.now(timezone.utc))} {peer} {text}"
+    source = _source_for(m.group("tag"), facility)
+    if source in MESSAGE_ONLY_SOURCES:
+        return source, m.group("msg")
+    if m.group("host") is None:
+        # local senders leave the host out
+        return source, f"{m.group('ts')} {peer} {text[len(m.group('ts')) + 1:]}"
+    return source, text
+
+
+def split_frames(buffer: bytearray) -> Tuple[List[bytes], Optional[str]]:
+    """
+    Take the complete messages off the front of a TCP stream buffer.
+
+    Both RFC 6587 framings are accepted and may be mixed: octet counting
+    ("<length> <message>") when the frame starts with a digit count and
+    a space, newline terminated otherwise. Returns the messages and an
+    error, set when an octet count is larger than MAX_MESSAGE_SIZE. The
+    messages before that count are still returned, the bad frame stays
+    at the front of the buffer.
+    """
+    frames: List[bytes] = []
+    error: Optional[str] = None
+    pos, size = 0, len(buffer)
+    while pos < size:
+        if 0x30 <= buffer[pos] <= 0x39:
+            space = buffer.find(b" ", pos, pos + 12)
+            if space == -1 and size - pos < 12:
+                break  # the count may not be complete yet
+            if space != -1 and buffer[pos:space].isdigit():
+                length = int(buffer[pos:space])
+                if length > MAX_MESSAGE_SIZE:
+                    error = f"frame of {length} bytes"
+                    break
+                end = space + 1 + length
+                if end > size:
+                    break
+                frames.append(bytes(buffer[space + 1:end]))
+                pos = end
+                continue
+
+        newline = buffer.find(b"\n", pos)
+        if newline == -1:
+            if size - pos <= MAX_MESSAGE_SIZE:
+                break
+            newline = pos + MAX_MESSAGE_SIZE
+            frames.append(bytes(buffer[pos:newline]))
+            pos = newline
+            continue
+        if newline > pos:
+            frames.append(bytes(buffer[pos:newline]))
+        pos = newline + 1
+    del buffer[:pos]
+    return frames, error
+
+
+class _UdpProtocol(asyncio.DatagramProtocol):
+    def __init__(self, receiver: "SyslogReceiver") -> None:
+        self.receiver = receiver
+
+    def datagram_received(self, data: bytes, addr) -> None:
+        receiver = self.receiver
+        if receiver.full():
+            # UDP senders cannot be slowed down, so this is where we lose
+            receiver.stats["dropped"] += 1
+            return
+        receiver.message(data, addr[0])
+
+
+class _TcpProtocol(asyncio.Protocol):
+    def __init__(self, receiver: "SyslogReceiver") -> None:
+        self.receiver = receiver
+        self.buffer = bytearray()
+        self.peer = "-"
+        self.transport: Optional[asyncio.Transport] = None
+
+    def connection_made(self, transport) -> None:
+        self.transport = transport
+        peer = transport.get_extra_info("peername")
+        self.peer = peer[0] if peer else "-"
+        self.receiver.connected(transport)
+
+    def data_received(self, data: bytes) -> None:
+        self.buffer += data
+        frames, error = split_frames(self.buffer)
+        for frame in frames:
+            self.receiver.message(frame, self.peer)
+        if error is not None:
+            self.receiver.stats["malformed"] += 1
+            print(f"Closing syslog connection from {self.peer}: {error}")
+            # Nothing after a bad count can be framed, connection_lost
+            # must not pass it on as a message
+            self.buffer.clear()
+            self.transport.close()
+        self.receiver.check_backlog()
+
+    def connection_lost(self, exc) -> None:
+        # A last message without its newline
+        if self.buffer:
+            self.receiver.message(bytes(self.buffer[:MAX_MESSAGE_SIZE]), self.peer)
+            self.buffer.clear()
+        self.receiver.disconnected(self.transport)
+
+
+class SyslogReceiver:
+    """
+    Syslog listener on UDP and TCP, RFC 3164 and RFC 5424, feeding the
+    ingest pipeline without going through a file.
+
+    Messages are parsed into (source, raw) lines on the event loop and
+    collected into batches. Every batch_size messages, and every
+    flush_interval seconds for a partial batch, batches are offered to
+    sink, which must not block: it returns False when the pipeline is
+    full, and the batch waits for the next try.
+
+    At most max_pending messages wait like this. Beyond that UDP
+    datagrams are dropped and counted, and TCP connections stop being
+    read until the backlog is half gone, so TCP senders are slowed down
+    instead of losing messages. On stop, what is still waiting after
+    drain_timeout seconds is counted as dropped. Drops in the kernel's UDP buffer happen
+    before we see the datagram and are not counted here.
+
+    stats is registered with the metrics registry as "syslog".
+    """
+
+    def __init__(
+        self,
+        sink: Optional[Callable[[List[Line]], bool]] = None,
+        host: str = "127.0.0.1",
+        port: int = DEFAULT_PORT,
+        udp: bool = True,
+        tcp: bool = True,
+        batch_size: int = 500,
+        flush_interval: float = 0.1,
+        max_pending: int = 100_000,
+        drain_timeout: float = 5.0,
+        metrics: Optional[MetricsRegistry] = REGISTRY,
+    ) -> None:
+        self.sink = sink
+        self.host = host
+        self.port = port
+        self.udp = udp
+        self.tcp = tcp
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.drain_timeout = drain_timeout
+
+        self.stats: Dict[str, int] = {
+            "received": 0,
+            "dropped": 0,
+            "batches": 0,
+            "malformed": 0,
+            "invalid_utf8": 0,
+            "connections": 0,
+            "paused": 0,
+        }
+        # Bound (host, port) per protocol, set once ready is
+        self.addresses: Dict[str, Tuple[str, int]] = {}
+        self.ready = threading.Event()
+
+        self._batch: List[Line] = []
+        self._pending: Deque[List[Line]] = deque()
+        self._pending_count = 0
+        self._connections: Set[asyncio.Transport] = set()
+        self._paused = False
+        if metrics is not None:
+            metrics.register("syslog", self.snapshot)
+
+    def snapshot(self) -> Dict[str, int]:
+        return dict(self.stats, pending=self._pending_count)
+
+    # -------------- called from the protocols --------------
+
+    def full(self) -> bool:
+        return self._pending_count >= self.max_pending
+
+    def message(self, data: bytes, peer: str) -> None:
+        try:
+            text = data.decode("utf-8")
+        except UnicodeDecodeError:
+            self.stats["invalid_utf8"] += 1
+            text = data.decode("utf-8", errors="replace")
+        line = parse_syslog(text, peer)
+        if line is None:
+            return
+        self.stats["received"] += 1
+        self._batch.append(line)
+        self._pending_count += 1
+        if len(self._batch) >= self.batch_size:
+            self._pending.append(self._batch)
+            self._batch = []
+            self._drain()
+
+    def check_backlog(self) -> None:
+        if self.full() and not self._paused:
+            self._paused = True
+            self.stats["paused"] += 1
+            for transport in self._connections:
+                transport.pause_reading()
+
+    def connected(self, transport: asyncio.Transport) -> None:
+        self.stats["connections"] += 1
+        self._connections.add(transport)
+        if self._paused:
+            transport.pause_reading()
+
+    def disconnected(self, transport: Optional[asyncio.Transport]) -> None:
+        self._connections.discard(transport)
+
+    # -------------- batching --------------
+
+    def _flush(self) -> None:
+        if self._batch:
+            self._pending.append(self._batch)
+            self._batch = []
+        self._drain()
+
+    def _drain(self) -> None:
+        while self._pending:
+            batch = self._pending[0]
+            if not self.sink(batch):
+                break
+            self._pending.popleft()
+            self._pending_count -= len(batch)
+            self.stats["batches"] += 1
+        if self._paused and self._pending_count <= self.max_pending // 2:
+            self._paused = False
+            for transport in self._connections:
+                transport.resume_reading()
+
+    # -------------- running --------------
+
+    def run(self, stop: threading.Event) -> None:
+        """Serve until stop is set. Blocks, run it in a thread of its own."""
+        asyncio.run(self.serve(stop))
+
+    async def serve(self, stop: threading.Event) -> None:
+        if self.sink is None:
+            raise ValueError("SyslogReceiver needs a sink")
+        loop = asyncio.get_running_loop()
+        udp_transport = None
+        server = None
+        try:
+            if self.udp:
+                family, _, _, _, address = socket.getaddrinfo(self.host, self.port, type=socket.SOCK_DGRAM)[0]
+                sock = socket.socket(family, socket.SOCK_DGRAM)
+                try:
+                    sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, UDP_RCVBUF)
+                except OSError:
+                    pass
+                sock.bind(address)
+                udp_transport, _ = await loop.create_datagram_endpoint(lambda: _UdpProtocol(self), sock=sock)
+                self.addresses["udp"] = sock.getsockname()[:2]
+            if self.tcp:
+                server = await loop.create_server(lambda: _TcpProtocol(self), self.host, self.port)
+                self.addresses["tcp"] = server.sockets[0].getsockname()[:2]
+            self.ready.set()
+
+            while not stop.is_set():
+                await asyncio.sleep(self.flush_interval)
+                self._flush()
+        finally:
+            self.ready.set()
+            if udp_transport is not None:
+                udp_transport.close()
+            if server is not None:
+                server.close()
+                for transport in list(self._connections):
+                    transport.close()
+                await server.wait_closed()
+
+            # Hand over what is left while the pipeline still takes it
+            waited = 0.0
+            self._flush()
+            while self._pending and waited < self.drain_timeout:
+                await asyncio.sleep(0.05)
+                waited += 0.05
+                self._flush()
+            self.stats["dropped"] += self._pending_count
+            self._pending.clear()
+            self._pending_count = 0
+
+
+if __name__ == "__main__":
+    import argparse
+
+    from .pipeline import run_headless
+
+    parser = argparse.ArgumentParser(description="Receive syslog over UDP and TCP and ingest it")
+    parser.add_argument("--host", default="0.0.0.0", help="address to listen on")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--no-udp", action="store_true")
+    parser.add_argument("--no-tcp", action="store_true")
+    args = parser.parse_args()
+
+    receiver = SyslogReceiver(host=args.host, port=args.port, udp=not args.no_udp, tcp=not args.no_tcp)
+    print(f"Listening for syslog on {args.host}:{args.port}")
+    run_headless(receiver=receiver)
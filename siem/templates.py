@@ -0,0 +1,150 @@
+# siem/templates.py
+
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+# Marks a variable position in a template
+WILDCARD = "<*>"
+
+# Joins the variable values of one line. Lines that contain it are stored raw.
+PARAM_SEP = "\x1f"
+
+# Default cap on templates kept in memory
+DEFAULT_MAX_CLUSTERS = 1000
+
+
+def tokenize(raw: str) -> List[str]:
+    # Split on single spaces so " ".join(tokens) gives back the exact line
+    return raw.split(" ")
+
+
+def _is_variable(token: str) -> bool:
+    return token == WILDCARD or any(c.isdigit() for c in token)
+
+
+def render(template: str, params: Optional[str]) -> str:
+    """Rebuild a raw line from its template and the params stored with it."""
+    tokens = tokenize(template)
+    wildcards = tokens.count(WILDCARD)
+    if not wildcards:
+        return template
+    values = iter((params or "").split(PARAM_SEP))
+    return " ".join(next(values, "") if t == WILDCARD else t for t in tokens)
+
+
+class Cluster:
+    """
+    One template. template_id is the stored row for the current version
+    and is None until storage has saved it; it resets whenever the
+    template gains a wildcard, since rows already stored with the old
+    version still need it to rebuild. cluster_id stays the same for all
+    versions and is what grouping by template uses.
+    """
+
+    __slots__ = ("tokens", "template_id", "cluster_id", "key")
+
+    def __init__(self, tokens: List[str], key: tuple) -> None:
+        self.tokens = tokens
+        self.template_id: Optional[int] = None
+        self.cluster_id: Optional[int] = None
+        self.key = key
+
+    @property
+    def template(self) -> str:
+        return " ".join(self.tokens)
+
+
+class TemplateMiner:
+    """
+    Streaming log template miner in the style of Drain.
+
+    Lines are routed by token count and their first depth tokens (tokens
+    with digits route as a wildcard, they are usually ids, ports or
+    addresses). Within that leaf a line joins the most similar template
+    if at least sim_threshold of its constant tokens agree, and the
+    positions that differ become wildcards. Otherwise it starts a new
+    template. At most max_clusters templates are kept, the least
+    recently used is forgotten first and simply relearned if it shows
+    up again.
+
+    add() returns the template plus the line's values for its wildcard
+    positions, which is all that is needed to rebuild the line exactly.
+    """
+
+    def __init__(
+        self,
+        sim_threshold: float = 0.5,
+        depth: int = 2,
+        max_clusters: int = DEFAULT_MAX_CLUSTERS,
+    ) -> None:
+        self.sim_threshold = sim_threshold
+        self.depth = depth
+        self.max_clusters = max_clusters
+
+        self.leaves: Dict[tuple, List[Cluster]] = {}
+        self.clusters: "OrderedDict[int, Cluster]" = OrderedDict()
+
+    def _key(self, tokens: List[str]) -> tuple:
+        prefix = tuple(WILDCARD if _is_variable(t) else t for t in tokens[: self.depth])
+        return (len(tokens),) + prefix
+
+    def add(self, raw: str) -> Tuple[Cluster, Optional[str]]:
+        """Learn one line. Returns (cluster, params) where params may be None."""
+        tokens = tokenize(raw)
+        key = self._key(tokens)
+        leaf = self.leaves.setdefault(key, [])
+
+        cluster = self._best_match(leaf, tokens)
+        if cluster is None:
+            cluster = Cluster([WILDCARD if _is_variable(t) else t for t in tokens], key)
+            leaf.append(cluster)
+        else:
+            merged = [a if a == b else WILDCARD for a, b in zip(cluster.tokens, tokens)]
+            if merged != cluster.tokens:
+                cluster.tokens = merged
+                cluster.template_id = None
+
+        self.clusters[id(cluster)] = cluster
+        self.clusters.move_to_end(id(cluster))
+        self._evict()
+
+        params = [t for t, c in zip(tokens, cluster.tokens) if c == WILDCARD]
+        return cluster, PARAM_SEP.join(params) if params else None
+
+    def _best_match(self, leaf: List[Cluster], tokens: List[str]) -> Optional[Cluster]:
+        best, best_sim = None, -1.0
+        for cluster in leaf:
+            same = constant = 0
+            for c, t in zip(cluster.tokens, tokens):
+                if c != WILDCARD:
+                    constant += 1
+                    same += c == t
+            sim = same / constant if constant else 1.0
+            if sim > best_sim:
+                best, best_sim = cluster, sim
+        if best is not None and best_sim >= self.sim_threshold:
+            return best
+        return None
+
+    def load(self, template_id: int, cluster_id: int, template: str) -> Cluster:
+        """Restore a saved template, for example on startup."""
+        tokens = tokenize(template)
+        cluster = Cluster(tokens, self._key(tokens))
+        cluster.template_id = template_id
+        cluster.cluster_id = cluster_id
+        self.leaves.setdefault(cluster.key, []).append(cluster)
+        self.clusters[id(cluster)] = cluster
+        self._evict()
+        return cluster
+
+    def _evict(self) -> None:
+        while len(self.clusters) > self.max_clusters:
+            _, cluster = self.clusters.popitem(last=False)
+            leaf = self.leaves[cluster.key]
+            leaf.remove(cluster)
+            if not leaf:
+                del self.leaves[cluster.key]
+
+    def clear(self) -> None:
+        self.leaves.clear()
+        self.clusters.clear()
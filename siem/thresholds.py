@@ -0,0 +1,158 @@
+# siem/thresholds.py
+
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+# Default cap on tracked group keys per rule
+DEFAULT_MAX_KEYS = 100_000
+
+# Each window is split into this many buckets
+DEFAULT_BUCKETS = 10
+
+
+def parse_time(ts: Optional[str]) -> float:
+    """Return an ISO timestamp as epoch seconds, or now if missing/invalid."""
+    if ts:
+        try:
+            return datetime.fromisoformat(ts).timestamp()
+        except (TypeError, ValueError):
+            pass
+    return time.time()
+
+
+def event_time(event: Dict[str, Any]) -> float:
+    return parse_time(event.get("timestamp"))
+
+
+class _KeyState:
+    """
+    Window state for one group key.
+
+    counts is a ring of bucket counters (count mode). values maps a
+    distinct value to the bucket it was last seen in (distinct mode) and
+    never grows past the rule's count, because reaching it fires.
+    """
+
+    __slots__ = ("last_bucket", "counts", "values")
+
+    def __init__(self, buckets: int, distinct: bool) -> None:
+        self.last_bucket = 0
+        self.counts: Optional[List[int]] = None if distinct else [0] * buckets
+        self.values: Optional[Dict[str, int]] = {} if distinct else None
+
+
+class ThresholdTracker:
+    """
+    Sliding window counter for one threshold rule.
+
+    Config comes from the rule's threshold block:
+
+        threshold:
+          count: 5            # fire at this many hits ...
+          window: 60          # ... within this many seconds
+          group_by: [src_ip]  # per value of these event fields
+          distinct: user      # optional, count distinct users instead of hits
+          max_keys: 100000    # optional, hard cap on tracked keys
+
+    Keys idle for a full window are evicted, and past max_keys the least
+    recently updated key is dropped, so memory stays bounded no matter
+    how many source IPs show up.
+    """
+
+    def __init__(self, config: Dict[str, Any]) -> None:
+        self.config = dict(config)
+        self.count = int(config["count"])
+        self.window = float(config["window"])
+        if self.count < 1 or self.window <= 0:
+            raise ValueError("threshold count and window must be positive")
+
+        group_by = config.get("group_by") or []
+        if isinstance(group_by, str):
+            group_by = [group_by]
+        self.group_by: List[str] = list(group_by)
+        self.distinct: Optional[str] = config.get("distinct")
+        self.max_keys = int(config.get("max_keys", DEFAULT_MAX_KEYS))
+
+        self.buckets = int(config.get("buckets", DEFAULT_BUCKETS))
+        self.bucket_width = self.window / self.buckets
+
+        self.keys: "OrderedDict[Tuple[str, ...], _KeyState]" = OrderedDict()
+        self.evicted = 0
+
+    def observe(self, event: Dict[str, Any], now: Optional[float] = None) -> Optional[Dict[str, Any]]:
+        """
+        Record one matching event.
+        Returns threshold details when the key crosses the threshold, else None.
+        """
+        if now is None:
+            now = event_time(event)
+        bucket = int(now // self.bucket_width)
+
+        key = tuple(str(event.get(field) or "") for field in self.group_by)
+        state = self.keys.get(key)
+        if state is None:
+            state = _KeyState(self.buckets, self.distinct is not None)
+            state.last_bucket = bucket
+            self.keys[key] = state
+        else:
+            self.keys.move_to_end(key)
+
+        if self.distinct is None:
+            total = self._add_count(state, bucket)
+        else:
+            total = self._add_distinct(state, bucket, str(event.get(self.distinct) or ""))
+
+        self._evict(bucket)
+
+        if total < self.count:
+            return None
+
+        # Fire once per burst, then start counting again
+        del self.keys[key]
+        return {
+            "group": dict(zip(self.group_by, key)),
+            "count": total,
+            "window": self.window,
+        }
+
+    def _add_count(self, state: _KeyState, bucket: int) -> int:
+        counts = state.counts
+        gap = bucket - state.last_bucket
+        if gap > 0:
+            # Zero the buckets we skipped over
+            for b in range(state.last_bucket + 1, state.last_bucket + 1 + min(gap, self.buckets)):
+                counts[b % self.buckets] = 0
+            state.last_bucket = bucket
+        elif gap <= -self.buckets:
+            # Older than the whole window, ignore it
+            return sum(counts)
+
+        counts[bucket % self.buckets] += 1
+        return sum(counts)
+
+    def _add_distinct(self, state: _KeyState, bucket: int, value: str) -> int:
+        values = state.values
+        if bucket > state.last_bucket:
+            state.last_bucket = bucket
+        oldest = state.last_bucket - self.buckets
+        if bucket <= oldest:
+            return len(values)
+
+        if values.get(value, oldest) < bucket:
+            values[value] = bucket
+        for v in [v for v, b in values.items() if b <= oldest]:
+            del values[v]
+        return len(values)
+
+    def _evict(self, bucket: int) -> None:
+        # Keys are kept in update order, so idle ones sit at the front
+        idle_before = bucket - self.buckets
+        while self.keys:
+            oldest_key, oldest = next(iter(self.keys.items()))
+            if oldest.last_bucket > idle_before and len(self.keys) <= self.max_keys:
+                break
+            del self.keys[oldest_key]
+            if oldest.last_bucket > idle_before:
+                self.evicted += 1
@@ -0,0 +1,258 @@
+# siem/watchlist.py
+
+import array
+import mmap
+import os
+import socket
+import struct
+import threading
+from bisect import bisect_right
+from pathlib import Path
+from typing import Iterable, List, Optional, Tuple
+
+# Feed files are <name>.txt, one IP or CIDR per line, # starts a comment
+FEED_SUFFIX = ".txt"
+
+# Compiled form written next to each feed and memory mapped for lookups
+COMPILED_SUFFIX = ".wl"
+MAGIC = b"WTWL"
+VERSION = 1
+
+# magic, version, reserved, feed mtime_ns, feed size, IPv4 ranges, IPv6 ranges.
+# 32 bytes, so the arrays after it stay aligned.
+HEADER = struct.Struct("<4sHHqqII")
+
+# (start, end) inclusive, as ints
+Range = Tuple[int, int]
+
+
+def parse_indicator(text: str) -> Optional[Tuple[int, int, int]]:
+    """
+    Parse one IP or CIDR into (family, first, last) as integers,
+    family being 4 or 6. Returns None if it is neither.
+    """
+    addr, slash, bits = text.partition("/")
+    for family, af, width in ((4, socket.AF_INET, 32), (6, socket.AF_INET6, 128)):
+        try:
+            value = int.from_bytes(socket.inet_pton(af, addr), "big")
+        except OSError:
+            continue
+        if not slash:
+            return family, value, value
+        if not bits.isdigit() or int(bits) > width:
+            return None
+        host_bits = width - int(bits)
+        first = value >> host_bits << host_bits
+        return family, first, first | ((1 << host_bits) - 1)
+    return None
+
+
+def merge_ranges(ranges: List[Range]) -> List[Range]:
+    """Sort and merge overlapping or adjacent ranges, so they are disjoint."""
+    merged: List[Range] = []
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1] + 1:
+            if end > merged[-1][1]:
+                merged[-1] = (merged[-1][0], end)
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def compile_feed(lines: Iterable[str], out_path: Path, signature: Tuple[int, int] = (0, 0)) -> Tuple[int, int, int]:
+    """
+    Write indicators as a compiled watchlist: the header, then IPv4 range
+    starts and ends as native uint32 arrays, then IPv6 starts and ends as
+    16 byte big endian values. Written atomically.
+
+    Returns (IPv4 ranges, IPv6 ranges, lines skipped as invalid).
+    """
+    v4: List[Range] = []
+    v6: List[Range] = []
+    skipped = 0
+    for line in lines:
+        text = line.split("#", 1)[0].strip()
+        if not text:
+            continue
+        parsed = parse_indicator(text)
+        if parsed is None:
+            skipped += 1
+        elif parsed[0] == 4:
+            v4.append(parsed[1:])
+        else:
+            v6.append(parsed[1:])
+
+    v4, v6 = merge_ranges(v4), merge_ranges(v6)
+    tmp = out_path.with_name(f"{out_path.name}.{os.getpid()}.tmp")
+    with tmp.open("wb") as f:
+        f.write(HEADER.pack(MAGIC, VERSION, 0, signature[0], signature[1], len(v4), len(v6)))
+        array.array("I", (start for start, _ in v4)).tofile(f)
+        array.array("I", (end for _, end in v4)).tofile(f)
+        f.write(b"".join(start.to_bytes(16, "big") for start, _ in v6))
+        f.write(b"".join(end.to_bytes(16, "big") for _, end in v6))
+    os.replace(tmp, out_path)
+    return len(v4), len(v6), skipped
+
+
+class _Mapped:
+    """One opened compiled watchlist. Replaced as a whole on reload."""
+
+    __slots__ = ("mm", "signature", "v4_starts", "v4_ends", "v6_count", "v6_starts", "v6_ends")
+
+    def __init__(self, path: Path) -> None:
+        with path.open("rb") as f:
+            self.mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, _, mtime_ns, size, n4, n6 = HEADER.unpack_from(self.mm, 0)
+        if magic != MAGIC or version != VERSION or len(self.mm) != HEADER.size + 8 * n4 + 32 * n6:
+            raise ValueError(f"not a compiled watchlist: {path}")
+        self.signature = (mtime_ns, size)
+
+        # Zero copy views, bisect works on them like on lists
+        view = memoryview(self.mm)
+        offset = HEADER.size
+        self.v4_starts = view[offset:offset + 4 * n4].cast("I")
+        self.v4_ends = view[offset + 4 * n4:offset + 8 * n4].cast("I")
+        self.v6_count = n6
+        self.v6_starts = offset + 8 * n4
+        self.v6_ends = self.v6_starts + 16 * n6
+
+    def __len__(self) -> int:
+        return len(self.v4_starts) + self.v6_count
+
+    def contains_v4(self, value: int) -> bool:
+        i = bisect_right(self.v4_starts, value) - 1
+        return i >= 0 and value <= self.v4_ends[i]
+
+    def contains_v6(self, packed: bytes) -> bool:
+        # bisect_right over the 16 byte starts, compared as bytes
+        mm, starts = self.mm, self.v6_starts
+        lo, hi = 0, self.v6_count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if packed < mm[starts + 16 * mid:starts + 16 * mid + 16]:
+                hi = mid
+            else:
+                lo = mid + 1
+        if lo == 0:
+            return False
+        end = self.v6_ends + 16 * (lo - 1)
+        return packed <= mm[end:end + 16]
+
+
+class Watchlist:
+    """
+    A set of IPs and CIDR ranges from one feed file, for O(log n) lookups.
+
+    The feed is compiled once into sorted, merged ranges in a binary file
+    next to it and that file is memory mapped, so loading a list of
+    millions of indicators is an open and an mmap, and the pages are
+    shared by every process using it. refresh() recompiles when the
+    feed's mtime or size changed and swaps the new mapping in, lookups
+    running meanwhile finish on the old one.
+
+    Pickles as its paths only, the mapping is reopened on first use.
+    """
+
+    def __init__(self, feed_path: Path, compiled_path: Optional[Path] = None) -> None:
+        self.feed_path = Path(feed_path)
+        self.compiled_path = Path(compiled_path) if compiled_path else self.feed_path.with_suffix(COMPILED_SUFFIX)
+        self.name = self.feed_path.stem
+        self._mapped: Optional[_Mapped] = None
+        self._feed_signature: Optional[Tuple[int, int]] = None
+        self._lock = threading.Lock()
+
+    def __getstate__(self):
+        return {"feed_path": self.feed_path, "compiled_path": self.compiled_path}
+
+    def __setstate__(self, state) -> None:
+        self.__init__(state["feed_path"], state["compiled_path"])
+
+    def __len__(self) -> int:
+        mapped = self._mapped
+        return len(mapped) if mapped is not None else 0
+
+    def refresh(self) -> bool:
+        """Load or reload the list if the feed changed. Returns True when it did."""
+        with self._lock:
+            try:
+                st = os.stat(self.feed_path)
+                signature: Optional[Tuple[int, int]] = (st.st_mtime_ns, st.st_size)
+            except OSError:
+                signature = None
+            if self._mapped is not None and signature == self._feed_signature:
+                return False
+
+            if signature is None:
+                if self._feed_signature is not None or self._mapped is None:
+                    print(f"Watchlist feed not found: {self.feed_path}")
+                self._feed_signature, self._mapped = None, _EMPTY
+                return True
+
+            mapped = self._open(signature)
+            if mapped is None:
+                try:
+                    with self.feed_path.open("r", encoding="utf-8", errors="replace") as f:
+                        _, _, skipped = compile_feed(f, self.compiled_path, signature)
+                except OSError as e:
+                    print(f"Could not compile watchlist {self.feed_path}: {e}")
+                    skipped = 0
+                if skipped:
+                    print(f"Skipped {skipped} invalid line(s) in watchlist {self.feed_path}")
+                mapped = self._open(signature)
+            self._feed_signature, self._mapped = signature, mapped or _EMPTY
+            return True
+
+    def _open(self, signature: Tuple[int, int]) -> Optional[_Mapped]:
+        """The compiled file if it exists and was built from this version of the feed."""
+        try:
+            mapped = _Mapped(self.compiled_path)
+        except (OSError, ValueError, struct.error):
+            return None
+        return mapped if mapped.signature == signature else None
+
+    def contains(self, ip: str) -> bool:
+        mapped = self._mapped
+        if mapped is None:
+            self.refresh()
+            mapped = self._mapped
+        if ":" in ip:
+            try:
+                return mapped.contains_v6(socket.inet_pton(socket.AF_INET6, ip))
+            except OSError:
+                return False
+        try:
+            return mapped.contains_v4(int.from_bytes(socket.inet_pton(socket.AF_INET, ip), "big"))
+        except OSError:
+            return False
+
+    __contains__ = contains
+
+
+def _empty_mapping() -> _Mapped:
+    # Stands in for a missing feed, matches nothing
+    empty = _Mapped.__new__(_Mapped)
+    empty.mm = b""
+    empty.signature = (0, 0)
+    empty.v4_starts = empty.v4_ends = memoryview(array.array("I"))
+    empty.v6_count = empty.v6_starts = empty.v6_ends = 0
+    return empty
+
+
+_EMPTY = _empty_mapping()
+
+
+if __name__ == "__main__":
+    import argparse
+    import time
+
+    parser = argparse.ArgumentParser(description="Compile a watchlist feed and look up addresses in it")
+    parser.add_argument("feed", type=Path, help="text file with one IP or CIDR per line")
+    parser.add_argument("ips", nargs="*", help="addresses to look up")
+    args = parser.parse_args()
+
+    watchlist = Watchlist(args.feed)
+    started = time.perf_counter()
+    watchlist.refresh()
+    print(f"{watchlist.name}: {len(watchlist)} ranges, loaded in {(time.perf_counter() - started) * 1000:.1f} ms")
+    for ip in args.ips:
+        print(f"{ip}: {'listed' if watchlist.contains(ip) else 'not listed'}")
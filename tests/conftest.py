@@ -0,0 +1,30 @@
+# tests/conftest.py
+import pytest
+
+from siem.storage import SQLiteStorage
+
+
+@pytest.fixture
+def storage(tmp_path):
+    """An empty database in tmp_path with the current schema."""
+    storage = SQLiteStorage(db_path=str(tmp_path / "siem.db"))
+    storage.connect()
+    storage.init_db()
+    yield storage
+    storage.close()
+
+
+@pytest.fixture
+def rule_dir(tmp_path):
+    """A rules directory in tmp_path with one rule, FAILED, alerting on every failed password."""
+    rules = tmp_path / "rules"
+    rules.mkdir()
+    (rules / "failed.yaml").write_text(
+        "id: FAILED\n"
+        "description: failed login\n"
+        "log_type: auth\n"
+        "match_type: contains\n"
+        'pattern: "Failed password"\n'
+        "severity: high\n"
+    )
+    return rules
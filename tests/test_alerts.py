@@ -0,0 +1,59 @@
+# tests/test_alerts.py
+from siem.alerts import AlertAggregator
+from siem.models import Event
+
+
+class FakeEngine:
+    def __init__(self, rules):
+        self.by_id = {r["id"]: r for r in rules}
+
+
+def hit(src_ip="1.2.3.4", user="root", ts="2024-01-01T10:00:00+00:00"):
+    ev = Event(timestamp=ts, source="auth", raw=f"Failed password for {user} from {src_ip}", user=user, src_ip=src_ip)
+    return ev, {"rule_id": "FAILED", "severity": "high"}
+
+
+def test_repeated_hits_become_one_row(storage):
+    agg = AlertAggregator(window=300)
+
+    assert agg.add(*hit(ts="2024-01-01T10:00:00+00:00")) is True
+    for second in range(1, 50):
+        assert agg.add(*hit(ts=f"2024-01-01T10:00:{second:02d}+00:00")) is False
+    storage.write_rows(group_rows=agg.drain())
+
+    # a later batch in the same window lands on the same row
+    agg.add(*hit(ts="2024-01-01T10:04:00+00:00"))
+    storage.write_rows(group_rows=agg.drain())
+
+    rows = storage.fetch_alerts()
+    assert len(rows) == 1
+    assert rows[0]["count"] == 51
+    assert rows[0]["first_seen"] == "2024-01-01T10:00:00+00:00"
+    assert rows[0]["last_seen"] == "2024-01-01T10:04:00+00:00"
+
+
+def test_groups_split_by_ip_user_and_window():
+    agg = AlertAggregator(window=300)
+    assert agg.add(*hit(src_ip="a"))
+    assert agg.add(*hit(src_ip="b"))
+    assert agg.add(*hit(src_ip="a", user="bob"))
+    assert agg.add(*hit(src_ip="a", ts="2024-01-01T10:05:00+00:00"))
+    assert len(agg.drain()) == 4
+
+
+def test_rate_limit_folds_into_overflow_group():
+    agg = AlertAggregator(FakeEngine([{"id": "FAILED", "aggregate": {"rate_limit": 2}}]))
+    opened = [agg.add(*hit(src_ip=f"10.0.0.{i}")) for i in range(10)]
+
+    assert opened == [True, True, True] + [False] * 7
+    rows = {row[4]: row[7] for row in agg.drain()}
+    assert rows["*"] == 8
+    assert agg.rate_limited == 8
+
+
+def test_suppression():
+    agg = AlertAggregator(FakeEngine([{"id": "FAILED", "aggregate": {"suppress": {"src_ip": ["10.9.9.9"]}}}]))
+    assert agg.add(*hit(src_ip="10.9.9.9")) is False
+    assert agg.add(*hit(src_ip="10.0.0.1")) is True
+    assert agg.suppressed == 1
+    assert len(agg.drain()) == 1
@@ -0,0 +1,105 @@
+# tests/test_alerts_view.py
+from ui.alerts_view import PagedTable
+
+
+class FakeTree:
+    """Just enough of ttk.Treeview for PagedTable, no display needed."""
+
+    def __init__(self):
+        self.items = []
+
+    def configure(self, **kw):
+        pass
+
+    def get_children(self):
+        return tuple(self.items)
+
+    def delete(self, *iids):
+        gone = set(iids)
+        self.items = [i for i in self.items if i not in gone]
+
+    def insert(self, parent, index, iid, values, tags):
+        if index == 0:
+            self.items.insert(0, iid)
+        else:
+            self.items.append(iid)
+
+    def yview_moveto(self, fraction):
+        pass
+
+    def see(self, iid):
+        pass
+
+    def after_idle(self, func):
+        func()
+
+
+class FakeScrollbar:
+    def set(self, first, last):
+        pass
+
+
+def fetch(limit, before_id=None, after_id=None):
+    # ids 1..1000, newest first
+    if before_id is not None:
+        ids = range(before_id - 1, max(before_id - 1 - limit, 0), -1)
+    elif after_id is not None:
+        ids = reversed(range(after_id + 1, min(after_id + 1 + limit, 1001)))
+    else:
+        ids = range(1000, 1000 - limit, -1)
+    return [{"id": i} for i in ids]
+
+
+def make_table():
+    table = PagedTable(FakeTree(), FakeScrollbar(), page_size=50, max_rows=120)
+    table.show(fetch, lambda row: ((row["id"],), ()))
+    return table
+
+
+def test_scrolling_down_pages_and_evicts():
+    table = make_table()
+    assert table.ids[0] == 1000 and len(table.ids) == 50
+
+    for _ in range(5):
+        table._on_yview("0.8", "1.0")
+
+    assert len(table.ids) <= 120
+    assert table.ids == sorted(table.ids, reverse=True)
+    assert table.ids[-1] == 1000 - 300 + 1
+    assert table.has_newer
+    assert table.tree.get_children() == tuple(str(i) for i in table.ids)
+
+
+def test_scrolling_back_up_refetches_evicted_rows():
+    table = make_table()
+    for _ in range(5):
+        table._on_yview("0.8", "1.0")
+    for _ in range(5):
+        table._on_yview("0.0", "0.2")
+
+    assert table.ids[0] == 1000
+    assert not table.has_newer
+    assert table.ids == sorted(table.ids, reverse=True)
+
+
+def test_clear_stops_paging():
+    table = make_table()
+    table.clear()
+    assert not table.active
+    assert table.tree.get_children() == ()
+
+
+def test_alert_feed_caps_pending_and_counts_drops():
+    from ui.alerts_view import AlertFeed
+
+    feed = AlertFeed(max_pending=10)
+    feed.publish([(None, {"rule_id": "A"})] * 8)
+    feed.publish([(None, {"rule_id": "B"})] * 5)
+
+    rows, dropped = feed.take(4)
+    assert len(rows) == 4
+    assert dropped == {"B": 3}
+
+    rows, dropped = feed.take(100)
+    assert len(rows) == 6
+    assert not dropped
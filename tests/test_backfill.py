@@ -0,0 +1,137 @@
+# tests/test_backfill.py
+from siem.backfill import run_backfill, split_file
+from siem.storage import SQLiteStorage
+
+
+def write_auth_log(path, n):
+    with path.open("w") as f:
+        for i in range(n):
+            verb = "Failed" if i % 2 else "Accepted"
+            f.write(f"Jan  1 10:15:{i % 60:02d} host sshd[{i}]: {verb} password for u{i} from 10.0.0.{i % 250} port 22 ssh2\n")
+
+
+def test_split_file_is_line_aligned(tmp_path):
+    path = tmp_path / "auth.log"
+    write_auth_log(path, 100)
+    ranges = split_file(path, chunk_size=500)
+
+    assert ranges[0][0] == 0
+    assert ranges[-1][1] == path.stat().st_size
+    data = path.read_bytes()
+    for start, end in ranges:
+        assert data[end - 1:end] == b"\n"
+    assert all(a[1] == b[0] for a, b in zip(ranges, ranges[1:]))
+
+
+def test_backfill_in_pool_keeps_file_order(tmp_path, rule_dir):
+    path = tmp_path / "auth.log.1"
+    write_auth_log(path, 200)
+
+    storage = SQLiteStorage(db_path=str(tmp_path / "siem.db"))
+    storage.connect()
+    storage.init_db()
+
+    stats = run_backfill([path], storage, rule_dir=rule_dir, workers=2, chunk_size=1000)
+    assert stats["events"] == 200
+    assert stats["alerts"] == 100
+    assert stats["chunks"] > 2
+
+    users = [e["user"] for e in reversed(storage.fetch_events(limit=1000))]
+    assert users == [f"u{i}" for i in range(200)]
+
+
+def test_backfill_workers_match_field_rules(tmp_path):
+    rules = tmp_path / "rules"
+    rules.mkdir()
+    (rules / "fields.yaml").write_text(
+        "id: U3_FAILED\nlog_type: auth\nmatch_type: fields\nseverity: high\n"
+        "fields:\n  action: login_failed\n  user: [u3, u5]\n"
+    )
+    path = tmp_path / "auth.log"
+    write_auth_log(path, 10)
+
+    storage = SQLiteStorage(db_path=str(tmp_path / "siem.db"))
+    storage.connect()
+    storage.init_db()
+
+    stats = run_backfill([path], storage, rule_dir=rules, workers=1)
+    assert stats["alerts"] == 2
+
+
+def test_backfill_streams_archives_in_order_once(tmp_path, rule_dir):
+    import gzip
+
+    old, new = tmp_path / "old.log", tmp_path / "auth.log.1"
+    write_auth_log(old, 50)
+    write_auth_log(new, 150)
+    data = old.read_bytes()
+    # older lines go in the compressed, higher numbered archive
+    (tmp_path / "auth.log.2.gz").write_bytes(gzip.compress(data))
+    lines = new.read_bytes().splitlines(keepends=True)[50:]
+    new.write_bytes(b"".join(lines))
+
+    storage = SQLiteStorage(db_path=str(tmp_path / "siem.db"))
+    storage.connect()
+    storage.init_db()
+
+    paths = [new, tmp_path / "auth.log.2.gz"]
+    stats = run_backfill(paths, storage, rule_dir=rule_dir, workers=2, chunk_size=1000)
+    assert stats["events"] == 150
+    users = [e["user"] for e in reversed(storage.fetch_events(limit=1000))]
+    assert users == [f"u{i}" for i in range(150)]
+
+    again = run_backfill(paths, storage, rule_dir=rule_dir, workers=0)
+    assert again["events"] == 0
+
+
+def test_backfill_skips_unreadable_archives(tmp_path, rule_dir):
+    good = tmp_path / "auth.log.1"
+    write_auth_log(good, 20)
+    bad = tmp_path / "auth.log.2.gz"
+    bad.write_bytes(b"not gzip at all\n")
+
+    storage = SQLiteStorage(db_path=str(tmp_path / "siem.db"))
+    storage.connect()
+    storage.init_db()
+
+    stats = run_backfill([bad, good], storage, rule_dir=rule_dir, workers=0)
+    assert stats["events"] == 20
+    assert stats["errors"] == 1
+
+
+def test_backfill_threshold_counts_web_fields(tmp_path):
+    rules = tmp_path / "rules"
+    rules.mkdir()
+    (rules / "scan.yaml").write_text(
+        "id: PATH_SCAN\nlog_type: web\nmatch_type: fields\nseverity: medium\n"
+        "fields:\n  action: web_request\n"
+        "threshold:\n  count: 3\n  window: 60\n  group_by: [src_ip]\n  distinct: path\n"
+    )
+    path = tmp_path / "access.log.1"
+    path.write_text("".join(
+        f'203.0.113.9 - - [10/Oct/2024:13:55:{i:02d} +0000] "GET /{name} HTTP/1.1" 404 0 "-" "curl"\n'
+        for i, name in enumerate(["a", "b", "c"])
+    ))
+
+    storage = SQLiteStorage(db_path=str(tmp_path / "siem.db"))
+    storage.connect()
+    storage.init_db()
+
+    stats = run_backfill([path], storage, rule_dir=rules, workers=1)
+    assert stats["alerts"] == 1
+
+
+def test_backfill_ingests_copies_of_one_archive_once(tmp_path, rule_dir):
+    import gzip
+
+    plain = tmp_path / "auth.log.1"
+    write_auth_log(plain, 50)
+    (tmp_path / "auth.log.2.gz").write_bytes(gzip.compress(plain.read_bytes()))
+
+    storage = SQLiteStorage(db_path=str(tmp_path / "siem.db"))
+    storage.connect()
+    storage.init_db()
+
+    stats = run_backfill([plain, tmp_path / "auth.log.2.gz"], storage, rule_dir=rule_dir, workers=2)
+    assert stats["events"] == 50
+    assert stats["alerts"] == 25
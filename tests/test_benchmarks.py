@@ -0,0 +1,49 @@
+# tests/test_benchmarks.py
+from benchmarks.generator import auth_lines, make_rules, web_lines
+from benchmarks.run import compare, run
+from siem.parsers import parse_event
+
+
+def test_generator_is_deterministic():
+    assert list(auth_lines(50, seed=7)) == list(auth_lines(50, seed=7))
+    assert list(auth_lines(50, seed=7)) != list(auth_lines(50, seed=8))
+
+    failed = [parse_event("auth", line) for line in auth_lines(500)]
+    assert sum(ev.action == "login_failed" for ev in failed) > 200
+    assert all(parse_event("web", line).src_ip for line in web_lines(100))
+
+
+def test_make_rules_pads_to_count(tmp_path):
+    make_rules(tmp_path / "rules", 12)
+    assert len(list((tmp_path / "rules").glob("*.yaml"))) == 12
+
+
+def test_compare_flags_regressions():
+    config = {"lines": 10, "rules": 1, "seed": 1}
+    baseline = {"config": config, "results": {"parse": {"per_sec": 1000.0, "p99_ms": 1.0}}}
+
+    def report(per_sec, p99_ms):
+        return {"config": config, "results": {"parse": {"per_sec": per_sec, "p99_ms": p99_ms}}}
+
+    assert compare(report(850.0, 1.5), baseline) == []
+    assert len(compare(report(700.0, 1.0), baseline)) == 1
+    assert len(compare(report(1000.0, 2.5), baseline)) == 1
+    assert compare(dict(report(1000.0, 1.0), config={}), baseline)
+
+    # peak memory is gated like throughput
+    memory = {"config": config, "results": {"read": {"per_sec": 1.0, "p99_ms": None, "peak_kib": 100.0}}}
+    base = {"config": config, "results": {"read": {"per_sec": 1.0, "p99_ms": None, "peak_kib": 80.0}}}
+    assert len(compare(memory, base)) == 1
+    memory["results"]["read"]["peak_kib"] = 90.0
+    assert compare(memory, base) == []
+
+    # a benchmark without a baseline entry is not silently passed
+    unknown = {"config": config, "results": {"read": {"per_sec": 1.0, "p99_ms": 1.0}}}
+    assert compare(unknown, baseline) == ["read: no baseline, record one with --update-baseline --only read"]
+
+
+def test_small_run_reports_every_benchmark():
+    report = run(lines=200, rules=10)
+    assert set(report["results"]) == {"read", "parse", "match", "storage_insert", "storage_query", "ingest"}
+    assert report["results"]["ingest"]["count"] == 200
+    assert report["results"]["read"]["peak_kib"] > 0
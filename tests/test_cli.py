@@ -0,0 +1,123 @@
+# tests/test_cli.py
+import json
+import subprocess
+import sys
+from pathlib import Path
+
+from siem.cli import main
+from siem.models import Alert, Event
+from siem.storage import SQLiteStorage
+
+REPO = Path(__file__).resolve().parent.parent
+
+
+def seed(tmp_path):
+    db = str(tmp_path / "siem.db")
+    storage = SQLiteStorage(db_path=db)
+    storage.connect()
+    storage.init_db()
+    storage.insert_events([
+        Event(timestamp="2024-01-01T10:00:00+00:00", source="auth", raw="Failed password for root from 203.0.113.5",
+              action="login_failed", user="root", src_ip="203.0.113.5"),
+        Event(timestamp="2024-01-02T10:00:00+00:00", source="auth", raw="Accepted password for alice from 10.0.0.2",
+              action="login_success", user="alice", src_ip="10.0.0.2"),
+    ])
+    storage.insert_alerts([
+        Alert(timestamp="2024-01-01T10:00:00+00:00", rule_name="SSH_FAIL", severity="High",
+              src_ip="203.0.113.5", user="root", message="failed login"),
+        Alert(timestamp="2024-01-02T10:00:00+00:00", rule_name="OTHER", severity="low",
+              src_ip="10.0.0.2", user="alice", message="other"),
+    ])
+    storage.close()
+    return db
+
+
+def json_lines(capsys):
+    return [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+
+
+def test_queries_print_json_lines_with_filters(tmp_path, capsys):
+    db = seed(tmp_path)
+
+    assert main(["--db", db, "alerts", "--severity", "high", "--json"]) == 0
+    assert [a["rule_name"] for a in json_lines(capsys)] == ["SSH_FAIL"]
+
+    assert main(["--db", db, "events", "--json"]) == 0
+    assert [e["user"] for e in json_lines(capsys)] == ["alice", "root"]
+
+    assert main(["--db", db, "events", "--search", "Failed root", "--json"]) == 0
+    assert [e["src_ip"] for e in json_lines(capsys)] == ["203.0.113.5"]
+
+    assert main(["--db", db, "events", "--since", "2024-01-02", "--json"]) == 0
+    assert [e["user"] for e in json_lines(capsys)] == ["alice"]
+
+    assert main(["--db", db, "stats", "--json", "--metrics", str(tmp_path / "none.json")]) == 0
+    stats = json.loads(capsys.readouterr().out)
+    assert (stats["events"], stats["alerts"], stats["partitions"]) == (2, 2, 2)
+    assert stats["alerts_by_severity"] == {"high": 1, "low": 1}
+
+
+def test_backfill_command(tmp_path, capsys):
+    db = str(tmp_path / "siem.db")
+    log = tmp_path / "auth.log.1"
+    log.write_text("Jan  1 10:00:00 h sshd[1]: Failed password for root from 203.0.113.5 port 22 ssh2\n")
+
+    assert main(["--db", db, "backfill", str(log), "--workers", "0"]) == 0
+    assert "1 events" in capsys.readouterr().out
+    assert main(["--db", db, "events", "--json"]) == 0
+    assert json_lines(capsys)[0]["action"] == "login_failed"
+
+
+def test_query_commands_load_only_storage(tmp_path):
+    db = seed(tmp_path)
+    code = (
+        "import sys\n"
+        "from siem.cli import main\n"
+        f"main(['--db', {db!r}, 'alerts'])\n"
+        f"main(['--db', {db!r}, 'events', '--search', 'root'])\n"
+        "heavy = {'tkinter', 'yaml', 'siem.rule_engine', 'siem.pipeline'} & set(sys.modules)\n"
+        "assert not heavy, heavy\n"
+    )
+    result = subprocess.run([sys.executable, "-c", code], cwd=REPO, capture_output=True, text=True)
+    assert result.returncode == 0, result.stderr
+    assert "SSH_FAIL" in result.stdout
+
+
+def test_missing_database_is_an_error(tmp_path, capsys):
+    try:
+        main(["--db", str(tmp_path / "missing.db"), "alerts"])
+    except SystemExit as e:
+        assert e.code == 1
+    else:
+        raise AssertionError("expected SystemExit")
+    assert not (tmp_path / "missing.db").exists()
+
+
+def test_queries_do_not_change_the_database(tmp_path, capsys):
+    import sqlite3
+
+    db = seed(tmp_path)
+    conn = sqlite3.connect(db)
+    conn.execute("PRAGMA journal_mode = DELETE")
+    conn.close()
+    assert main(["--db", db, "stats", "--json", "--metrics", str(tmp_path / "none.json")]) == 0
+    conn = sqlite3.connect(db)
+    assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "delete"
+    conn.close()
+
+    # a database from before the migrations is left for ingest to upgrade
+    legacy = str(tmp_path / "legacy.db")
+    conn = sqlite3.connect(legacy)
+    conn.execute("CREATE TABLE events (id INTEGER PRIMARY KEY, timestamp TEXT, raw TEXT)")
+    conn.close()
+    try:
+        main(["--db", legacy, "events"])
+    except SystemExit as e:
+        assert e.code == 1
+    else:
+        raise AssertionError("expected SystemExit")
+    assert "run `watchtower ingest` first" in capsys.readouterr().err
+    conn = sqlite3.connect(legacy)
+    assert conn.execute("PRAGMA user_version").fetchone()[0] == 0
+    assert [r[0] for r in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")] == ["events"]
+    conn.close()
@@ -0,0 +1,88 @@
+# tests/test_grok.py
+import os
+
+from siem.grok import GrokParser, expand, literal_prefix, load_dir
+from siem.parsers import PARSERS, TIMESTAMPS, parse_auth_log
+
+DEF = """
+source: app
+files: [app.log]
+timestamp: syslog
+patterns:
+  - action: denied
+    match: "denied %{WORD:verb} on %{PATH:path} for %{USER:user}"
+  - action: login
+    match: "login %{USER:user} from %{IP:src_ip}"
+"""
+
+
+def parser(patterns):
+    return GrokParser("app", [], patterns, TIMESTAMPS["none"])
+
+
+def test_expand_and_literal_prefix():
+    regex, fields = expand("x %{USER:user} %{INT} (?P<port>\\d+)", "_0_")
+    assert fields == [("_0_user", "user"), ("_0_port", "port")]
+    assert "(?P<_0_user>\\S+)" in regex and "(?:[+-]?\\d+)" in regex
+    assert literal_prefix("Failed %{USER:user}") == "Failed "
+    assert literal_prefix("sudo: +x") == "sudo: "
+    assert literal_prefix("abc?d") == "ab"
+    assert literal_prefix("Failed|Accepted") == ""
+    assert literal_prefix("%{IP:src_ip} x") == ""
+
+
+def test_one_alternation_reports_which_pattern_matched():
+    p = parser([
+        {"action": "a", "match": "alpha (?P<user>\\w+)"},
+        {"action": "b", "match": "beta %{IP:src_ip} (?P<port>\\d+)"},
+    ])
+    ev = p("x beta 10.0.0.1 22")
+    assert (ev.action, ev.src_ip, ev.extra) == ("b", "10.0.0.1", {"port": "22"})
+    assert p("alpha bob").user == "bob"
+    assert p("gamma").action == ""
+    assert p("  ") is None and p("# comment") is None
+
+    # a captured action overrides the pattern's, unmatched groups stay empty
+    p = parser([{"action": "x", "match": "(?:by %{USER:user} )?%{WORD:action} done"}])
+    ev = p("restart done")
+    assert (ev.action, ev.user, ev.src_ip) == ("restart", "", "")
+
+
+def test_prefilter_when_given_or_patterns_do_not_start_with_a_literal():
+    assert parser([{"match": "alpha"}, {"match": "beta"}]).prefilter is None
+    p = parser([{"match": "%{IP:src_ip} sshd", "prefilter": "sshd"}, {"match": "beta"}])
+    assert p.prefilter == ("sshd", "beta")
+    assert p("10.0.0.1 sshd").src_ip == "10.0.0.1"
+    assert parser([{"match": "%{IP:src_ip} x"}]).prefilter is None
+
+    # given for patterns that start with a literal too, it is used
+    p = parser([{"match": "sudo: %{USER:user}", "prefilter": "sudo:"}, {"match": "alpha"}])
+    assert p.prefilter == ("sudo:", "alpha")
+    assert p("h sshd[1]: session opened").action == ""
+    assert p("h sudo: bob").user == "bob"
+    assert PARSERS["auth"].prefilter == ("Failed ", "Accepted ", "Invalid user ", "sudo:")
+
+
+def test_auth_definition():
+    ev = parse_auth_log("Jan  1 10:15:32 h sudo:   alice : TTY=pts/0 ; PWD=/ ; USER=root ; COMMAND=/bin/ls -la")
+    assert (ev.action, ev.user, ev.extra) == ("sudo", "alice", {"command": "/bin/ls -la"})
+    ev = parse_auth_log("Jan  1 10:15:32 h sshd[1]: Invalid user oracle from 203.0.113.5 port 4")
+    assert (ev.action, ev.user, ev.src_ip) == ("invalid_user", "oracle", "203.0.113.5")
+
+
+def test_load_dir_caches_unchanged_files(tmp_path, capsys):
+    (tmp_path / "app.yaml").write_text(DEF)
+    (tmp_path / "bad.yaml").write_text("source: bad\npatterns:\n  - match: '%{NOPE:x}'\n")
+    first = load_dir(tmp_path, TIMESTAMPS)
+    assert "Skipping parser definition" in capsys.readouterr().out
+    assert [p.source for p in first] == ["app"]
+    assert first[0].globs == ["app.log"]
+    assert load_dir(tmp_path, TIMESTAMPS)[0] is first[0]
+
+    # a changed file gets a new parser, the unchanged patterns keep their regex
+    (tmp_path / "app.yaml").write_text(DEF.replace("[app.log]", "[app.log, app2.log]"))
+    os.utime(tmp_path / "app.yaml", ns=(1, 1))
+    second = load_dir(tmp_path, TIMESTAMPS)[0]
+    assert second is not first[0]
+    assert second.regex is first[0].regex
+    assert second("denied GET on /admin for bob").extra == {"verb": "GET", "path": "/admin"}
@@ -0,0 +1,73 @@
+# tests/test_metrics.py
+import json
+
+import yaml
+
+from siem.metrics import Histogram, MetricsRegistry, format_report, rule_rows, stage_rows
+from siem.rule_engine import RuleEngine
+
+
+def test_histogram_percentiles():
+    h = Histogram()
+    for _ in range(98):
+        h.observe(0.000_010)
+    h.observe(0.005)
+    h.observe(0.020)
+
+    assert h.count == 100
+    assert h.percentile(0.5) <= 0.000_016
+    assert 0.005 <= h.percentile(0.99) <= 0.008_2
+    assert h.snapshot()["max_ms"] == 20.0
+
+
+def test_registry_snapshot_and_dump(tmp_path):
+    registry = MetricsRegistry()
+    registry.counter("lines").inc(3)
+    registry.histogram("commit").observe(0.001)
+    registry.register("broken", lambda: 1 / 0)
+
+    path = tmp_path / "metrics.json"
+    registry.dump(str(path))
+    data = json.loads(path.read_text())
+    assert data["counters"] == {"lines": 3}
+    assert data["histograms"]["commit"]["count"] == 1
+    assert "error" in data["broken"]
+
+
+def test_rule_engine_counts_hits_and_samples(tmp_path):
+    for rule_id, match_type, pattern in (("LIT", "contains", "Failed"), ("RE", "regex", r"port \d+")):
+        (tmp_path / f"{rule_id}.yaml").write_text(yaml.safe_dump(
+            {"id": rule_id, "log_type": "auth", "match_type": match_type, "pattern": pattern}
+        ))
+    registry = MetricsRegistry()
+    engine = RuleEngine(rule_dir=tmp_path, metrics=registry, sample_every=2)
+    engine.load_rules()
+
+    for _ in range(10):
+        engine.match_rules({"log_type": "auth", "raw": "Failed password port 22"})
+    engine.load_rules()
+    engine.match_rules({"log_type": "auth", "raw": "Failed again"})
+
+    data = registry.snapshot()
+    assert data["rules"]["rules"]["LIT"]["hits"] == 11
+    assert data["rules"]["rules"]["RE"]["hits"] == 10
+    assert data["rules"]["rules"]["RE"]["eval"]["count"] == 5
+    assert data["rules"]["shared"]["[auth literals]"]["count"] == 5
+
+    names = [row[0] for row in rule_rows(data)]
+    assert set(names) == {"LIT", "RE", "[auth literals]"}
+    assert any("RE" in line for line in format_report(data))
+
+
+def test_stage_rows_include_commit():
+    data = {"pipeline": {
+        "writer": {
+            "items": 10, "busy_seconds": 0.5, "queue_depth": 1, "queue_size": 8,
+            "latency": {"p50_ms": 1.0, "p99_ms": 2.0},
+            "commit": {"count": 2, "mean_ms": 100.0, "p50_ms": 64.0, "p99_ms": 128.0},
+        },
+    }}
+    assert stage_rows(data) == [
+        ("writer", 10, 0.5, 1.0, 2.0, "1/8"),
+        ("writer commit", "-", 0.2, 64.0, 128.0, "-"),
+    ]
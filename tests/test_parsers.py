@@ -12,3 +12,111 @@ def test_failed_login_parsing():
     assert ev.action == "login_failed"
     assert ev.user == "admin"
     assert ev.src_ip == "192.168.1.10"
+
+
+def test_syslog_timestamp_is_taken_from_the_line(monkeypatch):
+    from datetime import timezone
+
+    import siem.parsers as parsers
+
+    monkeypatch.setattr(parsers, "SYSLOG_TZ", timezone.utc)
+    parsers._syslog_cache.clear()
+
+    ev = parse_auth_log("Jan  1 10:15:32 server1 sshd[1]: Accepted password for bob from 10.0.0.8 port 1 ssh2")
+    assert ev.timestamp.endswith("-01-01T10:15:32+00:00")
+    assert "Jan  1 10:15:32" in parsers._syslog_cache
+
+
+def test_clf_timestamp_is_converted_to_utc():
+    from siem.parsers import parse_web_log
+
+    ev = parse_web_log('127.0.0.1 - - [10/Oct/2000:13:55:36 -0700] "GET / HTTP/1.0" 200 2326')
+    assert ev.timestamp == "2000-10-10T20:55:36+00:00"
+
+
+def test_missing_timestamp_falls_back_to_now():
+    from siem.parsers import parse_event
+
+    ev = parse_event("other", "no timestamp here")
+    assert ev.timestamp.endswith("+00:00")
+
+
+def test_combined_log_format_fields():
+    from siem.parsers import event_dict, parse_web_log
+
+    ev = parse_web_log(
+        '203.0.113.9 - frank [10/Oct/2000:13:55:36 -0700] "POST /login?next=/ HTTP/1.1" 401 512 '
+        '"https://example.com/" "Mozilla/5.0 (X11; Linux x86_64)"'
+    )
+    assert (ev.action, ev.user, ev.src_ip) == ("web_request", "frank", "203.0.113.9")
+    assert ev.extra == {
+        "method": "POST",
+        "path": "/login?next=/",
+        "protocol": "HTTP/1.1",
+        "status": "401",
+        "bytes": "512",
+        "referrer": "https://example.com/",
+        "user_agent": "Mozilla/5.0 (X11; Linux x86_64)",
+    }
+    event = event_dict(ev)
+    assert event["status"] == "401" and event["log_type"] == "web"
+
+
+def test_clf_fallbacks():
+    from siem.parsers import parse_web_log
+
+    # escaped quotes need the regex, Common Log Format has no referrer/agent
+    ev = parse_web_log('10.0.0.1 - - [10/Oct/2000:13:55:36 -0700] "GET /a\\" HTTP/1.1" 404 - "-" "x \\"y\\""')
+    assert (ev.extra["path"], ev.extra["status"], ev.extra["bytes"]) == ('/a\\"', "404", "")
+    assert ev.extra["user_agent"] == 'x \\"y\\"'
+
+    ev = parse_web_log('10.0.0.1 - - [10/Oct/2000:13:55:36 -0700] "GET /a b HTTP/1.0" 200 10')
+    assert (ev.extra["path"], ev.extra["user_agent"]) == ("/a b", "")
+
+    ev = parse_web_log("not an access log from 192.0.2.4")
+    assert (ev.action, ev.src_ip, ev.extra) == ("web_event", "192.0.2.4", {})
+
+
+def test_source_registry(monkeypatch):
+    import siem.parsers as parsers
+    from siem.models import Event
+
+    monkeypatch.setattr(parsers, "PARSERS", dict(parsers.PARSERS))
+    monkeypatch.setattr(parsers, "SOURCE_GLOBS", dict(parsers.SOURCE_GLOBS))
+    parsers.register_source("nginx", ["nginx*.log"], lambda raw: Event(source="nginx", raw=raw, action="seen"))
+
+    assert parsers.source_for_filename("nginx-edge.log") == "nginx"
+    assert parsers.source_for_filename("nginx-edge.log.2") == "nginx"
+    assert parsers.source_for_filename("nginx-edge.log.2", rotated=False) is None
+    assert parsers.source_for_filename("access.log-20240101") == "web"
+    assert parsers.source_for_filename("kern.log") is None
+    assert parsers.parse_event("nginx", "x").action == "seen"
+
+
+def test_auth_is_parsed_without_its_yaml_definition(tmp_path):
+    import subprocess
+    import sys
+    from pathlib import Path
+
+    # A broken definition is skipped and the built in parser stays
+    from siem.parsers import load_parser_defs
+
+    (tmp_path / "auth.yaml").write_text("source: auth\npatterns: [{match: '(unclosed'}]\n")
+    assert load_parser_defs(tmp_path) == []
+    assert parse_auth_log("Jan  1 10:15:32 h sshd[1]: Accepted password for bob from 10.0.0.8 port 1 ssh2").user == "bob"
+    assert parse_auth_log("   ") is None
+    assert parse_auth_log("# comment") is None
+
+    # No definitions at all
+    code = (
+        "import siem.grok as grok\n"
+        "grok.load_dir = lambda *args: []\n"
+        "from siem.parsers import parse_auth_log, source_for_filename\n"
+        "assert source_for_filename('auth.log') == 'auth'\n"
+        "ev = parse_auth_log('Jan  1 10:15:32 h sshd[1]: Failed password for root from 203.0.113.5 port 22 ssh2')\n"
+        "assert (ev.action, ev.user, ev.src_ip) == ('login_failed', 'root', '203.0.113.5')\n"
+        "assert parse_auth_log('') is None\n"
+    )
+    repo = Path(__file__).resolve().parent.parent
+    result = subprocess.run([sys.executable, "-c", code], cwd=repo, capture_output=True, text=True)
+    assert result.returncode == 0, result.stderr
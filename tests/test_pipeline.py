@@ -0,0 +1,218 @@
+# tests/test_pipeline.py
+import time
+
+from siem.pipeline import Pipeline
+from siem.rule_engine import RuleEngine
+
+
+def setup(tmp_path, rule_dir, lines):
+    engine = RuleEngine(rule_dir=rule_dir)
+    engine.load_rules()
+
+    logs = tmp_path / "logs"
+    logs.mkdir()
+    (logs / "auth.log").write_text("".join(line + "\n" for line in lines))
+    return engine, logs
+
+
+def test_one_shot_run_stores_everything(tmp_path, rule_dir):
+    lines = [f"Jan  1 10:00:{i % 60:02d} h sshd[1]: Failed password for u{i} from 10.0.0.1 port 22" for i in range(1200)]
+    engine, logs = setup(tmp_path, rule_dir, lines)
+    seen = []
+
+    pipeline = Pipeline(
+        engine,
+        db_path=str(tmp_path / "siem.db"),
+        log_dir=logs,
+        batch_size=100,
+        queue_size=2,
+        on_alerts=seen.extend,
+    )
+    stats = pipeline.run()
+
+    assert stats["parser"]["items"] == 1200
+    assert stats["writer"]["items"] == 1200
+    assert len(seen) == 1200
+    assert all(s["queue_depth"] == 0 for s in stats.values())
+
+
+def test_follow_mode_picks_up_new_lines_and_stops(tmp_path, rule_dir):
+    engine, logs = setup(tmp_path, rule_dir, ["Jan  1 10:00:00 h sshd[1]: Failed password for a from 10.0.0.1"])
+    seen = []
+
+    pipeline = Pipeline(
+        engine,
+        db_path=str(tmp_path / "siem.db"),
+        log_dir=logs,
+        follow=True,
+        poll_interval=0.05,
+        on_alerts=seen.extend,
+    )
+    pipeline.start()
+    with (logs / "auth.log").open("a") as f:
+        f.write("Jan  1 10:00:01 h sshd[1]: Failed password for b from 10.0.0.1\n")
+
+    deadline = time.time() + 5
+    while len(seen) < 2 and time.time() < deadline:
+        time.sleep(0.05)
+    pipeline.stop()
+    pipeline.join(timeout=5)
+
+    assert [ev.raw.split()[-3] for ev, _ in seen] == ["a", "b"]
+    assert not pipeline.running()
+
+
+def test_one_shot_reads_archives_once(tmp_path, rule_dir):
+    import gzip
+
+    engine, logs = setup(tmp_path, rule_dir, ["Jan  1 10:00:02 h sshd[1]: Failed password for live from 10.0.0.1 port 22"])
+    (logs / "auth.log.1.gz").write_bytes(gzip.compress(
+        b"Jan  1 10:00:01 h sshd[1]: Failed password for old from 10.0.0.1 port 22\n"
+    ))
+
+    def run():
+        return Pipeline(engine, db_path=str(tmp_path / "siem.db"), log_dir=logs, archives=True).run()
+
+    assert run()["writer"]["items"] == 2
+    assert run()["writer"]["items"] == 1
+
+
+def test_failed_stage_stops_the_stages_behind_a_full_queue(tmp_path, monkeypatch, rule_dir):
+    import siem.pipeline as pipeline_module
+
+    lines = [f"Jan  1 10:00:00 h sshd[1]: Failed password for u{i} from 10.0.0.1" for i in range(20)]
+    engine, logs = setup(tmp_path, rule_dir, lines)
+
+    # The matcher is slow, so the parser fills its queue before failing
+    match_event = engine.match_event
+    monkeypatch.setattr(engine, "match_event", lambda ev: time.sleep(0.05) or match_event(ev))
+    calls = []
+
+    def parse_event(source, raw):
+        calls.append(raw)
+        if len(calls) == 5:
+            raise ValueError("parser broke")
+        return pipeline_module.parse_event.__wrapped__(source, raw)
+
+    parse_event.__wrapped__ = pipeline_module.parse_event
+    monkeypatch.setattr(pipeline_module, "parse_event", parse_event)
+
+    pipeline = Pipeline(engine, db_path=str(tmp_path / "siem.db"), log_dir=logs, batch_size=1, queue_size=2)
+    pipeline.start()
+    pipeline.join(timeout=5)
+    assert not pipeline.running()
+    assert str(pipeline.error) == "parser broke"
+
+
+def test_follow_checkpoints_advance_only_with_committed_lines(tmp_path, monkeypatch, rule_dir):
+    from siem.storage import SQLiteStorage
+
+    engine, logs = setup(tmp_path, rule_dir, ["Jan  1 10:00:00 h sshd[1]: Failed password for a from 10.0.0.1"])
+    db = str(tmp_path / "siem.db")
+
+    def follow_once():
+        pipeline = Pipeline(engine, db_path=db, log_dir=logs, follow=True, poll_interval=0.05)
+        pipeline.start()
+        deadline = time.time() + 5
+        while pipeline.running() and pipeline.stats()["writer"]["batches"] < 1 and time.time() < deadline:
+            time.sleep(0.02)
+        time.sleep(0.1)
+        pipeline.stop()
+        pipeline.join(timeout=5)
+        return pipeline
+
+    # The writer cannot commit: the line was read, but no checkpoint says so
+    write_batch = SQLiteStorage.write_batch
+
+    def failing(self, *args, **kwargs):
+        raise OSError("disk full")
+
+    monkeypatch.setattr(SQLiteStorage, "write_batch", failing)
+    assert isinstance(follow_once().error, OSError)
+
+    storage = SQLiteStorage(db_path=db)
+    storage.connect()
+    storage.init_db()
+    assert storage.get_checkpoint(str(logs / "auth.log")) is None
+
+    # Next run reads it again, and commits it with its checkpoint
+    monkeypatch.setattr(SQLiteStorage, "write_batch", write_batch)
+    assert follow_once().stats()["writer"]["items"] == 1
+    assert storage.get_checkpoint(str(logs / "auth.log"))["offset"] == (logs / "auth.log").stat().st_size
+    assert len(storage.fetch_events()) == 1
+    storage.close()
+
+
+def test_unreadable_archive_is_skipped_and_counted(tmp_path, rule_dir):
+    import gzip
+
+    engine, logs = setup(tmp_path, rule_dir, ["Jan  1 10:00:02 h sshd[1]: Failed password for live from 10.0.0.1 port 22"])
+    (logs / "auth.log.1.gz").write_bytes(gzip.compress(
+        b"Jan  1 10:00:01 h sshd[1]: Failed password for old from 10.0.0.1 port 22\n"
+    ))
+    (logs / "auth.log.2.gz").write_bytes(b"not gzip at all\n")
+
+    stats = Pipeline(engine, db_path=str(tmp_path / "siem.db"), log_dir=logs, archives=True).run()
+    assert stats["writer"]["items"] == 2
+    assert stats["reader"]["errors"] == 1
+
+
+def test_follow_records_the_rotated_file_it_drained(tmp_path, rule_dir):
+    engine, logs = setup(tmp_path, rule_dir, ["Jan  1 10:00:00 h sshd[1]: Failed password for a from 10.0.0.1"])
+    db = str(tmp_path / "siem.db")
+    seen = []
+
+    pipeline = Pipeline(engine, db_path=db, log_dir=logs, follow=True, poll_interval=0.05, on_alerts=seen.extend)
+    pipeline.start()
+    deadline = time.time() + 5
+    while len(seen) < 1 and time.time() < deadline:
+        time.sleep(0.05)
+    with (logs / "auth.log").open("a") as f:
+        f.write("Jan  1 10:00:01 h sshd[1]: Failed password for b from 10.0.0.1\n")
+    (logs / "auth.log").rename(logs / "auth.log.1")
+    (logs / "auth.log").write_text("Jan  1 10:00:02 h sshd[1]: Failed password for c from 10.0.0.1\n")
+    while len(seen) < 3 and time.time() < deadline:
+        time.sleep(0.05)
+    pipeline.stop()
+    pipeline.join(timeout=5)
+    assert [ev.raw.split()[-3] for ev, _ in seen] == ["a", "b", "c"]
+
+    # Only the live log is read again, auth.log.1 was recorded by the tailer
+    stats = Pipeline(engine, db_path=db, log_dir=logs, archives=True).run()
+    assert stats["writer"]["items"] == 1
+
+
+def test_idle_writer_still_applies_retention_on_a_new_day(tmp_path, monkeypatch, rule_dir):
+    import siem.pipeline as pipeline_module
+    from siem.storage import SQLiteStorage
+
+    engine, logs = setup(tmp_path, rule_dir, [])
+    days = iter(["20240101", "20240102"])
+    monkeypatch.setattr(pipeline_module, "_utc_day", lambda: next(days, "20240102"))
+    monkeypatch.setattr(pipeline_module, "RETENTION_CHECK_SECONDS", 0.05)
+    applied = []
+    monkeypatch.setattr(SQLiteStorage, "apply_retention", lambda self, days: applied.append(days))
+
+    pipeline = Pipeline(
+        engine, db_path=str(tmp_path / "siem.db"), log_dir=logs,
+        follow=True, poll_interval=0.05, retention_days=7,
+    )
+    pipeline.start()
+    deadline = time.time() + 5
+    while len(applied) < 2 and time.time() < deadline:
+        time.sleep(0.05)
+    pipeline.stop()
+    pipeline.join(timeout=5)
+    assert applied == [7, 7]
+
+
+def test_copies_of_one_archive_are_read_once(tmp_path, rule_dir):
+    import gzip
+
+    engine, logs = setup(tmp_path, rule_dir, ["Jan  1 10:00:02 h sshd[1]: Failed password for live from 10.0.0.1 port 22"])
+    old = b"Jan  1 10:00:01 h sshd[1]: Failed password for old from 10.0.0.1 port 22\n"
+    (logs / "auth.log.1").write_bytes(old)
+    (logs / "auth.log.2.gz").write_bytes(gzip.compress(old))
+
+    stats = Pipeline(engine, db_path=str(tmp_path / "siem.db"), log_dir=logs, archives=True).run()
+    assert stats["writer"]["items"] == 2
@@ -0,0 +1,65 @@
+# tests/test_predicates.py
+import pickle
+
+import pytest
+
+from siem.predicates import All, AnyOf, Compare, Equals, OneOf, compile_fields
+
+EVENT = {"action": "login_failed", "user": "root", "src_ip": "10.0.0.5", "status": "503"}
+
+
+def test_field_conditions():
+    assert compile_fields({"action": "login_failed"}).test(EVENT)
+    assert compile_fields({"user": ["admin", "root"]}).test(EVENT)
+    assert compile_fields({"src_ip": {"prefix": ["192.168.", "10."]}}).test(EVENT)
+    assert compile_fields({"status": {"ge": 500, "lt": 600}}).test(EVENT)
+    assert not compile_fields({"status": {"gt": 503}}).test(EVENT)
+    assert not compile_fields({"user": {"gt": 1}}).test(EVENT)
+    assert not compile_fields({"missing": "x"}).test(EVENT)
+
+
+def test_composition():
+    spec = {
+        "action": "login_failed",
+        "not": {"src_ip": {"prefix": "10."}},
+        "any": [{"user": "root"}, {"user": "admin"}],
+    }
+    assert not compile_fields(spec).test(EVENT)
+    assert compile_fields(spec).test(dict(EVENT, src_ip="203.0.113.9"))
+    assert compile_fields({"all": [{"user": "root"}, {"any": [{"status": "1"}, {"status": "503"}]}]}).test(EVENT)
+
+
+def test_all_orders_cheap_selective_children_first():
+    predicate = compile_fields({"status": {"ge": 500}, "src_ip": {"prefix": "10."}, "action": "login_failed"})
+    assert isinstance(predicate, All)
+    assert isinstance(predicate.children[0], Equals)
+    assert isinstance(predicate.children[-1], Compare)
+
+
+def test_index_keys():
+    assert compile_fields({"user": "root", "status": {"ge": 500}}).index_keys() == [("user", frozenset({"root"}))]
+    both = compile_fields({"any": [{"user": "root"}, {"user": ["admin", "pi"]}]})
+    assert isinstance(both, AnyOf)
+    assert both.index_keys() == [("user", frozenset({"root", "admin", "pi"}))]
+    assert compile_fields({"any": [{"user": "root"}, {"action": "x"}]}).index_keys() == []
+    assert compile_fields({"not": {"user": "root"}}).index_keys() == []
+
+
+def test_predicates_pickle():
+    predicate = pickle.loads(pickle.dumps(compile_fields({"user": {"in": ["root"]}, "not": {"status": {"lt": 1}}})))
+    assert predicate.test(EVENT)
+    assert isinstance(pickle.loads(pickle.dumps(OneOf("user", ["a"]))), OneOf)
+
+
+@pytest.mark.parametrize("spec", [
+    {},
+    [],
+    {"user": {}},
+    {"user": {"like": "r%"}},
+    {"status": {"gt": "many"}},
+    {"user": {"in": "root"}},
+    {"any": []},
+])
+def test_bad_specs_raise(spec):
+    with pytest.raises(ValueError):
+        compile_fields(spec)
@@ -1 +1,205 @@
-# rules engine tests
+# tests/test_rules_engine.py
+import yaml
+
+from siem.rule_engine import RuleEngine
+
+
+def make_engine(tmp_path, rules):
+    for i, rule in enumerate(rules):
+        (tmp_path / f"rule_{i:03d}.yaml").write_text(yaml.safe_dump(rule))
+    engine = RuleEngine(rule_dir=tmp_path)
+    engine.load_rules()
+    return engine
+
+
+def rule(rule_id, pattern, match_type="contains", log_type="auth"):
+    return {
+        "id": rule_id,
+        "description": rule_id,
+        "log_type": log_type,
+        "match_type": match_type,
+        "pattern": pattern,
+        "severity": "high",
+    }
+
+
+def ids(engine, raw, log_type="auth"):
+    return sorted(a["rule_id"] for a in engine.match_event({"log_type": log_type, "raw": raw}))
+
+
+def test_overlapping_contains_patterns_all_fire(tmp_path):
+    engine = make_engine(tmp_path, [
+        rule("A", "Failed password"),
+        rule("B", "password"),
+        rule("C", "Failed"),
+        rule("D", "root"),
+        rule("E", "Accepted"),
+    ])
+    assert ids(engine, "Failed password for root from 1.2.3.4") == ["A", "B", "C", "D"]
+
+
+def test_rules_are_bucketed_by_log_type(tmp_path):
+    engine = make_engine(tmp_path, [
+        rule("AUTH", "nmap"),
+        rule("WEB", "nmap", log_type="web"),
+    ])
+    assert ids(engine, "GET /?ua=nmap", log_type="web") == ["WEB"]
+    assert ids(engine, "nothing here", log_type="other") == []
+
+
+def test_equals_and_regex(tmp_path):
+    engine = make_engine(tmp_path, [
+        rule("EQ", "exact line", match_type="equals"),
+        rule("RX", r"port \d{5}", match_type="regex"),
+        rule("BAD", "([", match_type="regex"),
+    ])
+    assert ids(engine, "  exact line ") == ["EQ"]
+    assert ids(engine, "from 1.2.3.4 port 54321 ssh2") == ["RX"]
+
+
+def test_many_rules_match_only_their_literal(tmp_path):
+    engine = make_engine(tmp_path, [rule(f"R{i}", f"token{i}x") for i in range(300)])
+    assert ids(engine, "a line with token42x and token7x in it") == ["R42", "R7"]
+
+
+def test_threshold_rule_fires_once_per_burst(tmp_path):
+    brute = rule("BRUTE", "Failed password")
+    brute["threshold"] = {"count": 3, "window": 60, "group_by": ["src_ip"]}
+    engine = make_engine(tmp_path, [brute])
+
+    event = {
+        "log_type": "auth",
+        "raw": "Failed password for root",
+        "src_ip": "10.0.0.5",
+        "timestamp": "2024-01-01T10:00:00",
+    }
+    fired = [engine.match_event(dict(event)) for _ in range(4)]
+    assert [len(a) for a in fired] == [0, 0, 1, 0]
+    assert fired[2][0]["threshold"]["group"] == {"src_ip": "10.0.0.5"}
+
+
+def test_reload_only_parses_changed_files(tmp_path, capsys):
+    engine = make_engine(tmp_path, [rule("A", "alpha"), rule("B", "beta")])
+    assert engine.load_rules() is False
+
+    (tmp_path / "rule_001.yaml").write_text(yaml.safe_dump(rule("B", "gamma, longer now")))
+    capsys.readouterr()
+    assert engine.load_rules() is True
+    assert "(1 file(s) parsed)" in capsys.readouterr().out
+    assert ids(engine, "gamma, longer now") == ["B"]
+    assert ids(engine, "beta") == []
+
+
+def test_cold_start_uses_rule_pack(tmp_path, capsys):
+    make_engine(tmp_path, [rule("A", "alpha"), rule("RX", r"port \d+", match_type="regex")])
+    capsys.readouterr()
+
+    engine = RuleEngine(rule_dir=tmp_path)
+    engine.load_rules()
+    assert "from rule pack" in capsys.readouterr().out
+    assert ids(engine, "alpha from port 22") == ["A", "RX"]
+
+
+def test_rule_pack_is_data_only(tmp_path, capsys):
+    import json
+    import pickle
+
+    make_engine(tmp_path, [rule("A", "alpha")])
+    pack = json.loads((tmp_path / ".rulepack").read_text())
+    assert pack["parsed"]["rule_000.yaml"]["id"] == "A"
+
+    # a pickle, say one planted in the rules directory, is never loaded
+    (tmp_path / ".rulepack").write_bytes(pickle.dumps(pack))
+    capsys.readouterr()
+    engine = RuleEngine(rule_dir=tmp_path)
+    engine.load_rules()
+    out = capsys.readouterr().out
+    assert "Ignoring unreadable rule pack" in out
+    assert "(1 file(s) parsed)" in out
+    assert ids(engine, "alpha") == ["A"]
+
+
+def test_reload_keeps_threshold_state_of_running_matches(tmp_path):
+    brute = rule("BRUTE", "Failed password")
+    brute["threshold"] = {"count": 2, "window": 60}
+    engine = make_engine(tmp_path, [brute])
+    event = {"log_type": "auth", "raw": "Failed password", "timestamp": "2024-01-01T10:00:00"}
+    engine.match_event(dict(event))
+    assert engine.ruleset.hit_counts == [1]
+
+    (tmp_path / "rule_001.yaml").write_text(yaml.safe_dump(rule("NEW", "other")))
+    engine.load_rules()
+    assert engine.rule_hits["BRUTE"] == 1
+    assert sorted(engine.by_id) == ["BRUTE", "NEW"]
+    # the open window survived, the second failure completes it
+    assert len(engine.match_event(dict(event))) == 1
+
+
+def fields_rule(rule_id, fields, log_type="auth"):
+    return {"id": rule_id, "log_type": log_type, "match_type": "fields", "fields": fields, "severity": "high"}
+
+
+def test_fields_rules_match_parsed_fields(tmp_path, capsys):
+    engine = make_engine(tmp_path, [
+        rule("TEXT", "Failed password"),
+        fields_rule("ROOT_FAIL", {"action": "login_failed", "user": ["root", "admin"]}),
+        fields_rule("EXTERNAL", {"action": "login_failed", "not": {"src_ip": {"prefix": "10."}}}),
+        fields_rule("ANY_USER", {"any": [{"user": "root"}, {"src_ip": "1.2.3.4"}]}),
+        fields_rule("BROKEN", {"user": {"like": "r%"}}),
+    ])
+    assert "Skipping rule file with invalid fields" in capsys.readouterr().out
+    assert "BROKEN" not in engine.by_id
+
+    event = {
+        "log_type": "auth",
+        "raw": "Failed password for root from 10.0.0.5",
+        "action": "login_failed",
+        "user": "root",
+        "src_ip": "10.0.0.5",
+    }
+    assert sorted(a["rule_id"] for a in engine.match_event(event)) == ["ANY_USER", "ROOT_FAIL", "TEXT"]
+    event.update(user="bob", src_ip="1.2.3.4")
+    assert sorted(a["rule_id"] for a in engine.match_event(event)) == ["ANY_USER", "EXTERNAL", "TEXT"]
+    # raw only events never satisfy field rules
+    assert ids(engine, "Failed password for root") == ["TEXT"]
+
+    # predicates are compiled again from the packed rules
+    engine = RuleEngine(rule_dir=tmp_path)
+    engine.load_rules()
+    assert "from rule pack" in capsys.readouterr().out
+    assert sorted(a["rule_id"] for a in engine.match_event(event)) == ["ANY_USER", "EXTERNAL", "TEXT"]
+
+
+def test_fields_rules_are_indexed_on_their_rarest_value(tmp_path):
+    engine = make_engine(tmp_path, [
+        fields_rule(f"U{i}", {"action": "login_failed", "user": f"user{i}"}) for i in range(20)
+    ] + [fields_rule("SCAN", {"src_ip": {"prefix": "10."}})])
+    bucket = engine.index["auth"]
+    assert list(bucket.field_index) == ["user"]
+    assert [pos for _, pos in bucket.field_rules] == [20]
+
+
+def test_watchlist_rules(tmp_path, capsys):
+    rules, lists = tmp_path / "rules", tmp_path / "watchlists"
+    rules.mkdir()
+    lists.mkdir()
+    (lists / "tor.txt").write_text("198.51.100.0/24\n")
+    make_engine(rules, [
+        {"id": "TOR", "log_type": "auth", "match_type": "watchlist", "watchlist": "tor", "severity": "high"},
+        {"id": "TOR_USER", "log_type": "auth", "match_type": "watchlist", "watchlist": "tor", "field": "user",
+         "severity": "low"},
+        {"id": "NO_NAME", "log_type": "auth", "match_type": "watchlist", "severity": "low"},
+    ])
+    engine = RuleEngine(rule_dir=rules)
+    engine.load_rules()
+    assert "Loaded watchlist tor: 1 ranges" in capsys.readouterr().out
+    assert sorted(engine.by_id) == ["TOR", "TOR_USER"]
+
+    event = {"log_type": "auth", "raw": "x", "src_ip": "198.51.100.9", "user": "root"}
+    assert [a["rule_id"] for a in engine.match_event(event)] == ["TOR"]
+    assert engine.match_event(dict(event, src_ip="10.0.0.1")) == []
+
+    # feed changes are picked up by the next load_rules even if no rule changed
+    (lists / "tor.txt").write_text("198.51.100.0/24\n10.0.0.0/8\n")
+    assert engine.load_rules() is False
+    assert [a["rule_id"] for a in engine.match_event(dict(event, src_ip="10.0.0.1"))] == ["TOR"]
@@ -0,0 +1,247 @@
+# tests/test_storage.py
+from siem.models import Alert, Event
+from siem.storage import BatchWriter, SQLiteStorage
+
+
+def count(storage, table):
+    if table == "events":
+        return storage.count_events()
+    return storage.conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+
+
+def test_write_batch_uses_wal(storage):
+    mode = storage.conn.execute("PRAGMA journal_mode").fetchone()[0]
+    assert mode == "wal"
+
+    events = [Event(timestamp="t", source="auth", raw=f"line {i}") for i in range(50)]
+    alerts = [Alert(timestamp="t", rule_name="R", severity="high")]
+    storage.write_batch(events, alerts)
+
+    assert count(storage, "events") == 50
+    assert count(storage, "alerts") == 1
+
+
+def test_batch_writer_flushes_by_row_count(storage):
+    writer = BatchWriter(storage, max_rows=10, max_delay=3600)
+
+    for i in range(25):
+        writer.add_event(Event(timestamp="t", source="auth", raw=str(i)))
+    assert count(storage, "events") == 20
+    assert writer.pending() == 5
+
+    writer.close()
+    assert count(storage, "events") == 25
+
+
+def test_batch_writer_flushes_by_age(storage):
+    writer = BatchWriter(storage, max_rows=1000, max_delay=0)
+
+    writer.add_alert(Alert(timestamp="t", rule_name="R"))
+    assert count(storage, "alerts") == 1
+
+
+def test_legacy_database_is_migrated(tmp_path):
+    import sqlite3
+
+    path = str(tmp_path / "old.db")
+    conn = sqlite3.connect(path)
+    conn.execute(
+        "CREATE TABLE alerts (id INTEGER PRIMARY KEY AUTOINCREMENT, timestamp TEXT,"
+        " rule_name TEXT, severity TEXT, src_ip TEXT, user TEXT, message TEXT)"
+    )
+    conn.execute("INSERT INTO alerts (severity, message) VALUES ('High ', 'old row')")
+    conn.commit()
+    conn.close()
+
+    storage = SQLiteStorage(db_path=path)
+    storage.connect()
+    storage.init_db()
+
+    assert storage.schema_version() > 0
+    assert [a["message"] for a in storage.fetch_alerts(severity="high")] == ["old row"]
+
+
+def test_severity_filter_uses_index(storage):
+    plan = storage.conn.execute(
+        "EXPLAIN QUERY PLAN SELECT id FROM alerts WHERE severity_norm = ? AND id < ? ORDER BY id DESC LIMIT 10",
+        ("high", 100),
+    ).fetchall()
+    assert "idx_alerts_severity_id" in " ".join(row[-1] for row in plan)
+
+
+def test_keyset_pagination(storage):
+    storage.write_batch(
+        alerts=[
+            Alert(timestamp="t", rule_name=f"R{i}", severity="high" if i % 2 else "low")
+            for i in range(10)
+        ]
+    )
+
+    page1 = storage.fetch_alerts(severity="HIGH", limit=3)
+    assert [a["rule_name"] for a in page1] == ["R9", "R7", "R5"]
+
+    page2 = storage.fetch_alerts(severity="high", limit=3, before_id=page1[-1]["id"])
+    assert [a["rule_name"] for a in page2] == ["R3", "R1"]
+
+    back = storage.fetch_alerts(severity="high", limit=2, after_id=page2[0]["id"])
+    assert [a["rule_name"] for a in back] == ["R7", "R5"]
+
+    assert [a["rule_name"] for a in storage.fetch_alerts(rule_name="R4")] == ["R4"]
+
+
+def test_search_events(storage):
+    storage.insert_event(Event(timestamp="2024-01-01T00:00:00", source="auth", raw="Failed password for root from 10.0.0.5"))
+    storage.write_batch(
+        [
+            Event(timestamp="2024-01-02T00:00:00", source="auth", raw="Accepted password for bob from 10.0.0.8", user="bob"),
+            Event(timestamp="2024-01-03T00:00:00", source="auth", raw="Failed password for bob from 10.0.0.5", user="bob"),
+        ]
+    )
+
+    def raws(**kw):
+        return [e["raw"] for e in storage.search_events(**kw)]
+
+    assert raws(query="10.0.0.5") == [
+        "Failed password for bob from 10.0.0.5",
+        "Failed password for root from 10.0.0.5",
+    ]
+    assert raws(query="bob password") == [
+        "Failed password for bob from 10.0.0.5",
+        "Accepted password for bob from 10.0.0.8",
+    ]
+    assert raws(query="10.0.0.5", time_range=(None, "2024-01-02")) == [
+        "Failed password for root from 10.0.0.5"
+    ]
+    assert raws(query='"unbalanced') == []
+
+
+def test_events_are_partitioned_by_day(storage):
+    storage.write_batch(
+        [
+            Event(timestamp=f"2024-01-0{day}T00:00:0{i}", source="auth", raw=f"d{day} e{i}")
+            for day in (3, 1, 2)
+            for i in range(3)
+        ]
+    )
+    assert storage.list_partitions() == ["20240101", "20240102", "20240103"]
+
+    # Ids follow the day, so paging runs across partitions newest first
+    raws = []
+    page = storage.fetch_events(limit=4)
+    while page:
+        raws.extend(e["raw"] for e in page)
+        page = storage.fetch_events(limit=4, before_id=page[-1]["id"])
+    assert raws == [f"d{day} e{i}" for day in (3, 2, 1) for i in (2, 1, 0)]
+
+    newer = storage.fetch_events(limit=4, after_id=storage.fetch_events(limit=9)[-1]["id"])
+    assert [e["raw"] for e in newer] == ["d2 e1", "d2 e0", "d1 e2", "d1 e1"]
+
+    day2 = storage.fetch_events(time_range=("2024-01-02", "2024-01-03"))
+    assert [e["raw"] for e in day2] == ["d2 e2", "d2 e1", "d2 e0"]
+
+
+def test_retention_drops_old_partitions(storage):
+    from datetime import datetime, timezone
+
+    storage.write_batch(
+        [Event(timestamp=f"2024-01-{d:02d}T12:00:00", source="auth", raw=f"day {d}") for d in range(1, 11)],
+        [Alert(timestamp="2024-01-02T00:00:00", rule_name="old"), Alert(timestamp="2024-01-09T00:00:00", rule_name="new")],
+    )
+
+    result = storage.apply_retention(keep_days=3, now=datetime(2024, 1, 10, tzinfo=timezone.utc))
+    assert result == {"partitions": 7, "alerts": 1}
+    assert storage.list_partitions() == ["20240108", "20240109", "20240110"]
+    assert [a["rule_name"] for a in storage.fetch_alerts()] == ["new"]
+    assert [e["raw"] for e in storage.search_events("day")] == ["day 10", "day 9", "day 8"]
+
+
+def test_legacy_events_move_into_partitions(tmp_path):
+    import sqlite3
+
+    path = str(tmp_path / "old.db")
+    conn = sqlite3.connect(path)
+    conn.execute(
+        "CREATE TABLE events (id INTEGER PRIMARY KEY AUTOINCREMENT, timestamp TEXT, source TEXT,"
+        " raw TEXT, action TEXT, user TEXT, src_ip TEXT)"
+    )
+    conn.executemany(
+        "INSERT INTO events (timestamp, source, raw) VALUES (?, 'auth', ?)",
+        [("2024-01-02T00:00:00", "second"), ("2024-01-01T00:00:00", "first")],
+    )
+    conn.commit()
+    conn.close()
+
+    storage = SQLiteStorage(db_path=path)
+    storage.connect()
+    storage.init_db()
+
+    assert storage.list_partitions() == ["20240101", "20240102"]
+    assert [e["raw"] for e in storage.search_events("first")] == ["first"]
+    assert [e["raw"] for e in storage.fetch_events()] == ["second", "first"]
+
+
+def test_events_are_stored_as_templates(storage):
+    lines = [f"Failed password for u{i} from 10.0.0.{i} port {1000 + i} ssh2" for i in range(5)]
+    lines += ["odd\x1fline 1", "Accepted password for bob from 10.0.0.9 port 22 ssh2"]
+    storage.write_rows([("2024-01-01T00:00:00", "auth", raw, "", "", "") for raw in lines])
+
+    stored = storage.conn.execute("SELECT raw, template_id FROM events_p20240101 ORDER BY id").fetchall()
+    assert stored[0][0] is None and stored[0][1] is not None
+    assert stored[5][0] == "odd\x1fline 1"
+
+    assert [e["raw"] for e in reversed(storage.fetch_events())] == lines
+    assert [e["raw"] for e in storage.search_events("u3")] == [lines[3]]
+
+    top = storage.template_counts()[0]
+    assert top["count"] == 5
+    assert top["template"] == "Failed password for <*> from <*> port <*> <*>"
+
+
+def test_rolled_back_template_is_not_rendered_later(storage):
+    import sqlite3
+
+    import pytest
+
+    rolled_back = "Failed password for root from 10.0.0.1 port 22 ssh2"
+    with pytest.raises(sqlite3.Error):
+        # a malformed group row fails the transaction after the template was saved
+        storage.write_rows([("2024-01-01T00:00:00", "auth", rolled_back, "", "", "")], group_rows=[("bad",)])
+    assert count(storage, "templates") == 0
+
+    # another writer gets the rolled back template id for its own template
+    other = SQLiteStorage(db_path=storage.db_path)
+    other.connect()
+    other.init_db()
+    line = "Connection closed by 10.0.0.2 port 4242"
+    other.write_rows([("2024-01-01T00:00:00", "auth", line, "", "", "")])
+    assert [e["raw"] for e in storage.fetch_events()] == [line]
+
+
+def test_batch_writer_keeps_alert_groups_of_a_failed_flush(storage):
+    import sqlite3
+
+    import pytest
+
+    from siem.alerts import AlertAggregator
+
+    writer = BatchWriter(storage, max_rows=1000, max_delay=3600, aggregator=AlertAggregator(window=300))
+    ev = Event(timestamp="2024-01-01T10:00:00+00:00", source="auth", raw="Failed password", src_ip="1.2.3.4")
+    alert = {"rule_id": "FAILED", "severity": "high"}
+    writer.add_event(ev)
+    writer.add_hit(ev, alert)
+    writer.add_hit(ev, alert)
+
+    write_batch = storage.write_batch
+
+    def locked(*args, **kwargs):
+        raise sqlite3.OperationalError("database is locked")
+
+    storage.write_batch = locked
+    with pytest.raises(sqlite3.OperationalError):
+        writer.flush()
+    storage.write_batch = write_batch
+
+    writer.add_hit(ev, alert)
+    writer.close()
+    assert count(storage, "events") == 1
+    assert [a["count"] for a in storage.fetch_alerts()] == [3]
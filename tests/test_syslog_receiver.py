@@ -0,0 +1,151 @@
+# tests/test_syslog_receiver.py
+import socket
+import threading
+import time
+
+from siem.parsers import parse_event
+from siem.syslog_receiver import SyslogReceiver, parse_syslog, split_frames
+
+FAILED = "Jan  1 10:00:00 web01 sshd[12]: Failed password for root from 203.0.113.5 port 22 ssh2"
+
+
+def test_rfc3164_and_5424_become_log_file_lines():
+    assert parse_syslog(f"<38>{FAILED}") == ("auth", FAILED)
+    # no host, as local senders write it
+    assert parse_syslog("<38>Jan  1 10:00:00 sshd[12]: error: x", "10.0.0.9") == (
+        "auth", "Jan  1 10:00:00 10.0.0.9 sshd[12]: error: x"
+    )
+
+    source, raw = parse_syslog(
+        '<86>1 2024-01-01T10:00:00.5Z bastion sshd 12 - [meta a="x\\]y"] '
+        "Failed password for root from 203.0.113.5 port 22 ssh2"
+    )
+    assert source == "auth"
+    assert raw.endswith(" bastion sshd[12]: Failed password for root from 203.0.113.5 port 22 ssh2")
+    ev = parse_event(source, raw)
+    assert (ev.action, ev.user, ev.src_ip) == ("login_failed", "root", "203.0.113.5")
+
+    web = '10.0.0.1 - - [01/Jan/2024:10:00:00 +0000] "GET / HTTP/1.1" 200 5'
+    assert parse_syslog(f"<190>1 2024-01-01T10:00:00Z w1 nginx - - - {web}") == ("web", web)
+    assert parse_syslog(f"<190>Jan  1 10:00:00 w1 nginx: {web}") == ("web", web)
+    assert parse_syslog("<13>\n") is None
+
+
+def test_split_frames_handles_both_framings_across_reads():
+    stream = b"5 <1>ab<2>cd\n9 <3>efghij<4>kl\n"
+    buffer = bytearray()
+    frames = []
+    for i in range(len(stream)):
+        buffer += stream[i:i + 1]
+        more, error = split_frames(buffer)
+        assert error is None
+        frames += more
+    assert frames == [b"<1>ab", b"<2>cd", b"<3>efghij", b"<4>kl"]
+    assert buffer == bytearray()
+
+
+def test_frames_before_an_oversized_count_are_kept():
+    buffer = bytearray(b"5 <1>ab<2>cd\n99999999 xx")
+    frames, error = split_frames(buffer)
+    assert frames == [b"<1>ab", b"<2>cd"]
+    assert error == "frame of 99999999 bytes"
+    assert buffer == bytearray(b"99999999 xx")
+
+
+def start(receiver):
+    stop = threading.Event()
+    thread = threading.Thread(target=receiver.run, args=(stop,), daemon=True)
+    thread.start()
+    assert receiver.ready.wait(5)
+    return stop, thread
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.time() + timeout
+    while not condition() and time.time() < deadline:
+        time.sleep(0.02)
+    return condition()
+
+
+def test_receiver_batches_udp_and_tcp(tmp_path):
+    batches = []
+    receiver = SyslogReceiver(lambda b: batches.append(b) or True, port=0, batch_size=3, flush_interval=0.02, metrics=None)
+    stop, thread = start(receiver)
+
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+        sock.sendto(f"<38>{FAILED}".encode(), receiver.addresses["udp"])
+    with socket.create_connection(receiver.addresses["tcp"]) as sock:
+        sock.sendall(b"".join(b"%d %s" % (len(m), m) for m in [f"<38>{FAILED}".encode()] * 4) + b"<38>" + FAILED.encode())
+
+    assert wait_for(lambda: sum(map(len, batches)) == 6)
+    stop.set()
+    thread.join(5)
+    assert all(line == ("auth", FAILED) for batch in batches for line in batch)
+    assert receiver.stats["received"] == 6
+    assert receiver.stats["connections"] == 1
+
+
+def test_oversized_frame_closes_the_connection_after_the_good_ones(tmp_path):
+    batches = []
+    receiver = SyslogReceiver(lambda b: batches.append(b) or True, port=0, udp=False, batch_size=1, flush_interval=0.02, metrics=None)
+    stop, thread = start(receiver)
+
+    message = f"<38>{FAILED}".encode()
+    with socket.create_connection(receiver.addresses["tcp"]) as sock:
+        sock.sendall(b"%d %s99999999 xx" % (len(message), message))
+        assert sock.recv(1) == b""  # closed by the receiver
+
+    assert wait_for(lambda: receiver.stats["malformed"] == 1)
+    stop.set()
+    thread.join(5)
+    assert [line for batch in batches for line in batch] == [("auth", FAILED)]
+    assert receiver.stats["received"] == 1
+
+
+def test_udp_is_dropped_and_counted_when_the_sink_is_full():
+    receiver = SyslogReceiver(lambda b: False, port=0, tcp=False, batch_size=2, max_pending=4, drain_timeout=0.2, metrics=None)
+    stop, thread = start(receiver)
+
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+        for _ in range(10):
+            sock.sendto(f"<38>{FAILED}".encode(), receiver.addresses["udp"])
+
+    assert wait_for(lambda: receiver.stats["received"] + receiver.stats["dropped"] == 10)
+    assert receiver.stats["received"] == 4
+    stop.set()
+    thread.join(10)
+    # what never got handed over counts as dropped too
+    assert receiver.stats["dropped"] == 10
+
+
+def test_pipeline_ingests_from_the_receiver(tmp_path, rule_dir):
+    from siem.pipeline import Pipeline
+    from siem.rule_engine import RuleEngine
+
+    engine = RuleEngine(rule_dir=rule_dir)
+    engine.load_rules()
+
+    alerts = []
+    receiver = SyslogReceiver(port=0, udp=False, flush_interval=0.02, metrics=None)
+    pipeline = Pipeline(engine, db_path=str(tmp_path / "siem.db"), receiver=receiver, on_alerts=alerts.extend, metrics=None)
+    pipeline.start()
+    assert receiver.ready.wait(5)
+
+    with socket.create_connection(receiver.addresses["tcp"]) as sock:
+        sock.sendall(f"<38>{FAILED}\n".encode() * 3)
+
+    assert wait_for(lambda: pipeline.stats()["writer"]["items"] == 3)
+    pipeline.stop()
+    pipeline.join(5)
+    assert not pipeline.running()
+    # the three failures fold into one alert group
+    assert len(alerts) == 1
+    assert alerts[0][0].src_ip == "203.0.113.5"
+
+
+def test_load_generator_over_tcp():
+    from benchmarks.syslog_load import run_local
+
+    result = run_local(2000, proto="tcp", fmt="5424", framing="newline")
+    assert result["received"] == 2000
+    assert result["lost"] == 0
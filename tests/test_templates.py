@@ -0,0 +1,37 @@
+# tests/test_templates.py
+from siem.templates import PARAM_SEP, WILDCARD, TemplateMiner, render
+
+
+def test_similar_lines_share_a_template():
+    miner = TemplateMiner()
+    a, pa = miner.add("Failed password for root from 10.0.0.1 port 22 ssh2")
+    b, pb = miner.add("Failed password for admin from 10.0.0.2 port 2222 ssh2")
+
+    assert a is b
+    assert a.template == "Failed password for <*> from <*> port <*> <*>"
+    assert a.template_id is None
+    assert pb.split(PARAM_SEP) == ["admin", "10.0.0.2", "2222", "ssh2"]
+
+    other, _ = miner.add("Accepted password for root from 10.0.0.1 port 22 ssh2")
+    assert other is not a
+
+
+def test_render_is_lossless():
+    miner = TemplateMiner()
+    lines = [
+        "Jan  1 10:00:00 host sshd[1]: Failed password for root from 1.2.3.4 port 22 ssh2",
+        "Jan  2 10:00:01 host sshd[2]: Failed password for  from 1.2.3.5 port 23 ssh2",
+        f"literal {WILDCARD} token 1",
+        "no variables here",
+    ]
+    for line in lines:
+        cluster, params = miner.add(line)
+        assert render(cluster.template, params) == line
+
+
+def test_template_cache_is_bounded():
+    miner = TemplateMiner(max_clusters=2)
+    for word in ("alpha", "beta", "gamma"):
+        miner.add(f"{word} started")
+    assert len(miner.clusters) == 2
+    assert sum(len(leaf) for leaf in miner.leaves.values()) == 2
@@ -0,0 +1,55 @@
+# tests/test_thresholds.py
+from siem.thresholds import ThresholdTracker
+
+
+def hit(tracker, at, src_ip="1.1.1.1", user="root"):
+    return tracker.observe({"src_ip": src_ip, "user": user}, now=at)
+
+
+def test_fires_when_count_reached_within_window():
+    tracker = ThresholdTracker({"count": 3, "window": 60, "group_by": ["src_ip"]})
+    assert hit(tracker, 0) is None
+    assert hit(tracker, 10) is None
+    fired = hit(tracker, 20)
+    assert fired == {"group": {"src_ip": "1.1.1.1"}, "count": 3, "window": 60.0}
+
+    # the key starts over after firing
+    assert hit(tracker, 21) is None
+
+
+def test_old_hits_slide_out_of_the_window():
+    tracker = ThresholdTracker({"count": 3, "window": 60, "group_by": "src_ip"})
+    hit(tracker, 0)
+    hit(tracker, 10)
+    assert hit(tracker, 200) is None
+
+
+def test_keys_are_counted_separately():
+    tracker = ThresholdTracker({"count": 2, "window": 60, "group_by": ["src_ip"]})
+    assert hit(tracker, 0, src_ip="a") is None
+    assert hit(tracker, 1, src_ip="b") is None
+    assert hit(tracker, 2, src_ip="a") is not None
+
+
+def test_distinct_count():
+    tracker = ThresholdTracker(
+        {"count": 3, "window": 60, "group_by": ["src_ip"], "distinct": "user"}
+    )
+    assert hit(tracker, 0, user="a") is None
+    assert hit(tracker, 1, user="a") is None
+    assert hit(tracker, 2, user="b") is None
+    assert hit(tracker, 3, user="c")["count"] == 3
+
+
+def test_key_state_is_bounded():
+    tracker = ThresholdTracker(
+        {"count": 5, "window": 60, "group_by": ["src_ip"], "max_keys": 100}
+    )
+    for i in range(1000):
+        hit(tracker, 1, src_ip=f"10.0.{i // 256}.{i % 256}")
+    assert len(tracker.keys) == 100
+    assert tracker.evicted == 900
+
+    # idle keys go away once their window has passed
+    hit(tracker, 500, src_ip="fresh")
+    assert list(tracker.keys) == [("fresh",)]
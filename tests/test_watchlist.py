@@ -0,0 +1,70 @@
+# tests/test_watchlist.py
+import os
+import pickle
+
+from siem.watchlist import Watchlist, merge_ranges, parse_indicator
+
+
+def test_parse_indicator():
+    assert parse_indicator("10.0.0.1") == (4, 0x0A000001, 0x0A000001)
+    assert parse_indicator("10.1.2.3/16") == (4, 0x0A010000, 0x0A01FFFF)
+    assert parse_indicator("2001:db8::/32")[0] == 6
+    assert parse_indicator("10.0.0.1/33") is None
+    assert parse_indicator("10.0.1") is None
+    assert parse_indicator("evil.example.com") is None
+
+
+def test_merge_ranges():
+    assert merge_ranges([(5, 9), (1, 3), (4, 4), (8, 20), (30, 31)]) == [(1, 20), (30, 31)]
+
+
+def test_lookups(tmp_path, capsys):
+    feed = tmp_path / "bad.txt"
+    feed.write_text(
+        "# threat feed\n"
+        "203.0.113.7\n"
+        "198.51.100.0/24   # scanners\n"
+        "198.51.100.128/25\n"
+        "2001:db8:1::/48\n"
+        "not-an-ip\n"
+    )
+    watchlist = Watchlist(feed)
+    assert watchlist.refresh() is True
+    assert "Skipped 1 invalid line" in capsys.readouterr().out
+    assert len(watchlist) == 3
+
+    assert watchlist.contains("203.0.113.7")
+    assert not watchlist.contains("203.0.113.8")
+    assert watchlist.contains("198.51.100.0") and watchlist.contains("198.51.100.255")
+    assert not watchlist.contains("198.51.101.0")
+    assert watchlist.contains("2001:db8:1:ffff::1")
+    assert not watchlist.contains("2001:db8:2::1")
+    assert not watchlist.contains("") and not watchlist.contains("garbage")
+
+
+def test_reload_and_compiled_cache(tmp_path):
+    feed = tmp_path / "bad.txt"
+    feed.write_text("10.0.0.0/8\n")
+    watchlist = Watchlist(feed)
+    watchlist.refresh()
+    assert watchlist.refresh() is False
+    assert (tmp_path / "bad.wl").exists()
+
+    # A fresh instance maps the compiled file without reading the feed
+    compiled = (tmp_path / "bad.wl").stat().st_mtime_ns
+    copy = pickle.loads(pickle.dumps(watchlist))
+    assert copy.contains("10.9.9.9")
+    assert (tmp_path / "bad.wl").stat().st_mtime_ns == compiled
+
+    feed.write_text("192.0.2.1\n192.0.2.2\n")
+    os.utime(feed, ns=(1, 1))
+    assert watchlist.refresh() is True
+    assert not watchlist.contains("10.9.9.9")
+    assert watchlist.contains("192.0.2.2")
+
+
+def test_missing_feed_matches_nothing(tmp_path, capsys):
+    watchlist = Watchlist(tmp_path / "missing.txt")
+    assert not watchlist.contains("10.0.0.1")
+    assert "not found" in capsys.readouterr().out
+    assert watchlist.refresh() is False
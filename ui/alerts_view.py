@@ -1 +1,210 @@
-# alerts view
+# ui/alerts_view.py
+
+import threading
+from collections import Counter, deque
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import tkinter as tk
+from tkinter import ttk
+
+# fetch_page(limit=..., before_id=..., after_id=...) -> rows newest first, each with an "id"
+FetchPage = Callable[..., List[Dict[str, Any]]]
+
+# row -> (values, tags) for the Treeview
+RowFormat = Callable[[Dict[str, Any]], Tuple[tuple, tuple]]
+
+
+def severity_tags(severity: Any) -> tuple:
+    sev_value = str(severity or "").lower()
+    if sev_value == "high":
+        return ("high",)
+    if sev_value == "medium":
+        return ("medium",)
+    return ("low",)
+
+
+def alert_row(a: Dict[str, Any]) -> Tuple[tuple, tuple]:
+    # We do not have source stored, so show n/a for now
+    description = a["message"]
+    if a.get("count", 1) > 1:
+        description = f"{a['count']} hits, {a['first_seen']} to {a['last_seen']}"
+    values = ("n/a", a["rule_name"], a["severity"], description, a["message"])
+    return values, severity_tags(a["severity"])
+
+
+class PagedTable:
+    """
+    Lazily paged view of a stored table inside a ttk.Treeview.
+
+    Only a window of rows is kept in the tree: the pages around what is
+    visible. Scrolling near the bottom fetches the next older page with
+    keyset paging and evicts rows from the top once more than max_rows
+    are loaded. Scrolling back near the top fetches the newer rows that
+    were evicted. Memory and Tk item count stay bounded however many
+    rows are stored.
+    """
+
+    def __init__(
+        self,
+        tree: ttk.Treeview,
+        scrollbar: ttk.Scrollbar,
+        page_size: int = 200,
+        max_rows: int = 1000,
+        margin: float = 0.15,
+    ) -> None:
+        self.tree = tree
+        self.scrollbar = scrollbar
+        self.page_size = page_size
+        self.max_rows = max_rows
+        self.margin = margin
+
+        self.fetch_page: Optional[FetchPage] = None
+        self.row_format: Optional[RowFormat] = None
+
+        # ids of the rows currently in the tree, newest first
+        self.ids: List[int] = []
+        self.has_older = False
+        self.has_newer = False
+        self._loading = False
+
+        self.tree.configure(yscrollcommand=self._on_yview)
+
+    @property
+    def active(self) -> bool:
+        return self.fetch_page is not None
+
+    def clear(self) -> None:
+        """Bulk delete every row and stop paging."""
+        children = self.tree.get_children()
+        if children:
+            self.tree.delete(*children)
+        self.fetch_page = None
+        self.row_format = None
+        self.ids = []
+        self.has_older = False
+        self.has_newer = False
+
+    def show(self, fetch_page: FetchPage, row_format: RowFormat) -> int:
+        """Start paging a new result set from its newest row. Returns rows loaded."""
+        self.clear()
+        self.fetch_page = fetch_page
+        self.row_format = row_format
+
+        rows = fetch_page(limit=self.page_size)
+        self._append(rows)
+        self.has_older = len(rows) == self.page_size
+        self.tree.yview_moveto(0)
+        return len(rows)
+
+    def mark_newer(self) -> None:
+        """New rows were stored, they will be fetched when the user scrolls to the top."""
+        if self.active:
+            self.has_newer = True
+
+    # -------------- scrolling --------------
+
+    def _on_yview(self, first: str, last: str) -> None:
+        self.scrollbar.set(first, last)
+        if not self.active or self._loading:
+            return
+
+        if float(last) >= 1.0 - self.margin and self.has_older:
+            self._loading = True
+            self.tree.after_idle(self._load_older)
+        elif float(first) <= self.margin and self.has_newer:
+            self._loading = True
+            self.tree.after_idle(self._load_newer)
+
+    def _load_older(self) -> None:
+        try:
+            if not self.ids:
+                return
+            anchor = str(self.ids[-1])
+            rows = self.fetch_page(limit=self.page_size, before_id=self.ids[-1])
+            self.has_older = len(rows) == self.page_size
+            self._append(rows)
+
+            extra = len(self.ids) - self.max_rows
+            if extra > 0:
+                self.tree.delete(*[str(i) for i in self.ids[:extra]])
+                del self.ids[:extra]
+                self.has_newer = True
+            self.tree.see(anchor)
+        finally:
+            self._loading = False
+
+    def _load_newer(self) -> None:
+        try:
+            if not self.ids:
+                return
+            anchor = str(self.ids[0])
+            rows = self.fetch_page(limit=self.page_size, after_id=self.ids[0])
+            self.has_newer = len(rows) == self.page_size
+            self._prepend(rows)
+
+            extra = len(self.ids) - self.max_rows
+            if extra > 0:
+                self.tree.delete(*[str(i) for i in self.ids[-extra:]])
+                del self.ids[-extra:]
+                self.has_older = True
+            self.tree.see(anchor)
+        finally:
+            self._loading = False
+
+    def _append(self, rows: List[Dict[str, Any]]) -> None:
+        for row in rows:
+            values, tags = self.row_format(row)
+            self.tree.insert("", tk.END, iid=str(row["id"]), values=values, tags=tags)
+            self.ids.append(row["id"])
+
+    def _prepend(self, rows: List[Dict[str, Any]]) -> None:
+        # rows are newest first, insert oldest first at the top
+        for row in reversed(rows):
+            values, tags = self.row_format(row)
+            self.tree.insert("", 0, iid=str(row["id"]), values=values, tags=tags)
+            self.ids.insert(0, row["id"])
+
+
+class AlertFeed:
+    """
+    Hand-off from the monitoring worker to the Tk thread.
+
+    The worker calls publish() with each batch of alerts, the Tk thread
+    calls take() from an after() loop and inserts what it gets. At most
+    max_pending alerts wait in between; anything past that is dropped
+    and only counted per rule, so an alert storm cannot pile up work for
+    the GUI. Every alert is still stored in SQLite by the writer.
+    """
+
+    def __init__(self, max_pending: int = 5000) -> None:
+        self.max_pending = max_pending
+        self._pending: deque = deque()
+        self._dropped: Counter = Counter()
+        self._lock = threading.Lock()
+
+    def publish(self, alerts: List[Any]) -> None:
+        with self._lock:
+            room = self.max_pending - len(self._pending)
+            if room > 0:
+                self._pending.extend(alerts[:room])
+            for _, alert in alerts[max(room, 0):]:
+                self._dropped[alert.get("rule_id")] += 1
+
+    def take(self, max_rows: int) -> Tuple[List[Any], Counter]:
+        """Return up to max_rows alerts plus the per-rule drop counts since the last call."""
+        with self._lock:
+            n = min(max_rows, len(self._pending))
+            rows = [self._pending.popleft() for _ in range(n)]
+            dropped, self._dropped = self._dropped, Counter()
+        return rows, dropped
+
+    def clear(self) -> None:
+        with self._lock:
+            self._pending.clear()
+            self._dropped.clear()
+
+
+def dropped_summary(dropped: Counter) -> str:
+    total = sum(dropped.values())
+    top = ", ".join(f"{rule}: {n}" for rule, n in dropped.most_common(3))
+    return f"{total} alert(s) not shown ({top}), see stored alerts"
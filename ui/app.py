@@ -2,15 +2,27 @@
 
 import tkinter as tk
 from tkinter import ttk
-import threading
-import time
 from datetime import datetime, timezone
 
+from siem.alerts import AlertAggregator
 from siem.log_ingestor import ingest_all_logs, LOG_DIR, RULE_DIR
+from siem.metrics import MetricsDumper
+from siem.pipeline import Pipeline
 from siem.rule_engine import RuleEngine
-from siem.storage import SQLiteStorage
-from siem.models import Alert
-from siem.parsers import parse_event
+from siem.storage import SQLiteStorage, BatchWriter
+from siem.parsers import parse_event, event_dict
+from ui.alerts_view import AlertFeed, PagedTable, alert_row, dropped_summary, severity_tags
+from ui.dashboard_view import DashboardView
+from ui.events_view import event_row
+
+
+# Live alert display limits, so alert bursts cannot lock up Tk
+UI_FRAME_MS = 100          # drain the alert feed at most 10 times a second
+UI_ROWS_PER_FRAME = 200    # rows inserted per drain
+UI_MAX_LIVE_ROWS = 2000    # oldest live rows are deleted past this
+
+# Edited rule files are picked up this often while monitoring
+UI_RULE_RELOAD_SECONDS = 5
 
 
 class WatchtowerApp(tk.Tk):
@@ -21,7 +33,16 @@ class WatchtowerApp(tk.Tk):
 
         # Monitoring state
         self.monitoring = False
-        self.monitor_thread = None
+        self.pipeline = None
+
+        # Alerts published by the pipeline writer, drained on the Tk thread
+        self.alert_feed = AlertFeed()
+        self._drain_job = None
+        self._status_job = None
+
+        # Stats window, and the JSON dump `python -m siem.metrics` reads
+        self.dashboard = None
+        self.metrics_dumper = None
 
         # Dark style for Treeview
         style = ttk.Style(self)
@@ -59,6 +80,9 @@ class WatchtowerApp(tk.Tk):
         self.storage.connect()
         self.storage.init_db()
 
+        # Repeated hits of a rule from the same src_ip/user share one alert row
+        self.aggregator = AlertAggregator(self.rule_engine)
+
         # Top section - info and refresh slider
         top = ttk.Frame(self, padding=10)
         top.pack(side=tk.TOP, fill=tk.X)
@@ -78,6 +102,7 @@ class WatchtowerApp(tk.Tk):
             from_=1,
             to=10,
             orient=tk.HORIZONTAL,
+            command=self._on_refresh_change,
         )
         self.refresh_slider.set(3)
         self.refresh_slider.pack()
@@ -102,6 +127,10 @@ class WatchtowerApp(tk.Tk):
             btn_frame, text="Clear Alerts", command=self.clear_table)
         self.clear_btn.pack(side=tk.LEFT, padx=5)
 
+        self.stats_btn = ttk.Button(
+            btn_frame, text="Stats", command=self.show_dashboard)
+        self.stats_btn.pack(side=tk.LEFT, padx=5)
+
         # Filter controls that read from SQLite
         filter_frame = ttk.Frame(self, padding=(10, 0))
         filter_frame.pack(side=tk.TOP, fill=tk.X)
@@ -120,6 +149,19 @@ class WatchtowerApp(tk.Tk):
             filter_frame, text="Load Stored Alerts", command=self.load_alerts_from_db)
         load_btn.pack(side=tk.LEFT)
 
+        events_btn = ttk.Button(
+            filter_frame, text="Load Stored Events", command=self.load_events_from_db)
+        events_btn.pack(side=tk.LEFT, padx=5)
+
+        # Full-text search over stored events
+        self.search_entry = ttk.Entry(filter_frame, width=30)
+        self.search_entry.pack(side=tk.LEFT, padx=(10, 0))
+        self.search_entry.bind("<Return>", lambda _e: self.search_events())
+
+        search_btn = ttk.Button(
+            filter_frame, text="Search Events", command=self.search_events)
+        search_btn.pack(side=tk.LEFT, padx=5)
+
         # Table section
         table_frame = ttk.Frame(self, padding=10)
         table_frame.pack(fill=tk.BOTH, expand=True)
@@ -141,7 +183,9 @@ class WatchtowerApp(tk.Tk):
         scroll = ttk.Scrollbar(
             table_frame, orient=tk.VERTICAL, command=self.tree.yview)
         scroll.pack(side=tk.RIGHT, fill=tk.Y)
-        self.tree.configure(yscrollcommand=scroll.set)
+
+        # Stored rows are paged in from SQLite as the user scrolls
+        self.table = PagedTable(self.tree, scroll)
 
         # Severity tag styles for dark mode (subtle)
         self.tree.tag_configure(
@@ -170,8 +214,7 @@ class WatchtowerApp(tk.Tk):
     # -------------- helper methods --------------
 
     def clear_table(self):
-        for row in self.tree.get_children():
-            self.tree.delete(row)
+        self.table.clear()
         self.status_label.config(text="Alerts cleared.")
 
     def run_analysis(self):
@@ -190,131 +233,192 @@ class WatchtowerApp(tk.Tk):
             text=f"Analysis complete, {alert_count} alert(s) found.")
 
     def process_logs_once(self) -> int:
+        """Parse, match and store every line of the current logs."""
+        # Rows are committed in batches, not one transaction per line
+        with BatchWriter(self.storage, aggregator=self.aggregator) as writer:
+            return self._process_lines(ingest_all_logs(), writer)
+
+    def _process_lines(self, lines, writer: BatchWriter) -> int:
         count = 0
 
-        for source, raw in ingest_all_logs():
+        for source, raw in lines:
             # Use your existing parser to build an Event
             ev = parse_event(source, raw)
             if ev is None:
                 continue
 
             # Optionally store the raw event in the events table
-            self.storage.insert_event(ev)
+            writer.add_event(ev)
 
             # Build the event dict that RuleEngine expects, plus extra fields
-            event = {
-                "log_type": ev.source,
-                "raw": ev.raw,
-                "user": getattr(ev, "user", ""),
-                "src_ip": getattr(ev, "src_ip", ""),
-                "action": getattr(ev, "action", ""),
-                "timestamp": ev.timestamp,
-            }
+            event = event_dict(ev)
 
             alerts = self.rule_engine.match_event(event)
 
             for alert in alerts:
                 count += 1
 
-                sev_value = str(alert.get("severity", "")).lower()
-                if sev_value == "high":
-                    tags = ("high",)
-                elif sev_value == "medium":
-                    tags = ("medium",)
-                else:
-                    tags = ("low",)
-
-                # Show enriched info in the table (source and raw message for now)
-                self.tree.insert(
-                    "",
-                    tk.END,
-                    values=(
-                        ev.source,
-                        alert.get("rule_id"),
-                        alert.get("severity"),
-                        alert.get("description"),
-                        ev.raw,
-                    ),
-                    tags=tags,
-                )
-
-                # Save alert to SQLite using your Alert model and enriched fields
-                alert_obj = Alert(
-                    timestamp=ev.timestamp,
-                    rule_name=alert.get("rule_id") or "",
-                    severity=alert.get("severity") or "",
-                    src_ip=ev.src_ip or "",
-                    user=ev.user or "",
-                    message=ev.raw,
-                )
-                self.storage.insert_alert(alert_obj)
+                # Only the first hit of a group gets a row, the rest bump its count
+                if writer.add_hit(ev, alert):
+                    self._insert_alert_row(ev, alert)
 
         return count
 
+    def _insert_alert_row(self, ev, alert):
+        tags = severity_tags(alert.get("severity"))
+
+        # Show enriched info in the table (source and raw message for now)
+        self.tree.insert(
+            "",
+            tk.END,
+            values=(
+                ev.source,
+                alert.get("rule_id"),
+                alert.get("severity"),
+                alert.get("description"),
+                ev.raw,
+            ),
+            tags=tags,
+        )
+
     def load_alerts_from_db(self):
-        """Load stored alerts from SQLite based on severity filter."""
+        """Page stored alerts in from SQLite based on severity filter."""
         sev = self.severity_filter.get().strip() or None
-        alerts = self.storage.fetch_alerts(severity=sev, limit=500)
 
-        self.clear_table()
-        count = 0
+        def fetch(**page):
+            return self.storage.fetch_alerts(severity=sev, **page)
 
-        for a in alerts:
-            count += 1
-            sev_value = str(a["severity"]).lower()
-            if sev_value == "high":
-                tags = ("high",)
-            elif sev_value == "medium":
-                tags = ("medium",)
-            else:
-                tags = ("low",)
-
-            # We do not have source stored, so show n/a for now
-            self.tree.insert(
-                "",
-                tk.END,
-                values=(
-                    "n/a",
-                    a["rule_name"],
-                    a["severity"],
-                    a["message"],
-                    a["message"],
-                ),
-                tags=tags,
-            )
+        count = self.table.show(fetch, alert_row)
+        more = " Scroll for more." if self.table.has_older else ""
 
         if sev:
             self.status_label.config(
-                text=f"Loaded {count} stored alert(s) from DB with severity = {sev}."
+                text=f"Loaded {count} stored alert(s) from DB with severity = {sev}.{more}"
             )
         else:
             self.status_label.config(
-                text=f"Loaded {count} stored alert(s) from DB (all severities)."
+                text=f"Loaded {count} stored alert(s) from DB (all severities).{more}"
             )
 
+    def load_events_from_db(self):
+        """Page stored events in from SQLite."""
+        count = self.table.show(self.storage.fetch_events, event_row)
+        more = " Scroll for more." if self.table.has_older else ""
+        self.status_label.config(text=f"Loaded {count} stored event(s) from DB.{more}")
+
+    def search_events(self):
+        """Full-text search over stored events, paged like the other views."""
+        query = self.search_entry.get().strip()
+        if not query:
+            self.load_events_from_db()
+            return
+
+        def fetch(**page):
+            return self.storage.search_events(query, **page)
+
+        count = self.table.show(fetch, event_row)
+        more = " Scroll for more." if self.table.has_older else ""
+        self.status_label.config(text=f"Found {count} event(s) matching '{query}'.{more}")
+
+    def show_dashboard(self):
+        if self.dashboard is not None and self.dashboard.winfo_exists():
+            self.dashboard.lift()
+            return
+        self.dashboard = DashboardView(self)
+
     # -------------- monitoring loop --------------
 
     def start_monitoring(self):
         if self.monitoring:
             self.status_label.config(text="Monitoring already running.")
             return
+        if self.pipeline is not None and self.pipeline.running():
+            # A second tailer would read the same files next to the old one
+            self.status_label.config(text="Monitoring is still stopping, try again in a moment.")
+            return
 
         self.monitoring = True
         self.status_label.config(text="Monitoring started...")
 
-        def loop():
-            while self.monitoring:
-                interval = int(self.refresh_slider.get())
-                self.process_logs_once()
-                time.sleep(interval)
-
-        self.monitor_thread = threading.Thread(target=loop, daemon=True)
-        self.monitor_thread.start()
+        # Reader, parser, matcher and writer run on their own threads; the
+        # writer has its own SQLite connection and hands us committed alerts
+        self.pipeline = Pipeline(
+            self.rule_engine,
+            db_path=self.storage.db_path,
+            follow=True,
+            poll_interval=int(self.refresh_slider.get()),
+            on_alerts=self.alert_feed.publish,
+            rule_reload_interval=UI_RULE_RELOAD_SECONDS,
+        )
+        self.pipeline.start()
+        if self.metrics_dumper is None:
+            self.metrics_dumper = MetricsDumper()
+            self.metrics_dumper.start()
+        self._update_pipeline_status()
+        if self._drain_job is None:
+            self._drain_alerts()
 
     def stop_monitoring(self):
         self.monitoring = False
+        if self._status_job is not None:
+            self.after_cancel(self._status_job)
+            self._status_job = None
+        if self.pipeline is not None:
+            self.pipeline.stop()
+        if self.metrics_dumper is not None:
+            self.metrics_dumper.stop()
+            self.metrics_dumper = None
         self.status_label.config(text="Monitoring stopped.")
 
+    def _on_refresh_change(self, value):
+        if self.pipeline is not None:
+            self.pipeline.poll_interval = int(float(value))
+
+    def _drain_alerts(self):
+        """Insert queued alerts in one batch per frame, runs on the Tk thread."""
+        # Checked before taking: alerts the writer publishes before it
+        # exits are then still taken on the next frame
+        active = self.monitoring or (self.pipeline is not None and self.pipeline.running())
+        alerts, dropped = self.alert_feed.take(UI_ROWS_PER_FRAME)
+
+        if self.table.active:
+            # Browsing stored rows, the new ones show up when scrolling to the top
+            if alerts or dropped:
+                self.table.mark_newer()
+        else:
+            for ev, alert in alerts:
+                self._insert_alert_row(ev, alert)
+            if dropped:
+                self.tree.insert(
+                    "", tk.END, values=("", "", "", dropped_summary(dropped), ""))
+
+            children = self.tree.get_children()
+            if len(children) > UI_MAX_LIVE_ROWS:
+                self.tree.delete(*children[:len(children) - UI_MAX_LIVE_ROWS])
+                self.tree.yview_moveto(1.0)
+
+        # Once stopped, keep going until the feed is empty
+        if active or alerts or dropped:
+            self._drain_job = self.after(UI_FRAME_MS, self._drain_alerts)
+        else:
+            self._drain_job = None
+
+    def _update_pipeline_status(self):
+        self._status_job = None
+        if not self.monitoring or self.pipeline is None:
+            return
+
+        stats = self.pipeline.stats()
+        depths = "  ".join(
+            f"{name} {s['queue_depth']}/{s['queue_size']}"
+            for name, s in stats.items()
+            if name != "reader"
+        )
+        self.status_label.config(
+            text=f"Monitoring, {stats['writer']['items']} event(s) stored.  Queues: {depths}"
+        )
+        self._status_job = self.after(1000, self._update_pipeline_status)
+
 
 if __name__ == "__main__":
     app = WatchtowerApp()
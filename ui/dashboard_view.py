@@ -1 +1,71 @@
-# dashboard view
+# ui/dashboard_view.py
+
+import tkinter as tk
+from tkinter import ttk
+
+from siem.metrics import REGISTRY, MetricsRegistry, rule_rows, stage_rows
+
+# How often the dashboard re-reads the metrics registry
+DASHBOARD_REFRESH_MS = 1000
+
+STAGE_COLUMNS = ("stage", "items", "busy_s", "p50_ms", "p99_ms", "queue")
+RULE_COLUMNS = ("rule", "hits", "sampled", "mean_ms", "p99_ms")
+
+
+class DashboardView(tk.Toplevel):
+    """
+    Live stats window: per-stage throughput and batch latency of the
+    pipeline, and per-rule hits and sampled evaluation time, most
+    expensive rule first. Reads the same registry `python -m siem.metrics`
+    shows from its JSON dump.
+    """
+
+    def __init__(self, master, registry: MetricsRegistry = REGISTRY) -> None:
+        super().__init__(master)
+        self.title("Watchtower Stats")
+        self.geometry("760x520")
+        self.registry = registry
+        self._job = None
+
+        self.uptime_label = ttk.Label(self, padding=(10, 10, 10, 0))
+        self.uptime_label.pack(side=tk.TOP, anchor=tk.W)
+
+        self.stages = self._table(STAGE_COLUMNS, height=6)
+        self.rules = self._table(RULE_COLUMNS, height=14)
+
+        self.protocol("WM_DELETE_WINDOW", self.close)
+        self.refresh()
+
+    def _table(self, columns, height: int) -> ttk.Treeview:
+        frame = ttk.Frame(self, padding=10)
+        frame.pack(fill=tk.BOTH, expand=True)
+        tree = ttk.Treeview(frame, columns=columns, show="headings", height=height)
+        for col in columns:
+            tree.heading(col, text=col.replace("_", " "))
+            tree.column(col, width=260 if col in ("rule", "stage") else 90, anchor=tk.W)
+        tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        scroll = ttk.Scrollbar(frame, orient=tk.VERTICAL, command=tree.yview)
+        scroll.pack(side=tk.RIGHT, fill=tk.Y)
+        tree.configure(yscrollcommand=scroll.set)
+        return tree
+
+    @staticmethod
+    def _fill(tree: ttk.Treeview, rows) -> None:
+        children = tree.get_children()
+        if children:
+            tree.delete(*children)
+        for row in rows:
+            tree.insert("", tk.END, values=row)
+
+    def refresh(self) -> None:
+        snapshot = self.registry.snapshot()
+        self.uptime_label.config(text=f"Uptime {snapshot['uptime_seconds']} s")
+        self._fill(self.stages, stage_rows(snapshot))
+        self._fill(self.rules, rule_rows(snapshot))
+        self._job = self.after(DASHBOARD_REFRESH_MS, self.refresh)
+
+    def close(self) -> None:
+        if self._job is not None:
+            self.after_cancel(self._job)
+            self._job = None
+        self.destroy()
@@ -1 +1,10 @@
-# events view
+# ui/events_view.py
+
+from typing import Any, Dict, Tuple
+
+
+def event_row(e: Dict[str, Any]) -> Tuple[tuple, tuple]:
+    """Map a stored event onto the shared table columns."""
+    who = " ".join(part for part in (e["user"], e["src_ip"]) if part)
+    values = (e["source"], e["action"] or "-", "", who, e["raw"])
+    return values, ()